@@ -0,0 +1,215 @@
+import os
+import uuid
+from datetime import datetime, timedelta
+import pymongo
+import database
+import rules
+
+# Population analytics, materialized with $merge into small summary
+# collections so the admin page reads a bounded number of docs.
+#   analytics_cohorts: one doc per (age band, gender, BP stage, glucose status)
+#   analytics_daily:   one doc per assessment day
+# Both hold sums (n, score_sum, score_n, needs_doctor) so incremental
+# refreshes can $add into them. Stats are per assessment, not per patient.
+COHORTS = 'analytics_cohorts'
+DAILY = 'analytics_daily'
+META_ID = 'refresh'
+
+AGE_BANDS = [(30, 'Under 30'), (45, '30-44'), (60, '45-59'), (75, '60-74')]
+OLDEST_BAND = '75+'
+SUM_FIELDS = ['n', 'score_sum', 'score_n', 'needs_doctor']
+
+# The watermark is on analyzed_at, when a record got its analysis, so a
+# record that was pending or failed at one refresh and is scored later is
+# still picked up. Legacy records without analyzed_at fall back to `date`.
+# Records newer than this are left for the next run, so writes that land
+# slightly out of order (clock skew between workers) aren't skipped
+REFRESH_LAG_SECONDS = int(os.environ.get('ANALYTICS_REFRESH_LAG', 60))
+LEASE_SECONDS = int(os.environ.get('ANALYTICS_LEASE_SECONDS', 600))
+
+
+def _age_band():
+    return {"$switch": {
+        "branches": [{"case": {"$lt": ["$age", limit]}, "then": label} for limit, label in AGE_BANDS],
+        "default": OLDEST_BAND
+    }}
+
+
+def _source_stages(since, until, with_user):
+    """Assessments analyzed in [since, until) reduced to the fields the summaries need."""
+    window = {"$lt": until}
+    if since:
+        window["$gte"] = since
+    stages = [
+        {"$match": {"$or": [
+            {"analyzed_at": window},
+            # Pending/failed records have no analysis yet
+            {"analyzed_at": {"$exists": False}, "date": window,
+             "status": {"$nin": [database.STATUS_PENDING, database.STATUS_FAILED]}},
+        ]}},
+        {"$project": {
+            "user_id": 1,
+            "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}},
+            "bp_status": {"$ifNull": ["$analysis_result.bp_status", "Unknown"]},
+            "sugar_status": {"$ifNull": ["$analysis_result.sugar_status", "Unknown"]},
+            "score": {"$cond": [{"$isNumber": "$analysis_result.health_score"}, "$analysis_result.health_score", None]},
+            "needs_doctor": {"$cond": [{"$eq": ["$analysis_result.needs_doctor", True]}, 1, 0]}
+        }}
+    ]
+    if with_user:
+        stages += [
+            {"$addFields": {"uid": {"$convert": {"input": "$user_id", "to": "objectId", "onError": None, "onNull": None}}}},
+            {"$lookup": {"from": "users", "localField": "uid", "foreignField": "_id", "as": "user"}},
+            {"$addFields": {
+                "age": {"$arrayElemAt": ["$user.age", 0]},
+                "gender": {"$ifNull": [{"$arrayElemAt": ["$user.gender", 0]}, "Unknown"]}
+            }},
+            {"$addFields": {"age_band": {"$cond": [{"$isNumber": "$age"}, _age_band(), "Unknown"]}}},
+        ]
+    return stages
+
+
+def _sums():
+    return {
+        "n": {"$sum": 1},
+        "score_sum": {"$sum": "$score"},
+        "score_n": {"$sum": {"$cond": [{"$isNumber": "$score"}, 1, 0]}},
+        "needs_doctor": {"$sum": "$needs_doctor"}
+    }
+
+
+def _merge(into, incremental):
+    if not incremental:
+        return {"$merge": {"into": into, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    return {"$merge": {
+        "into": into,
+        "on": "_id",
+        "whenMatched": [{"$set": {f: {"$add": [{"$ifNull": [f"${f}", 0]}, f"$$new.{f}"]} for f in SUM_FIELDS}}],
+        "whenNotMatched": "insert"
+    }}
+
+
+def cohort_pipeline(since, until, into=COHORTS, incremental=True):
+    return _source_stages(since, until, with_user=True) + [
+        {"$group": {
+            "_id": {"age_band": "$age_band", "gender": "$gender", "bp_status": "$bp_status", "sugar_status": "$sugar_status"},
+            **_sums()
+        }},
+        _merge(into, incremental)
+    ]
+
+
+def daily_pipeline(since, until, into=DAILY, incremental=True):
+    return _source_stages(since, until, with_user=False) + [
+        {"$group": {"_id": "$day", **_sums()}},
+        _merge(into, incremental)
+    ]
+
+
+def _claim(db, owner, now):
+    """Take the refresh lease; None if another run holds it."""
+    try:
+        return db.analytics_meta.find_one_and_update(
+            {"_id": META_ID, "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]},
+            {"$set": {"lease_until": now + timedelta(seconds=LEASE_SECONDS), "lease_owner": owner}},
+            upsert=True,
+            return_document=pymongo.ReturnDocument.AFTER
+        )
+    except pymongo.errors.DuplicateKeyError:
+        # The doc exists with a live lease, so the upsert collided
+        return None
+
+
+def refresh(full=False):
+    """Fold assessments since the watermark into the summaries.
+
+    Returns a status dict, or None when another refresh is running.
+    full=True rebuilds both summaries from scratch into side collections
+    and swaps them in, which also picks up rescored or edited analyses.
+    """
+    db = database.db
+    now = datetime.utcnow()
+    owner = uuid.uuid4().hex
+    meta = _claim(db, owner, now)
+    if meta is None:
+        return None
+    try:
+        since = None if full else meta.get('watermark')
+        until = now - timedelta(seconds=REFRESH_LAG_SECONDS)
+        if since and until <= since:
+            return {"since": since, "until": since, "full": full, "skipped": True}
+
+        if full:
+            for name, build in ((COHORTS, cohort_pipeline), (DAILY, daily_pipeline)):
+                side = f"{name}_rebuild"
+                db[side].drop()
+                list(db.health_data.aggregate(build(None, until, into=side, incremental=False), allowDiskUse=True))
+                if side in db.list_collection_names():
+                    db[side].rename(name, dropTarget=True)
+                else:
+                    db[name].drop()
+        else:
+            list(db.health_data.aggregate(cohort_pipeline(since, until), allowDiskUse=True))
+            list(db.health_data.aggregate(daily_pipeline(since, until), allowDiskUse=True))
+
+        db.analytics_meta.update_one(
+            {"_id": META_ID, "lease_owner": owner},
+            {"$set": {"watermark": until, "last_run": datetime.utcnow(), "last_full": full},
+             "$unset": {"lease_until": "", "lease_owner": ""}}
+        )
+        return {"since": since, "until": until, "full": full, "skipped": False}
+    except Exception:
+        db.analytics_meta.update_one({"_id": META_ID, "lease_owner": owner},
+                                     {"$unset": {"lease_until": "", "lease_owner": ""}})
+        raise
+
+
+def _rates(doc):
+    n = doc.get('n', 0)
+    return {
+        "n": n,
+        "avg_score": round(doc['score_sum'] / doc['score_n'], 1) if doc.get('score_n') else None,
+        "needs_doctor_pct": round(doc.get('needs_doctor', 0) * 100 / n, 1) if n else 0.0
+    }
+
+
+def _rollup(cohorts, key):
+    groups = {}
+    for c in cohorts:
+        g = groups.setdefault(c['_id'].get(key, 'Unknown'), dict.fromkeys(SUM_FIELDS, 0))
+        for f in SUM_FIELDS:
+            g[f] += c.get(f, 0)
+    return groups
+
+
+def dashboard(days=30):
+    """Everything the admin analytics page shows, read from the summaries only."""
+    db = database.db
+    cohorts = list(db[COHORTS].find())
+    daily = list(db[DAILY].find().sort("_id", -1).limit(days))
+    meta = db.analytics_meta.find_one({"_id": META_ID}) or {}
+
+    total = dict.fromkeys(SUM_FIELDS, 0)
+    for c in cohorts:
+        for f in SUM_FIELDS:
+            total[f] += c.get(f, 0)
+
+    band_order = [label for _, label in AGE_BANDS] + [OLDEST_BAND, 'Unknown']
+
+    def table(key, order=None):
+        groups = _rollup(cohorts, key)
+        keys = [k for k in order if k in groups] if order else sorted(groups, key=lambda k: -groups[k]['n'])
+        return [dict(_rates(groups[k]), label=k, share_pct=round(groups[k]['n'] * 100 / total['n'], 1) if total['n'] else 0.0)
+                for k in keys]
+
+    return {
+        "total": _rates(total),
+        "bp_stages": table('bp_status', rules.BP_STAGES.values + ['Unknown']),
+        "sugar": table('sugar_status'),
+        "age_bands": table('age_band', band_order),
+        "genders": table('gender'),
+        "daily": [dict(_rates(d), day=d['_id']) for d in reversed(daily)],
+        "watermark": meta.get('watermark'),
+        "last_run": meta.get('last_run'),
+        "refreshing": bool(meta.get('lease_until') and meta['lease_until'] > datetime.utcnow())
+    }
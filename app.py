@@ -1,32 +1,101 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, send_file, send_from_directory, abort, Response, stream_with_context
 import os
+import hashlib
 import database
+import scoring
+import pipeline
 import json
-import random
 import math
-import pickle
-import numpy as np
-from datetime import datetime
+from datetime import datetime, timedelta
 import mimetypes
+import time
+import cache
+import metrics
+import profiler
+import rollups
+import timeseries
+import analytics
+import importer
+import exporter
+import static_build
+import compression
+import tickets
 
 mimetypes.add_type('text/css', '.css')
 
-# Load the trained ML models
-try:
-    with open('healthcare_model.pkl', 'rb') as f:
-        ml_assets = pickle.load(f)
-        ML_MODEL_RISK = ml_assets['model_risk']
-        ML_MODEL_SCORE = ml_assets['model_score']
-        ML_SCALER = ml_assets['scaler']
-        ML_ENCODERS = ml_assets['encoders']
-        ML_READY = True
-except Exception as e:
-    print(f"ML Model loading failed: {e}")
-    ML_READY = False
+if scoring.ML_LOAD == 'background':
+    scoring.start_warmup()
 
 app = Flask(__name__)
 app.secret_key = 'super_secret_key' # In a real app, use a secure secret key
 
+# Rendered patient pages keyed by the revisions they were rendered from, so
+# entries never go stale; the LRU bound is what limits memory (~30 KB each)
+page_cache = cache.TTLCache(maxsize=int(os.environ.get('PAGE_CACHE_MAXSIZE', 512)),
+                            ttl=float(os.environ.get('PAGE_CACHE_TTL', 3600)))
+
+# Fingerprinted assets from `python manage.py build-static`. Without a build
+# (or with STATIC_DIST=0) url_for('static', ...) serves the plain files.
+STATIC_MANIFEST = static_build.load_manifest(app.static_folder) if os.environ.get('STATIC_DIST', '1') != '0' else None
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+@app.url_defaults
+def fingerprint_static(endpoint, values):
+    # Templates keep url_for('static', filename='style.css'); this swaps in the hashed name
+    if endpoint == 'static' and STATIC_MANIFEST:
+        built = STATIC_MANIFEST['files'].get(values.get('filename'))
+        if built:
+            values['filename'] = f"{static_build.DIST}/{built}"
+
+def _templates_digest():
+    # Part of every page ETag, so a deploy that changes a template (or a
+    # rebuilt asset's hashed URL) invalidates browser copies
+    digest = hashlib.sha1(json.dumps(STATIC_MANIFEST, sort_keys=True).encode())
+    folder = os.path.join(app.root_path, app.template_folder)
+    for name in sorted(os.listdir(folder)):
+        digest.update(name.encode())
+        with open(os.path.join(folder, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+TEMPLATES_DIGEST = _templates_digest()
+
+def cached_page(parts, render):
+    """Serve a rendered page by revision: 304 on a matching If-None-Match, else cached HTML.
+
+    `parts` must identify everything the page shows. Pages with pending
+    flash messages are rendered fresh, since base.html consumes them.
+    """
+    if session.get('_flashes'):
+        return render()
+    etag = hashlib.sha1(repr((TEMPLATES_DIGEST,) + tuple(parts)).encode()).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        def load():
+            # Read fresh rows: the data cache may predate the revision in the key
+            cache.read_floor.set(time.time())
+            return render()
+        response = app.response_class(page_cache.get_or_load(etag, load), mimetype='text/html')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+@app.before_request
+def apply_cache_read_floor():
+    # Sessions that just wrote skip cache entries older than their last write.
+    # Static files never read the session (touching it would add Vary: Cookie).
+    if request.endpoint in ('static', 'static_dist'):
+        return
+    cache.read_floor.set(session.get('cache_floor', 0.0))
+
+@app.after_request
+def record_cache_floor(response):
+    if request.method == 'POST' and response.status_code < 400 and ('user_id' in session or session.get('admin_logged_in')):
+        session['cache_floor'] = time.time()
+    return response
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -73,8 +142,8 @@ def login():
 def user_home():
     if 'user_id' not in session or session.get('role') != 'user':
         return redirect(url_for('login'))
-    health_records = database.get_health_data(session['user_id'])
-    return render_template('user_home.html', username=session['username'], has_data=len(health_records) > 0)
+    has_data = database.has_health_data(session['user_id'])
+    return render_template('user_home.html', username=session['username'], has_data=has_data)
 
 @app.route('/health/data', methods=['GET', 'POST'])
 def health_data():
@@ -87,162 +156,23 @@ def health_data():
         
         # Get user details for age
         user = database.get_user_by_id(user_id)
-        user_age = user['age'] if user else 30
-
-        # Helper to safely parse numbers
-        def parse_num(val, default=0, type_func=float):
-            try:
-                if val is None or val.strip() == '':
-                    return default
-                return type_func(val)
-            except:
-                return default
-
-        # Collect all data fields
-        health_data_dict = {
-            'sex': f.get('sex'),
-            'family_history': f.get('family_history'),
-            'smoking': f.get('smoking'),
-            'alcohol': f.get('alcohol'),
-            'activity': f.get('activity'),
-            'diet': f.get('diet'),
-            'sleep': parse_num(f.get('sleep')),
-            'environmental': f.get('environmental'),
-            'stress_level': f.get('stress_level'),
-            'mood': f.get('mood'),
-            'sleep_quality': f.get('sleep_quality'),
-            'lifestyle_balance': f.get('lifestyle_balance'),
-            'height': parse_num(f.get('height')),
-            'weight': parse_num(f.get('weight')),
-            'bp_systolic': parse_num(f.get('bp_systolic'), type_func=int),
-            'bp_diastolic': parse_num(f.get('bp_diastolic'), type_func=int),
-            'fasting_glucose': parse_num(f.get('fasting_glucose'), type_func=int),
-            'hba1c': parse_num(f.get('hba1c')),
-            'cholesterol': parse_num(f.get('cholesterol'), type_func=int),
-            'ldl': parse_num(f.get('ldl'), type_func=int),
-            'hdl': parse_num(f.get('hdl'), type_func=int),
-            'triglycerides': parse_num(f.get('triglycerides'), type_func=int)
-        }
-
-        # Calculate clinical metrics
-        h_m = health_data_dict['height'] / 100
-        bmi = round(health_data_dict['weight'] / (h_m * h_m), 1) if h_m > 0 else 0
-        
-        # Clinical Guideline Thresholds (WHO/AHA/ADA)
-        sys = health_data_dict['bp_systolic']
-        dia = health_data_dict['bp_diastolic']
-        if sys < 120 and dia < 80: bp_status = "Normal"
-        elif sys < 130 and dia < 80: bp_status = "Elevated"
-        elif sys < 140 or dia < 90: bp_status = "Hypertension Stage 1"
-        else: bp_status = "Hypertension Stage 2"
-        
-        glu = health_data_dict['fasting_glucose']
-        if glu < 100: sugar_status = "Normal"
-        elif glu < 126: sugar_status = "Prediabetes"
-        else: sugar_status = "Diabetes"
-
-        # ML Risk Estimation
-        heart_prob = 0
-        health_score = 75
-        use_ml = ML_READY
-        if use_ml:
-            try:
-                gender_enc = ML_ENCODERS['gender'].transform([health_data_dict['sex']])[0]
-                smoking_enc = ML_ENCODERS['smoking'].transform([health_data_dict['smoking']])[0]
-                try: activity_enc = ML_ENCODERS['activity'].transform([health_data_dict['activity']])[0]
-                except: activity_enc = 1
-                
-                try: stress_enc = ML_ENCODERS['stress'].transform([health_data_dict['stress_level']])[0]
-                except: stress_enc = 1
-                
-                try: mood_enc = ML_ENCODERS['mood'].transform([health_data_dict['mood']])[0]
-                except: mood_enc = 1
-                
-                try: sleep_q_enc = ML_ENCODERS['sleep_q'].transform([health_data_dict['sleep_quality']])[0]
-                except: sleep_q_enc = 1
-                
-                try: balance_enc = ML_ENCODERS['balance'].transform([health_data_dict['lifestyle_balance']])[0]
-                except: balance_enc = 1
-                
-                features = np.array([[
-                    float(user_age), 
-                    gender_enc, 
-                    bmi, 
-                    float(sys), 
-                    float(glu), 
-                    smoking_enc, 
-                    float(health_data_dict['cholesterol']), 
-                    activity_enc,
-                    stress_enc,
-                    mood_enc,
-                    sleep_q_enc,
-                    balance_enc
-                ]])
-                features_scaled = ML_SCALER.transform(features)
-                
-                heart_prob = float(round(ML_MODEL_RISK.predict_proba(features_scaled)[0][1] * 100, 1))
-                health_score = float(round(ML_MODEL_SCORE.predict(features_scaled)[0], 1))
-                health_score = max(min(health_score, 100.0), 0.0)
-            except: use_ml = False
-
-        if not use_ml:
-            # Evidence-based Rule Fallback
-            heart_prob = 10.0
-            if sys > 140: heart_prob += 20
-            is_smoker = health_data_dict['smoking'] == 'Yes'
-            if is_smoker: heart_prob += 15
-            if bmi > 30: heart_prob += 10
-            heart_prob = min(heart_prob, 95)
-
-        # 1. Gentle Opening
-        opening = "Thank you for sharing your health details. I will carefully review them to give you a safe and helpful health overview."
-
-        # 2. Current Health Summary
-        condition_summary = f"Your physical health shows a BMI of {bmi} ({'Healthy' if 18.5 <= bmi <= 25 else 'Above range' if bmi > 25 else 'Below range'}). "
-        condition_summary += f"Blood pressure is currently {bp_status} at {sys}/{dia} mmHg. "
-        condition_summary += f"Blood glucose is {sugar_status.lower()}. "
-        condition_summary += f"Mentally, you've reported a {health_data_dict['mood'].lower()} mood with {health_data_dict['stress_level'].lower()} stress."
-
-        # 3. Disease Risk Assessment
-        diabetes_prob = 15.0 if sugar_status == "Normal" else (45.0 if sugar_status == "Prediabetes" else 85.0)
-        risks = [
-            {"condition": "Diabetes Risk", "level": "Low" if diabetes_prob < 30 else ("Moderate" if diabetes_prob < 60 else "High"), "probability": diabetes_prob, "reasoning": f"Based on fasting glucose of {glu} mg/dL and HbA1c of {health_data_dict['hba1c']}%."},
-            {"condition": "Hypertension Risk", "level": "Low" if sys < 130 else "Moderate", "probability": 20 if sys < 130 else 50, "reasoning": f"Current BP is {sys}/{dia} mmHg."},
-            {"condition": "Cardiovascular Risk", "level": "Low" if heart_prob < 20 else ("Moderate" if heart_prob < 50 else "High"), "probability": heart_prob, "reasoning": "Determined by age, smoking status, systolic BP, and cholesterol levels."},
-            {"condition": "Metabolic Syndrome", "level": "Moderate" if bmi > 27 and sys > 130 else "Low", "probability": 40 if bmi > 27 and sys > 130 else 10, "reasoning": "Correlation between BMI, BP, and glucose levels."}
-        ]
-
-        # 4. Personalized Health Improvement Plan
-        plan = []
-        if bmi > 25: plan.append("Aim for 150 minutes of moderate aerobic activity weekly to manage weight.")
-        if sys > 130: plan.append("Reduce sodium intake and consider the DASH diet.")
-        if glu > 100: plan.append("Prioritize complex carbohydrates and lean proteins; limit refined sugars.")
-        if health_data_dict['stress_level'] == 'High': plan.append("Incorporate 10-15 minutes of mindfulness or breathing exercises daily.")
-        if health_data_dict['sleep'] < 7: plan.append("Try to establish a consistent sleep schedule to reach 7-8 hours of restful sleep.")
-        plan.append("Consult a licensed doctor if you experience persistent symptoms or to discuss these findings further.")
-        
-        # 5. Emotional Support Tone
-        support = "Many of these risks can be improved with small daily changes. You are taking a positive step by checking your health."
-
-        # 6. Mandatory Medical Disclaimer
-        disclaimer = "This assessment is for preventive health awareness only and does not replace a qualified medical professional. Please consult a licensed doctor for diagnosis or treatment decisions."
-
-        analysis = {
-            "bmi": bmi,
-            "bp_status": bp_status,
-            "sugar_status": sugar_status,
-            "health_score": health_score,
-            "opening": opening,
-            "summary": condition_summary,
-            "risks": risks,
-            "plan": plan,
-            "support": support,
-            "disclaimer": disclaimer,
-            "needs_doctor": any(r['level'] == 'High' for r in risks) or bp_status.startswith("Hypertension") or sugar_status == "Diabetes",
-            "conditions": [{"condition": r['condition'], "probability": r['probability']} for r in risks] # For backward compatibility with template if needed
-        }
-        
-        database.save_health_data(user_id, health_data_dict, json.dumps(analysis))
+        user_age = user['age'] if user else scoring.DEFAULT_AGE
+
+        # Collect all data fields and run the clinical + ML assessment
+        health_data_dict = scoring.parse_health_data(f)
+
+        if pipeline.ASYNC_ANALYSIS:
+            # Persist now, score in the background; the report page polls
+            record_id = database.create_pending_health_data(user_id, health_data_dict)
+            if record_id:
+                if not pipeline.submit_analysis(record_id, user_id, health_data_dict, user_age):
+                    # Queue saturated: score inline rather than drop the submission
+                    database.complete_health_analysis(record_id, user_id, scoring.assess(health_data_dict, user_age))
+                flash('Your health data was received. The AI analysis is being prepared.', 'success')
+                return redirect(url_for('health_report'))
+
+        analysis = scoring.assess(health_data_dict, user_age)
+        database.save_health_data(user_id, health_data_dict, analysis)
         flash('Comprehensive AI Health Analysis Complete!', 'success')
         return redirect(url_for('health_report'))
         
@@ -253,24 +183,66 @@ def health_report():
     if 'user_id' not in session or session.get('role') != 'user':
         return redirect(url_for('login'))
     
-    records = database.get_health_data(session['user_id'])
-    if not records:
+    latest = database.get_latest_health_rev(session['user_id'])
+    if not latest:
         return redirect(url_for('health_data'))
-    
-    latest_record = records[0]
-    analysis = json.loads(latest_record['analysis_result'])
-    return render_template('health_report.html', record=latest_record, analysis=analysis)
+
+    status = latest.get('status', database.STATUS_READY)
+    if status != database.STATUS_READY:
+        latest_record = database.get_health_record(latest['id'], user_id=session['user_id'])
+        return render_template('health_report_pending.html', record=latest_record, status=status)
+
+    def render():
+        record = database.get_health_record(latest['id'], user_id=session['user_id'])
+        return render_template('health_report.html', record=record, analysis=database.load_analysis(record['analysis_result']))
+    return cached_page(('health_report', session['user_id'], latest['id'], latest.get('analysis_rev', 0)), render)
+
+@app.route('/health/report/status/<record_id>')
+def health_report_status(record_id):
+    if 'user_id' not in session or session.get('role') != 'user':
+        return jsonify({"error": "Unauthorized"}), 401
+
+    status = database.get_health_status(record_id, session['user_id'])
+    if status is None:
+        return jsonify({"error": "Not found"}), 404
+    if status != database.STATUS_PENDING:
+        # Make the follow-up page load skip any stale cached copy of the record
+        session['cache_floor'] = time.time()
+    return jsonify({"status": status})
+
+BATCH_MAX_RECORDS = int(os.environ.get('BATCH_MAX_RECORDS', 10000))
+
+@app.route('/api/assess/batch', methods=['POST'])
+def assess_batch():
+    # Bulk scoring for partner screening camps (admin session required)
+    if not session.get('admin_logged_in'):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    payload = request.get_json(silent=True)
+    records = payload.get('records') if isinstance(payload, dict) else payload
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        return jsonify({"error": "Expected a JSON list of records or {\"records\": [...]}"}), 400
+    if len(records) > BATCH_MAX_RECORDS:
+        return jsonify({"error": f"Batch too large (max {BATCH_MAX_RECORDS} records)"}), 413
+
+    parsed = [scoring.parse_health_data(r) for r in records]
+    ages = [scoring.parse_num(r.get('age'), default=None, type_func=int) for r in records]
+    analyses = scoring.assess_batch(parsed, ages)
+    return jsonify({"count": len(analyses), "results": analyses})
 
 @app.route('/book/consultation', methods=['POST'])
 def book_consultation():
     if 'user_id' not in session or session.get('role') != 'user':
         return redirect(url_for('login'))
     
-    hospital = request.form.get('hospital', 'City General Hospital')
-    ticket_no = f"OP-{random.randint(10000, 99999)}"
-    date = datetime.now().strftime("%Y-%m-%d %H:%M")
-    
-    database.save_booking(session['user_id'], hospital, ticket_no, date)
+    hospital = request.form.get('hospital', tickets.DEFAULT_HOSPITAL)
+    if hospital not in tickets.HOSPITALS:
+        abort(400)
+    booking = tickets.book(session['user_id'], hospital)
+    if booking is None:
+        flash(f'No consultation slots are free in the next {tickets.BOOKING_DAYS_AHEAD} days. Please try again later.', 'danger')
+        return redirect(url_for('user_home'))
+    ticket_no, _ = booking
     return redirect(url_for('generate_ticket', ticket=ticket_no))
 
 @app.route('/generate/ticket')
@@ -278,8 +250,15 @@ def generate_ticket():
     if 'user_id' not in session or session.get('role') != 'user':
         return redirect(url_for('login'))
     
-    ticket_no = request.args.get('ticket')
-    return render_template('ticket.html', ticket_no=ticket_no, date=datetime.now().strftime("%B %d, %Y"))
+    booking = database.get_booking(session['user_id'], request.args.get('ticket'))
+    if not booking:
+        flash('Ticket not found.', 'danger')
+        return redirect(url_for('user_home'))
+    try:
+        date = datetime.strptime(booking['date'], "%Y-%m-%d %H:%M").strftime("%B %d, %Y, %I:%M %p")
+    except (TypeError, ValueError):
+        date = booking.get('date')
+    return render_template('ticket.html', ticket_no=booking['ticket_no'], hospital=booking['hospital_name'], date=date)
 
 @app.route('/health/diary', methods=['GET', 'POST'])
 def health_diary():
@@ -299,24 +278,91 @@ def health_diary():
         return redirect(url_for('health_diary'))
         
     entries = database.get_diary_entries(session['user_id'])
-    return render_template('health_diary.html', entries=entries)
+    trends = rollups.summarize(database.get_diary_rollup(session['user_id']))
+    return render_template('health_diary.html', entries=entries, trends=trends)
+
+# Timelines render at most this many assessments (newest first)
+HEALTH_HISTORY_LIMIT = int(os.environ.get('HEALTH_HISTORY_LIMIT', 100))
 
 @app.route('/medical/records')
 def medical_records():
     if 'user_id' not in session or session.get('role') != 'user':
         return redirect(url_for('login'))
     
-    records = database.get_health_data(session['user_id'])
-    treatments = database.get_treatments(session['user_id'])
-    
-    processed_records = []
-    for r in records:
-        processed_records.append({
-            'data': r,
-            'analysis': json.loads(r['analysis_result'])
-        })
-        
-    return render_template('medical_records.html', records=processed_records, treatments=treatments)
+    def render():
+        records = database.get_health_history(session['user_id'], limit=HEALTH_HISTORY_LIMIT)
+        treatments = database.get_treatments(session['user_id'])
+
+        processed_records = []
+        for r in records:
+            processed_records.append({
+                'data': r,
+                'analysis': database.load_analysis(r['analysis_result'])
+            })
+
+        return render_template('medical_records.html', records=processed_records, treatments=treatments,
+                               history_limit=HEALTH_HISTORY_LIMIT)
+
+    rev = database.get_records_rev(session['user_id'])
+    if rev is None:
+        return render()
+    return cached_page(('medical_records', session['user_id'], rev, HEALTH_HISTORY_LIMIT), render)
+
+# Vitals over time as column arrays, downsampled for charts.
+#   ?metrics=bp_systolic,bmi&points=300&method=lttb|minmax|avg&focus=health_score&days=365
+# lttb/minmax keep the shape of `focus` (default: the first metric).
+# Admins can pass ?user_id= to chart a patient.
+@app.route('/api/vitals')
+def api_vitals():
+    if session.get('admin_logged_in') and request.args.get('user_id'):
+        user_id = request.args['user_id']
+    elif 'user_id' in session and session.get('role') == 'user':
+        user_id = session['user_id']
+    else:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    metrics_arg = request.args.get('metrics')
+    names = [m.strip() for m in metrics_arg.split(',') if m.strip()] if metrics_arg else list(timeseries.VITALS)
+    unknown = [m for m in names if m not in timeseries.VITALS]
+    method = request.args.get('method', 'lttb')
+    if unknown or not names or method not in timeseries.METHODS:
+        return jsonify({"error": "Unknown metric or method",
+                        "metrics": list(timeseries.VITALS), "methods": timeseries.METHODS}), 400
+    points = max(10, min(request.args.get('points', timeseries.DEFAULT_POINTS, type=int), timeseries.MAX_POINTS))
+    days = request.args.get('days', type=int)
+    since = datetime.utcnow() - timedelta(days=days) if days else None
+
+    docs = database.get_health_series(user_id, timeseries.VITALS_PROJECTION, since=since)
+    return jsonify(timeseries.series(docs, names, points=points, method=method, focus=request.args.get('focus')))
+
+def _export_response(user_id):
+    """Stream ?format=ndjson|csv|parquet&collection=...&since=YYYY-MM-DD as a download."""
+    fmt = request.args.get('format', 'ndjson')
+    collection = request.args.get('collection') or ('all' if fmt == 'ndjson' else 'health_data')
+    collections = exporter.COLLECTIONS if collection == 'all' else [collection]
+    try:
+        since = datetime.strptime(request.args['since'], '%Y-%m-%d') if request.args.get('since') else None
+        # Bad arguments fail here, before any bytes are sent
+        chunks = exporter.export_stream(fmt, collections, user_id=user_id, since=since)
+    except ValueError as e:
+        return jsonify({"error": str(e), "formats": list(exporter.FORMATS), "collections": exporter.COLLECTIONS}), 400
+    return Response(stream_with_context(chunks), mimetype=exporter.FORMATS[fmt][0], headers={
+        'Content-Disposition': f'attachment; filename={exporter.filename(fmt, collections, user_id)}'
+    })
+
+# A patient's own records; NDJSON defaults to every collection in one file
+@app.route('/export/my-data')
+def export_my_data():
+    if 'user_id' not in session or session.get('role') != 'user':
+        return redirect(url_for('login'))
+    return _export_response(session['user_id'])
+
+# Auditor/warehouse exports: one patient with ?user_id=, everyone without
+@app.route('/admin/export')
+def admin_export():
+    if not session.get('admin_logged_in'):
+        return redirect(url_for('admin_login'))
+    return _export_response(request.args.get('user_id') or None)
 
 @app.route('/disease/info')
 def disease_info():
@@ -342,17 +388,36 @@ def admin_login():
             
     return render_template('admin_login.html')
 
+ADMIN_PAGE_SIZE = 50
+ADMIN_PAGE_SIZES = (25, 50, 100, 200)
+
 @app.route('/admin/dashboard')
 def admin_dashboard():
     if not session.get('admin_logged_in'):
         return redirect(url_for('admin_login'))
     
     query = request.args.get('search', '')
+    per_page = request.args.get('per_page', ADMIN_PAGE_SIZE, type=int)
+    if per_page not in ADMIN_PAGE_SIZES:
+        per_page = ADMIN_PAGE_SIZE
+    pager = None
     if query:
         users = database.search_users(query)
     else:
-        users = database.get_all_users()
-    return render_template('admin_dashboard.html', users=users, search_query=query)
+        after = request.args.get('after')
+        before = request.args.get('before')
+        users, has_more = database.get_users_page(after_id=after, before_id=before, limit=per_page)
+        # Keyset links: "before" walks back from the first row, "after" forward from the last
+        has_prev = has_more if before else bool(after)
+        has_next = True if before else has_more
+        pager = {
+            "per_page": per_page,
+            "sizes": ADMIN_PAGE_SIZES,
+            "total": database.count_users(),
+            "prev": users[0]['id'] if users and has_prev else None,
+            "next": users[-1]['id'] if users and has_next else None
+        }
+    return render_template('admin_dashboard.html', users=users, search_query=query, pager=pager)
 
 @app.route('/admin/add_patient', methods=['GET', 'POST'])
 def admin_add_patient():
@@ -377,13 +442,39 @@ def admin_add_patient():
             
     return render_template('register.html', is_admin=True) # Reuse register.html with a flag
 
+# Bulk onboarding from a CSV or JSONL upload; the file is read as a stream
+@app.route('/admin/import', methods=['GET', 'POST'])
+def admin_import():
+    if not session.get('admin_logged_in'):
+        return redirect(url_for('admin_login'))
+
+    report = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        fmt = request.form.get('format') or (importer.detect_format(upload.filename) if upload else None)
+        if not upload or not upload.filename:
+            flash('Choose a CSV or JSONL file to import.', 'danger')
+        elif fmt not in ('csv', 'jsonl'):
+            flash('Unsupported file type. Upload a .csv or .jsonl file.', 'danger')
+        else:
+            try:
+                report = importer.import_patients(upload.stream, fmt, dry_run=request.form.get('dry_run') == '1')
+            except Exception as e:
+                print(f"Patient Import Error: {e}")
+                flash(f'Import stopped: {e}', 'danger')
+        if report is not None and request.args.get('format') == 'json':
+            return jsonify(report)
+
+    return render_template('admin_import.html', report=report, fields=importer.FIELDS,
+                           max_errors=importer.MAX_REPORTED_ERRORS)
+
 @app.route('/admin/user/<user_id>')
 def admin_user_view(user_id):
     if not session.get('admin_logged_in'):
         return redirect(url_for('admin_login'))
     
     user = database.get_user_by_id(user_id)
-    health_records = database.get_health_data(user_id)
+    health_records = database.get_health_history(user_id, limit=HEALTH_HISTORY_LIMIT)
     treatments = database.get_treatments(user_id)
     
     # Process records for display
@@ -391,10 +482,11 @@ def admin_user_view(user_id):
     for r in health_records:
         processed_records.append({
             'data': r,
-            'analysis': json.loads(r['analysis_result'])
+            'analysis': database.load_analysis(r['analysis_result'])
         })
         
-    return render_template('admin_user_details.html', user=user, records=processed_records, treatments=treatments)
+    return render_template('admin_user_details.html', user=user, records=processed_records, treatments=treatments,
+                           history_limit=HEALTH_HISTORY_LIMIT)
 
 @app.route('/admin/user/<user_id>/add_treatment', methods=['POST'])
 def admin_add_treatment(user_id):
@@ -416,26 +508,64 @@ def admin_update_analysis(record_id):
     user_id = request.form.get('user_id')
     new_analysis_text = request.form.get('analysis_text')
     
-    # In a real app, you'd want to be more careful with JSON structure
-    # Here we'll just store the text if it's not JSON, or try to keep it as JSON
+    # A full JSON analysis replaces the stored one; plain text becomes the
+    # admin's manual summary, set in place on the subdocument
     try:
-        # Check if it's valid JSON
-        json.loads(new_analysis_text)
-        database.update_health_analysis(record_id, new_analysis_text)
-    except:
-        # If not, wrap it in a simple JSON structure or just store as text
-        # For simplicity in this demo, we'll just update it as a string
-        # Actually, let's just update the 'conditions' part or similar
-        # For now, let's assume the admin provides a summary
-        current_record = next((r for r in database.get_health_data(user_id) if r['id'] == record_id), None)
-        if current_record:
-            analysis = json.loads(current_record['analysis_result'])
-            analysis['manual_summary'] = new_analysis_text
-            database.update_health_analysis(record_id, json.dumps(analysis))
+        new_analysis = json.loads(new_analysis_text)
+    except (TypeError, ValueError):
+        new_analysis = None
+    if isinstance(new_analysis, dict):
+        database.update_health_analysis(record_id, new_analysis, override=True)
+    else:
+        database.set_manual_summary(record_id, new_analysis_text)
 
     flash('Diagnosis updated.', 'success')
     return redirect(url_for('admin_user_view', user_id=user_id))
 
+# Population analytics, read from the materialized summaries only
+@app.route('/admin/analytics')
+def admin_analytics():
+    if not session.get('admin_logged_in'):
+        return redirect(url_for('admin_login'))
+    return render_template('admin_analytics.html', stats=analytics.dashboard())
+
+@app.route('/admin/analytics/refresh', methods=['POST'])
+def admin_analytics_refresh():
+    if not session.get('admin_logged_in'):
+        return redirect(url_for('admin_login'))
+    try:
+        result = analytics.refresh()
+        if result is None:
+            flash('A refresh is already running.', 'info')
+        else:
+            flash('Analytics are up to date.', 'success')
+    except Exception as e:
+        print(f"Analytics Refresh Error: {e}")
+        flash('Analytics refresh failed.', 'danger')
+    return redirect(url_for('admin_analytics'))
+
+# Slowest profiled requests in this worker (PROFILER=header|always)
+@app.route('/admin/profiles')
+def admin_profiles():
+    if not session.get('admin_logged_in'):
+        return redirect(url_for('admin_login'))
+    return render_template('admin_profiles.html', profiles=profiler.slowest.entries(), settings=profiler.status())
+
+@app.route('/admin/profiles/<name>')
+def admin_profile_download(name):
+    if not session.get('admin_logged_in'):
+        return redirect(url_for('admin_login'))
+    path = profiler.profile_path(name)
+    if not path:
+        abort(404)
+    return send_file(path, mimetype='text/plain', as_attachment=True, download_name=name)
+
+@app.route('/admin/cache/stats')
+def admin_cache_stats():
+    if not session.get('admin_logged_in'):
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(dict(database.cache.stats(), pages=page_cache.stats()))
+
 @app.route('/logout')
 def logout():
     session.clear()
@@ -447,18 +577,71 @@ def logout():
 def health_check():
     return "App is running", 200
 
-# Use a flagged initialization to avoid issues in some environments
-_db_initialized = False
-
-@app.before_request
-def initialize_database():
-    global _db_initialized
-    if not _db_initialized:
-        try:
-            database.init_db()
-            _db_initialized = True
-        except Exception as e:
-            print(f"Database initialization failed: {e}")
+# Readiness probe: database round trip plus this worker's pool state.
+# Indexes are created by `python manage.py init-db`, not on requests.
+@app.route('/health/ready')
+def readiness_check():
+    ok, latency_ms, error = database.ping()
+    body = {
+        "status": "ready" if ok else "unavailable",
+        "database": {"ok": ok, "latency_ms": latency_ms, "error": error},
+        "pool": database.pool_state(),
+        "model": scoring.model_status()
+    }
+    return jsonify(body), 200 if ok else 503
+
+def process_metrics():
+    """Sampled at scrape time from state the app already keeps."""
+    stats = database.cache.stats()
+    pages = page_cache.stats()
+    pool = database.pool_stats
+    return [
+        ("cache_hits_total", "counter", "Read cache hits", stats['hits']),
+        ("cache_misses_total", "counter", "Read cache misses", stats['misses']),
+        ("cache_entries", "gauge", "Entries held in the read cache", stats['size']),
+        ("page_cache_hits_total", "counter", "Rendered page cache hits", pages['hits']),
+        ("page_cache_misses_total", "counter", "Rendered page cache misses", pages['misses']),
+        ("page_cache_entries", "gauge", "Rendered pages held in memory", pages['size']),
+        ("analysis_queue_depth", "gauge", "Async analyses queued or running", pipeline.queue_depth()),
+        ("mongo_pool_checked_out", "gauge", "MongoDB connections checked out", pool.checked_out),
+        ("mongo_pool_open", "gauge", "MongoDB connections open", pool.open),
+        ("model_ready", "gauge", "1 once the scoring model is loaded", int(scoring.ML_READY)),
+    ]
+
+metrics.REGISTRY.add_collector(process_metrics)
+
+# Prometheus text format. Each worker process reports its own counters.
+@app.route('/metrics')
+def metrics_endpoint():
+    if metrics.METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {metrics.METRICS_TOKEN}":
+        return "Unauthorized", 401
+    return metrics.REGISTRY.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+# Hashed names never change content, so browsers can keep them for a year.
+# Serves the .br/.gz sibling the build wrote when the client accepts it.
+@app.route('/static/dist/<path:filename>')
+def static_dist(filename):
+    folder = os.path.join(app.static_folder, static_build.DIST)
+    encodings = (STATIC_MANIFEST or {}).get('encodings', {}).get(filename, [])
+    encoding = next((e for e in encodings if request.accept_encodings[e]), None)
+    suffix = {'br': '.br', 'gzip': '.gz'}.get(encoding, '')
+    response = send_from_directory(folder, filename + suffix, max_age=STATIC_MAX_AGE,
+                                   mimetype=mimetypes.guess_type(filename)[0])
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if encodings:
+        response.vary.add('Accept-Encoding')
+    response.cache_control.immutable = True
+    return response
+
+# Keep this after the last route: it wraps every registered view
+if metrics.METRICS_ENABLED:
+    metrics.instrument_app(app)
+
+profiler.install(app)
+
+# Outermost, so it sees the final headers of every response
+compression.install(app)
 
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 5000))
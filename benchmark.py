@@ -0,0 +1,298 @@
+"""Load-test every main route against an in-memory MongoDB stand-in.
+
+    pip install mongomock
+    python benchmark.py --users 500 --requests 400 --concurrency 8 --output bench.json
+
+The app is driven in-process through Flask test clients (one per worker
+thread) against mongomock, seeded deterministically from --seed, and the
+per-route throughput and p50/p95/p99 latencies are written as JSON so runs
+can be diffed across commits.
+"""
+import argparse
+import functools
+import inspect
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import database
+import metrics
+import scoring
+
+ROUTES = ['health_submit', 'health_report', 'medical_records', 'admin_search', 'admin_user_view']
+
+MOODS = ['Happy', 'Anxious', 'Sad', 'Stressed']
+FIRST_NAMES = ['Alice', 'Bob', 'Chitra', 'Daniel', 'Fatima', 'George', 'Hana', 'Ivan', 'Jaya', 'Kwame', 'Lena', 'Mohan']
+LAST_NAMES = ['Green', 'Smith', 'Nair', 'Okafor', 'Silva', 'Kim', 'Rossi', 'Haddad', 'Novak', 'Menon']
+
+
+def random_health_form(rng):
+    return {
+        'sex': rng.choice(['Male', 'Female']),
+        'family_history': rng.choice(['Yes', 'No']),
+        'smoking': rng.choice(['Yes', 'No']),
+        'alcohol': rng.choice(['Never', 'Occasionally', 'Regularly']),
+        'activity': rng.choice(['Sedentary', 'Moderate', 'Active']),
+        'diet': rng.choice(['Balanced', 'Vegetarian', 'High Fat']),
+        'sleep': str(rng.randint(4, 9)),
+        'environmental': rng.choice(['Urban', 'Rural']),
+        'stress_level': rng.choice(['Low', 'Moderate', 'High']),
+        'mood': rng.choice(MOODS),
+        'sleep_quality': rng.choice(['Restful', 'Interrupted', 'Insomnia']),
+        'lifestyle_balance': rng.choice(['Great', 'Good', 'Poor']),
+        'height': str(rng.randint(150, 195)),
+        'weight': str(rng.randint(45, 120)),
+        'bp_systolic': str(rng.randint(95, 175)),
+        'bp_diastolic': str(rng.randint(60, 105)),
+        'fasting_glucose': str(rng.randint(75, 220)),
+        'hba1c': str(round(rng.uniform(4.5, 9.0), 1)),
+        'cholesterol': str(rng.randint(140, 290)),
+        'ldl': str(rng.randint(70, 190)),
+        'hdl': str(rng.randint(30, 80)),
+        'triglycerides': str(rng.randint(80, 300)),
+    }
+
+
+def seed(rng, users, records_per_user, diary_per_user):
+    """Insert realistic users, assessments and diary entries; returns user dicts."""
+    now = datetime.utcnow()
+    user_docs = []
+    for i in range(users):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        username = f"patient{i:06d}"
+        phone = f"+1 555-{rng.randint(1000000, 9999999)}"
+        user_docs.append({
+            "name": name, "age": rng.randint(18, 90), "gender": rng.choice(['Male', 'Female']),
+            "phone": phone, "address": f"{rng.randint(1, 999)} Main St", "blood_group": rng.choice(['A+', 'B+', 'O+', 'AB-']),
+            "username": username, "password": "bench",
+            "search_tokens": database.build_search_tokens(name, username, phone),
+            "created_at": now
+        })
+    database.db.users.insert_many(user_docs)
+    seeded = [{"id": str(u['_id']), "username": u['username'], "name": u['name'], "age": u['age']} for u in user_docs]
+
+    for u in seeded:
+        forms = [scoring.parse_health_data(random_health_form(rng)) for _ in range(records_per_user)]
+        analyses = scoring.assess_batch(forms, [u['age']] * len(forms))
+        docs = []
+        for j, (data, analysis) in enumerate(zip(forms, analyses)):
+            doc = {"user_id": u['id'], "analysis_result": analysis, "date": now - timedelta(days=7 * j)}
+            doc.update(data)
+            docs.append(doc)
+        if docs:
+            database.db.health_data.insert_many(docs)
+        diary = [{
+            "user_id": u['id'], "mood": rng.choice(MOODS), "steps": rng.randint(1000, 15000),
+            "water_intake": round(rng.uniform(0.5, 4.0), 1), "sleep_hours": round(rng.uniform(4, 9), 1),
+            "symptoms": "", "note": "", "date": now - timedelta(days=d)
+        } for d in range(diary_per_user)]
+        if diary:
+            database.db.health_diary.insert_many(diary)
+    return seeded
+
+
+def serialize_mongomock(mongomock):
+    """Put one lock around every mongomock collection and cursor call.
+
+    mongomock isn't thread-safe: concurrent writers make readers fail with
+    "dictionary changed size during iteration", and the routes swallow that
+    as an empty result. The lock keeps the numbers honest; the fake DB is
+    then serialized, so compare runs with each other, not with production.
+    """
+    lock = threading.RLock()
+
+    def locked(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with lock:
+                return fn(*args, **kwargs)
+        return wrapper
+
+    for cls in (mongomock.collection.Collection, mongomock.collection.Cursor):
+        for name, fn in list(vars(cls).items()):
+            if inspect.isfunction(fn) and (not name.startswith('_') or name in ('__next__', '__getitem__')):
+                setattr(cls, name, locked(fn))
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+class RouteDriver:
+    """Builds per-thread logged-in clients and issues one request per call."""
+
+    def __init__(self, app, users, rng_seed):
+        self.app = app
+        self.users = users
+        self.rng_seed = rng_seed
+        self.local = threading.local()
+
+    def _state(self):
+        state = getattr(self.local, 'state', None)
+        if state is None:
+            rng = random.Random(f"{self.rng_seed}-{threading.get_ident()}")
+            user = rng.choice(self.users)
+            patient = self.app.test_client()
+            patient.post('/login', data={'u_login': user['username'], 'p_login': 'bench'})
+            admin = self.app.test_client()
+            admin.post('/admin/login', data={'admin_u': 'admin', 'admin_p': 'admin123'})
+            state = self.local.state = {"rng": rng, "patient": patient, "admin": admin}
+        return state
+
+    def request(self, route):
+        state = self._state()
+        rng = state['rng']
+        if route == 'health_submit':
+            resp = state['patient'].post('/health/data', data=random_health_form(rng))
+            ok = resp.status_code == 302
+        elif route == 'health_report':
+            resp = state['patient'].get('/health/report')
+            ok = resp.status_code == 200
+        elif route == 'medical_records':
+            resp = state['patient'].get('/medical/records')
+            ok = resp.status_code == 200
+        elif route == 'admin_search':
+            term = rng.choice([rng.choice(FIRST_NAMES)[:3], rng.choice(LAST_NAMES).lower(), "555"])
+            resp = state['admin'].get('/admin/dashboard', query_string={'search': term})
+            ok = resp.status_code == 200
+        elif route == 'admin_user_view':
+            resp = state['admin'].get(f"/admin/user/{rng.choice(self.users)['id']}")
+            ok = resp.status_code == 200
+        else:
+            raise ValueError(f"Unknown route {route}")
+        return ok
+
+
+def run_route(driver, route, requests, concurrency, warmup):
+    for _ in range(warmup):
+        driver.request(route)
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            ok = driver.request(route)
+        except Exception:
+            ok = False
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    # Routes swallow database errors, so a 200 alone doesn't mean the request worked
+    db_errors_before = metrics.DB_ERRORS.total()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+    db_errors = metrics.DB_ERRORS.total() - db_errors_before
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "db_errors": int(db_errors),
+        "concurrency": concurrency,
+        "throughput_rps": round(requests / wall, 2) if wall else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "max_ms": round(latencies[-1], 3) if latencies else 0.0
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Healthcare Hub route benchmark")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--records-per-user', type=int, default=20)
+    parser.add_argument('--diary-per-user', type=int, default=30)
+    parser.add_argument('--requests', type=int, default=200, help="Measured requests per route")
+    parser.add_argument('--warmup', type=int, default=10, help="Unmeasured requests per route")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--routes', default=','.join(ROUTES), help=f"Comma-separated subset of {','.join(ROUTES)}")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-cache', action='store_true', help="Disable the per-process read cache")
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    routes = [r.strip() for r in args.routes.split(',') if r.strip()]
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(sorted(unknown))}")
+
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit("benchmark.py needs the in-memory MongoDB stand-in: pip install mongomock")
+
+    serialize_mongomock(mongomock)
+    database.use_client(mongomock.MongoClient())
+    database.init_db()
+    if args.no_cache:
+        database.cache.maxsize = 0
+    scoring.get_model()
+
+    rng = random.Random(args.seed)
+    seed_started = time.perf_counter()
+    users = seed(rng, args.users, args.records_per_user, args.diary_per_user)
+    seed_seconds = time.perf_counter() - seed_started
+
+    from app import app
+    driver = RouteDriver(app, users, args.seed)
+    results = {}
+    for route in routes:
+        results[route] = run_route(driver, route, args.requests, args.concurrency, args.warmup)
+        print(f"{route:>16}: {results[route]['throughput_rps']:>8} req/s  p50 {results[route]['p50_ms']} ms  "
+              f"p95 {results[route]['p95_ms']} ms  p99 {results[route]['p99_ms']} ms  errors {results[route]['errors']}  db errors {results[route]['db_errors']}",
+              file=sys.stderr)
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "model_backend": scoring.model_status()['backend'],
+            "cache": database.cache.stats(),
+            "seed_seconds": round(seed_seconds, 2),
+            "params": vars(args)
+        },
+        "routes": results,
+        "failed": any(r['errors'] or r['db_errors'] for r in results.values())
+    }
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+    if report['failed']:
+        sys.exit("Benchmark failed: some requests errored (see errors/db_errors per route)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+MISSING = object()
+
+# Entries stored before this timestamp are treated as misses for the current
+# request. The app sets it from the session after that session writes, so a
+# user always reads their own writes even when another worker served the POST.
+read_floor = ContextVar('cache_read_floor', default=0.0)
+
+
+class TTLCache:
+    """Thread-safe, bounded LRU cache with per-entry TTL and tag invalidation.
+
+    Values are shared between requests and must be treated as read-only.
+    Tags group entries (e.g. everything cached for one user) so a write can
+    invalidate them together.
+    """
+
+    def __init__(self, maxsize=1024, ttl=30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (stored_at, value, tags)
+        self._tags = {}              # tag -> set of keys
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get(self, key, default=MISSING):
+        if not self.enabled:
+            return default
+        now = time.time()
+        floor = read_floor.get()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            stored_at, value, _ = entry
+            if now - stored_at > self.ttl or stored_at < floor:
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, tags=()):
+        if not self.enabled:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.time(), value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.maxsize:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader, tags=()):
+        """Return the cached value or call loader() and cache its result.
+
+        Exceptions from loader propagate and nothing is cached; None results
+        are not cached either.
+        """
+        value = self.get(key)
+        if value is not MISSING:
+            return value
+        value = loader()
+        if value is not None:
+            self.set(key, value, tags)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+                self.invalidations += 1
+
+    def invalidate_tag(self, tag):
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+    def _remove(self, key):
+        # Caller holds the lock
+        _, _, tags = self._data.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
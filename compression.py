@@ -0,0 +1,182 @@
+import itertools
+import os
+import time
+import zlib
+from werkzeug.http import parse_accept_header
+import metrics
+import static_build
+
+# gzip/brotli for dynamic responses, as WSGI middleware around app.wsgi_app.
+# Buffered responses under COMPRESS_MIN_SIZE bytes go out as they are;
+# streamed ones (exports) have no Content-Length and are compressed chunk by
+# chunk, flushing after each so the client keeps receiving data.
+COMPRESS_ENABLED = os.environ.get('COMPRESS', '1') == '1'
+MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+# zlib level 1-9 and brotli quality 0-11; the defaults favour CPU over the last few percent
+GZIP_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/json', 'application/x-ndjson', 'application/javascript', 'image/svg+xml',
+}
+# Nothing to compress (or not allowed to) for these
+SKIP_STATUSES = {204, 206, 304}
+
+
+# Brotli is optional (pip install Brotli); gzip only when it's missing
+brotli = static_build.import_brotli()
+ENCODINGS = ['br', 'gzip'] if brotli else ['gzip']
+
+
+def negotiate(accept_encoding):
+    """The encoding to use for this Accept-Encoding header, or None."""
+    if not accept_encoding:
+        return None
+    return parse_accept_header(accept_encoding).best_match(ENCODINGS)
+
+
+class _Gzip:
+    def __init__(self, level):
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 31)   # wbits 31 = gzip container
+
+    def compress(self, data):
+        return self._z.compress(data)
+
+    def flush(self):
+        return self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._z.flush()
+
+
+class _Brotli:
+    def __init__(self, quality):
+        self._c = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._c.process(data)
+
+    def flush(self):
+        return self._c.flush()
+
+    def finish(self):
+        return self._c.finish()
+
+
+def compressor(encoding, level=None):
+    if encoding == 'br':
+        return _Brotli(BROTLI_QUALITY if level is None else level)
+    return _Gzip(GZIP_LEVEL if level is None else level)
+
+
+def _header(headers, name):
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def eligible(status, headers, min_size=MIN_SIZE):
+    """Whether a response with these headers may be compressed (ignoring the client)."""
+    if int(status.split(' ', 1)[0]) in SKIP_STATUSES:
+        return False
+    content_type = (_header(headers, 'Content-Type') or '').split(';', 1)[0].strip().lower()
+    if content_type not in COMPRESSIBLE_TYPES:
+        return False
+    # Precompressed static files already carry Content-Encoding
+    if _header(headers, 'Content-Encoding') or _header(headers, 'Content-Range'):
+        return False
+    if 'no-transform' in (_header(headers, 'Cache-Control') or ''):
+        return False
+    length = _header(headers, 'Content-Length')
+    return length is None or int(length) >= min_size
+
+
+class CompressionMiddleware:
+    """Compress eligible responses with the best encoding the client accepts."""
+
+    def __init__(self, app, min_size=MIN_SIZE, level=None):
+        self.app = app
+        self.min_size = min_size
+        self.level = level
+
+    def __call__(self, environ, start_response):
+        encoding = None if environ.get('REQUEST_METHOD') == 'HEAD' else negotiate(environ.get('HTTP_ACCEPT_ENCODING'))
+        state = {}
+
+        def start(status, headers, exc_info=None):
+            state['started'] = True
+            if not eligible(status, headers, self.min_size):
+                return start_response(status, headers, exc_info)
+            vary = _header(headers, 'Vary')
+            headers = [(k, v) for k, v in headers if k.lower() != 'vary']
+            headers.append(('Vary', f"{vary}, Accept-Encoding" if vary else 'Accept-Encoding'))
+            if encoding:
+                state['streamed'] = _header(headers, 'Content-Length') is None
+                headers = [(k, v) for k, v in headers if k.lower() != 'content-length']
+                # Same entity, different bytes: a strong validator would be wrong now
+                etag = _header(headers, 'ETag')
+                if etag and not etag.startswith('W/'):
+                    headers = [(k, v) for k, v in headers if k.lower() != 'etag'] + [('ETag', 'W/' + etag)]
+                headers.append(('Content-Encoding', encoding))
+                state['compressor'] = compressor(encoding, self.level)
+            return start_response(status, headers, exc_info)
+
+        app_iter = self.app(environ, start)
+        if 'compressor' in state:
+            return self._compress(app_iter, encoding, state)
+        if encoding and 'started' not in state:
+            # A generator app calls start_response on its first step
+            return self._compress(app_iter, encoding, state)
+        return app_iter
+
+    def _compress(self, app_iter, encoding, state):
+        chunks = iter(app_iter)
+        bytes_in = bytes_out = 0
+        cpu = 0.0
+        try:
+            # Pull up to the first non-empty chunk, so start_response has run
+            first = b''
+            for first in chunks:
+                if first:
+                    break
+            if 'compressor' not in state:
+                yield first
+                yield from chunks
+                return
+            z, streamed = state['compressor'], state['streamed']
+            for chunk in itertools.chain([first], chunks):
+                if not chunk:
+                    continue
+                started = time.thread_time()
+                out = z.compress(chunk)
+                if streamed:
+                    out += z.flush()
+                cpu += time.thread_time() - started
+                bytes_in += len(chunk)
+                bytes_out += len(out)
+                if out:
+                    yield out
+            started = time.thread_time()
+            out = z.finish()
+            cpu += time.thread_time() - started
+            bytes_out += len(out)
+            yield out
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+            if 'compressor' in state:
+                metrics.COMPRESSED_RESPONSES.labels(encoding).inc()
+                metrics.COMPRESSION_BYTES_IN.labels(encoding).inc(bytes_in)
+                metrics.COMPRESSION_BYTES_OUT.labels(encoding).inc(bytes_out)
+                metrics.COMPRESSION_CPU.labels(encoding).observe(cpu)
+
+
+def install(app):
+    """Wrap app.wsgi_app. Does nothing when COMPRESS=0."""
+    if not COMPRESS_ENABLED:
+        return False
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app)
+    return True
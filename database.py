@@ -1,21 +1,148 @@
 import pymongo
+from pymongo import monitoring
+from bson.errors import InvalidId
 from bson.objectid import ObjectId
 import os
+import re
+import sys
+import json
+import time
+import inspect
+import threading
 from datetime import datetime
+from cache import TTLCache
+import metrics
+import rollups
 
 # Connection setup
 # Priority: Environment variable -> Localhost
 MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
 DB_NAME = os.environ.get('MONGO_DB', 'healthcare_platform')
 
-try:
-    client = pymongo.MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-    db = client[DB_NAME]
-    # Test connection
-    client.server_info()
-except Exception as e:
-    print(f"MongoDB Connection Error: {e}")
-    # Fallback/Error handle as needed
+# Optional pool / timeout tuning: env var -> MongoClient keyword
+MONGO_CLIENT_OPTIONS = {
+    'MONGO_MAX_POOL_SIZE': ('maxPoolSize', int),
+    'MONGO_MIN_POOL_SIZE': ('minPoolSize', int),
+    'MONGO_MAX_IDLE_TIME_MS': ('maxIdleTimeMS', int),
+    'MONGO_WAIT_QUEUE_TIMEOUT_MS': ('waitQueueTimeoutMS', int),
+    'MONGO_CONNECT_TIMEOUT_MS': ('connectTimeoutMS', int),
+    'MONGO_SOCKET_TIMEOUT_MS': ('socketTimeoutMS', int),
+    'MONGO_SERVER_SELECTION_TIMEOUT_MS': ('serverSelectionTimeoutMS', int),
+    'MONGO_COMPRESSORS': ('compressors', str),   # e.g. "zstd,snappy,zlib"
+}
+
+def client_options():
+    options = {'serverSelectionTimeoutMS': 5000}
+    for env_name, (option, cast) in MONGO_CLIENT_OPTIONS.items():
+        value = os.environ.get(env_name)
+        if value:
+            options[option] = cast(value)
+    return options
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool counters for the readiness endpoint."""
+
+    def __init__(self):
+        self.open = 0
+        self.checked_out = 0
+        self.checkout_failures = 0
+        self.cleared = 0
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): self.cleared += 1
+    def pool_closed(self, event): pass
+    def connection_created(self, event): self.open += 1
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): self.open -= 1
+    def connection_check_out_started(self, event): pass
+    def connection_check_out_failed(self, event): self.checkout_failures += 1
+    def connection_checked_out(self, event): self.checked_out += 1
+    def connection_checked_in(self, event): self.checked_out -= 1
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+pool_stats = PoolStats()
+
+def get_client():
+    """Return this process's MongoClient, creating it on first use.
+
+    MongoClient is not fork-safe, so a client inherited from a parent
+    process (e.g. gunicorn --preload) is replaced rather than reused.
+    Creation does not block on the server; pymongo connects lazily.
+    """
+    global _client, _client_pid, pool_stats
+    if _client is not None and _client_pid == os.getpid():
+        return _client
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            pool_stats = PoolStats()
+            _client = pymongo.MongoClient(MONGO_URI, event_listeners=[pool_stats], **client_options())
+            _client_pid = os.getpid()
+        return _client
+
+def get_db():
+    return get_client()[DB_NAME]
+
+def use_client(client):
+    """Install a pre-built client (e.g. mongomock for benchmarks) for this process."""
+    global _client, _client_pid
+    with _client_lock:
+        _client = client
+        _client_pid = os.getpid()
+    cache.clear()
+
+
+class _LazyDatabase:
+    """Module-level `db` handle that resolves the per-process client on access."""
+
+    def __getattr__(self, name):
+        return getattr(get_db(), name)
+
+    def __getitem__(self, name):
+        return get_db()[name]
+
+
+db = _LazyDatabase()
+
+def ping():
+    """Round-trip the server; returns (ok, latency_ms, error)."""
+    started = time.perf_counter()
+    try:
+        get_db().command('ping')
+        return True, round((time.perf_counter() - started) * 1000, 2), None
+    except Exception as e:
+        return False, round((time.perf_counter() - started) * 1000, 2), str(e)
+
+def pool_state():
+    options = get_client().options.pool_options
+    return {
+        "pid": os.getpid(),
+        "max_pool_size": options.max_pool_size,
+        "min_pool_size": options.min_pool_size,
+        "open_connections": pool_stats.open,
+        "checked_out": pool_stats.checked_out,
+        "checkout_failures": pool_stats.checkout_failures,
+        "pool_clears": pool_stats.cleared
+    }
+
+# Per-process read cache for hot per-user lookups. Entries are tagged with
+# the user id and dropped by the writes below; CACHE_MAXSIZE=0 disables it.
+cache = TTLCache(
+    maxsize=int(os.environ.get('CACHE_MAXSIZE', 2048)),
+    ttl=float(os.environ.get('CACHE_TTL', 30))
+)
+
+def _projection_key(projection):
+    return tuple(sorted(projection)) if projection else None
+
+def _log_error(label, detail, operation):
+    """Print like before, and count the failure against `operation` (the function name)."""
+    print(f"{label} Error: {detail}")
+    metrics.DB_ERRORS.labels(operation).inc()
 
 def mongo_to_dict(doc):
     """Helper to convert MongoDB document to a format compatible with the app's expectations."""
@@ -30,105 +157,553 @@ def init_db():
     """Initialize collections and indexes."""
     try:
         db.users.create_index("username", unique=True)
-        db.health_data.create_index("user_id")
+        db.users.create_index("search_tokens")
+        db.health_data.create_index([("user_id", pymongo.ASCENDING), ("date", pymongo.DESCENDING)])
+        db.health_data.create_index("analysis_result.needs_doctor")
+        db.health_data.create_index("status", partialFilterExpression={"status": "pending"})
+        db.health_data.create_index("date")
+        db.health_data.create_index("analyzed_at")  # analytics watermark scans
         db.bookings.create_index("user_id")
+        # Allocated tickets only; legacy random OP-xxxxx numbers may repeat
+        db.bookings.create_index([("hospital_name", pymongo.ASCENDING), ("ticket_no", pymongo.ASCENDING)],
+                                 unique=True, partialFilterExpression={"slot_id": {"$exists": True}})
         db.treatments.create_index("user_id")
         db.health_diary.create_index("user_id")
         print("MongoDB initialized with indexes.")
     except Exception as e:
-        print(f"Index creation failed: {e}")
+        _log_error("Index Creation", e, "init_db")
+
+def phone_digits(phone):
+    return re.sub(r'\D', '', phone or '')
+
+def build_search_tokens(name, username, phone):
+    """Normalized tokens backing the indexed patient search.
+
+    Lowercase name words and username, plus the phone as bare digits and as
+    its last 10 digits so numbers match with or without a country code.
+    """
+    tokens = set(re.findall(r'\w+', (name or '').lower()))
+    if username:
+        tokens.add(username.lower())
+    digits = phone_digits(phone)
+    if digits:
+        tokens.add(digits)
+        tokens.add(digits[-10:])
+    return sorted(tokens)
+
+def build_user_doc(name, age, gender, phone, address, blood_group, username, password, created_at=None):
+    return {
+        "name": name,
+        "age": int(age),
+        "gender": gender,
+        "phone": phone,
+        "address": address,
+        "blood_group": blood_group,
+        "username": username,
+        "password": password,
+        "search_tokens": build_search_tokens(name, username, phone),
+        "created_at": created_at or datetime.utcnow()
+    }
 
 def register_user(name, age, gender, phone, address, blood_group, username, password):
     try:
-        db.users.insert_one({
-            "name": name,
-            "age": int(age),
-            "gender": gender,
-            "phone": phone,
-            "address": address,
-            "blood_group": blood_group,
-            "username": username,
-            "password": password,
-            "created_at": datetime.utcnow()
-        })
+        db.users.insert_one(build_user_doc(name, age, gender, phone, address, blood_group, username, password))
         return True
     except pymongo.errors.DuplicateKeyError:
         return False
     except Exception as e:
-        print(f"Registration Error: {e}")
+        _log_error("Registration", e, "register_user")
         return False
 
+DUPLICATE_KEY = 11000
+
+def insert_users(docs):
+    """Unordered bulk insert. Returns (inserted, {doc index: error message}).
+
+    One bad row (e.g. a taken username) doesn't stop the rest of the batch.
+    """
+    if not docs:
+        return 0, {}
+    try:
+        result = db.users.insert_many(docs, ordered=False)
+        return len(result.inserted_ids), {}
+    except pymongo.errors.BulkWriteError as e:
+        failed = {}
+        for err in e.details.get('writeErrors', []):
+            if err.get('code') == DUPLICATE_KEY:
+                failed[err['index']] = "username already exists"
+            else:
+                failed[err['index']] = err.get('errmsg', 'write failed')
+        return e.details.get('nInserted', len(docs) - len(failed)), failed
+
 def check_user(username, password):
     try:
         user = db.users.find_one({"username": username, "password": password})
         return mongo_to_dict(user)
     except Exception as e:
-        print(f"Check User Error: {e}")
+        _log_error("Check User", e, "check_user")
         return None
 
 def get_user_by_id(user_id):
     try:
-        user = db.users.find_one({"_id": ObjectId(user_id)})
-        return mongo_to_dict(user)
-    except:
+        return cache.get_or_load(
+            ('user', user_id),
+            lambda: mongo_to_dict(db.users.find_one({"_id": ObjectId(user_id)})),
+            tags=(user_id,)
+        )
+    except (InvalidId, TypeError):
+        return None  # Malformed id from a URL or stale session: not a database error
+    except Exception as e:
+        _log_error("Get User", e, "get_user_by_id")
         return None
 
-def get_all_users():
+# Columns shown in the admin patient table
+USER_LIST_PROJECTION = {"name": 1, "gender": 1, "phone": 1, "username": 1}
+
+def count_users():
+    """Approximate patient count from collection metadata (no scan)."""
     try:
-        users = db.users.find()
-        return [mongo_to_dict(u) for u in users]
+        return db.users.estimated_document_count()
     except Exception as e:
-        print(f"Get All Users Error: {e}")
-        return []
+        _log_error("Count Users", e, "count_users")
+        return 0
 
-def search_users(query):
+def get_users_page(after_id=None, before_id=None, limit=50):
+    """Keyset-paginated patient listing ordered by _id.
+
+    Returns (users, has_more) where has_more tells whether another page
+    exists in the direction of travel. Cost is independent of page depth.
+    """
     try:
-        regex_query = {"$regex": query, "$options": "i"}
-        users = db.users.find({
-            "$or": [
-                {"name": regex_query},
-                {"phone": regex_query},
-                {"username": regex_query}
-            ]
-        })
-        return [mongo_to_dict(u) for u in users]
+        if before_id:
+            query, direction = {"_id": {"$lt": ObjectId(before_id)}}, -1
+        elif after_id:
+            query, direction = {"_id": {"$gt": ObjectId(after_id)}}, 1
+        else:
+            query, direction = {}, 1
+        cursor = db.users.find(query, USER_LIST_PROJECTION).sort("_id", direction).limit(limit + 1)
+        users = [mongo_to_dict(u) for u in cursor]
+        has_more = len(users) > limit
+        users = users[:limit]
+        if direction == -1:
+            users.reverse()
+        return users, has_more
+    except InvalidId:
+        return [], False  # Tampered ?after=/?before= cursor
     except Exception as e:
-        print(f"Search Users Error: {e}")
+        _log_error("Get Users Page", e, "get_users_page")
+        return [], False
+
+SEARCH_MAX_QUERY_LENGTH = 64
+SEARCH_MAX_TERMS = 4
+
+def search_query_terms(query):
+    """Split a search box query into normalized prefix terms."""
+    query = (query or '')[:SEARCH_MAX_QUERY_LENGTH]
+    # Phone-like input ("+1 (555) 01-99") searches as one digit string
+    if re.fullmatch(r'[\d\s+()\-.]+', query) and re.search(r'\d', query):
+        return [phone_digits(query)]
+    return re.findall(r'\w+', query.lower())[:SEARCH_MAX_TERMS]
+
+def search_users(query, limit=50):
+    """Indexed prefix search over name words, username and phone digits.
+
+    Every term must prefix-match one of the user's search_tokens. Anchored,
+    escaped, case-sensitive regexes on the lowercase tokens turn into index
+    range scans, so user input can never become an expensive pattern.
+    """
+    terms = search_query_terms(query)
+    if not terms:
+        return []
+    try:
+        conditions = [{"search_tokens": {"$regex": "^" + re.escape(t)}} for t in terms]
+        cursor = db.users.find(
+            conditions[0] if len(conditions) == 1 else {"$and": conditions},
+            USER_LIST_PROJECTION
+        ).limit(min(limit * 4, 200))
+        users = [mongo_to_dict(u) for u in cursor]
+    except Exception as e:
+        _log_error("Search Users", e, "search_users")
         return []
 
+    # Rank exact username / name matches above partial ones
+    needle = ' '.join(terms)
+    def rank(u):
+        username = (u.get('username') or '').lower()
+        name = (u.get('name') or '').lower()
+        if username == needle or name == needle:
+            return 0
+        if name.startswith(needle) or username.startswith(needle):
+            return 1
+        return 2
+    users.sort(key=lambda u: (rank(u), (u.get('name') or '').lower()))
+    return users[:limit]
+
+def backfill_search_tokens(batch_size=1000):
+    """Add search_tokens to users registered before indexed search existed."""
+    updated = 0
+    requests = []
+    cursor = db.users.find({"search_tokens": {"$exists": False}},
+                           {"name": 1, "username": 1, "phone": 1}).batch_size(batch_size)
+    for u in cursor:
+        tokens = build_search_tokens(u.get('name'), u.get('username'), u.get('phone'))
+        requests.append(pymongo.UpdateOne({"_id": u['_id']}, {"$set": {"search_tokens": tokens}}))
+        if len(requests) >= batch_size:
+            updated += db.users.bulk_write(requests, ordered=False).modified_count
+            requests = []
+    if requests:
+        updated += db.users.bulk_write(requests, ordered=False).modified_count
+    return updated
+
+def load_analysis(value):
+    """Return analysis_result as a dict for both storage formats.
+
+    New records store a native subdocument; records written before the
+    migration hold a JSON string.
+    """
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, str):
+        try:
+            parsed = json.loads(value)
+            return parsed if isinstance(parsed, dict) else {}
+        except ValueError:
+            return {}
+    return {}
+
+def bump_records_rev(*user_ids):
+    """Bump each patient's records_rev: the revision of everything their record pages show."""
+    oids = [ObjectId(u) for u in user_ids if u and ObjectId.is_valid(u)]
+    if oids:
+        db.users.update_many({"_id": {"$in": oids}}, {"$inc": {"records_rev": 1}})
+
+def get_records_rev(user_id):
+    """Uncached point read; rendered pages are keyed by it."""
+    try:
+        doc = db.users.find_one({"_id": ObjectId(user_id)}, {"records_rev": 1})
+        return doc.get('records_rev', 0) if doc else None
+    except (InvalidId, TypeError):
+        return None
+    except Exception as e:
+        _log_error("Get Records Rev", e, "get_records_rev")
+        return None
+
 def save_health_data(user_id, data_dict, analysis):
     try:
+        now = datetime.utcnow()
         data = {
             "user_id": user_id,
-            "analysis_result": analysis,
-            "date": datetime.utcnow()
+            "analysis_result": load_analysis(analysis),
+            "date": now,
+            "analyzed_at": now
         }
         data.update(data_dict)
         db.health_data.insert_one(data)
+        bump_records_rev(user_id)
+        cache.invalidate_tag(user_id)
+        return True
+    except Exception as e:
+        _log_error("Save Health Data", e, "save_health_data")
+        return False
+
+# Assessment lifecycle for async analysis. Records without a status were
+# written synchronously and are complete. `analyzed_at` is stamped when a
+# record first gets its analysis (analytics.refresh keys its watermark on it).
+STATUS_PENDING = 'pending'
+STATUS_READY = 'ready'
+STATUS_FAILED = 'failed'
+
+def create_pending_health_data(user_id, data_dict):
+    """Persist a submission before it is scored; returns the record id or None."""
+    try:
+        data = {
+            "user_id": user_id,
+            "analysis_result": None,
+            "status": STATUS_PENDING,
+            "date": datetime.utcnow()
+        }
+        data.update(data_dict)
+        record_id = db.health_data.insert_one(data).inserted_id
+        bump_records_rev(user_id)
+        cache.invalidate_tag(user_id)
+        return str(record_id)
+    except Exception as e:
+        _log_error("Create Pending Health Data", e, "create_pending_health_data")
+        return None
+
+def complete_health_analysis(record_id, user_id, analysis):
+    try:
+        db.health_data.update_one(
+            {"_id": ObjectId(record_id)},
+            {"$set": {"analysis_result": load_analysis(analysis), "status": STATUS_READY, "analyzed_at": datetime.utcnow()},
+             "$inc": {"analysis_rev": 1}}
+        )
+        bump_records_rev(user_id)
+        cache.invalidate_tag(user_id)
         return True
     except Exception as e:
-        print(f"Save Health Data Error: {e}")
+        _log_error("Complete Health Analysis", e, "complete_health_analysis")
         return False
 
+def fail_health_analysis(record_id, user_id, error):
+    try:
+        db.health_data.update_one(
+            {"_id": ObjectId(record_id)},
+            {"$set": {"status": STATUS_FAILED, "error": str(error)}, "$inc": {"analysis_rev": 1}}
+        )
+        bump_records_rev(user_id)
+        cache.invalidate_tag(user_id)
+    except Exception as e:
+        _log_error("Fail Health Analysis", e, "fail_health_analysis")
+
+def get_health_status(record_id, user_id):
+    """Uncached status probe used by the report page while it polls."""
+    record = get_health_record(record_id, user_id=user_id, projection={"status": 1})
+    if not record:
+        return None
+    return record.get('status', STATUS_READY)
+
 def get_health_data(user_id):
     try:
-        cursor = db.health_data.find({"user_id": user_id}).sort("date", -1)
-        return [mongo_to_dict(d) for d in cursor]
+        return cache.get_or_load(
+            ('health_data', user_id),
+            lambda: [mongo_to_dict(d) for d in db.health_data.find({"user_id": user_id}).sort("date", -1)],
+            tags=(user_id,)
+        )
+    except Exception as e:
+        _log_error("Get Health Data", e, "get_health_data")
+        return []
+
+# Fields rendered in the medical records / admin history timelines
+HEALTH_HISTORY_PROJECTION = {
+    "date": 1, "bp_systolic": 1, "bp_diastolic": 1, "fasting_glucose": 1, "hba1c": 1, "analysis_result": 1
+}
+
+def has_health_data(user_id):
+    """Existence check served from the (user_id, date) index."""
+    try:
+        return cache.get_or_load(
+            ('health_exists', user_id),
+            lambda: db.health_data.find_one({"user_id": user_id}, {"_id": 1}) is not None,
+            tags=(user_id,)
+        )
+    except Exception as e:
+        _log_error("Has Health Data", e, "has_health_data")
+        return False
+
+def get_latest_health_rev(user_id):
+    """Id, status and analysis_rev of the newest assessment. Uncached; rendered reports are keyed by it."""
+    try:
+        return mongo_to_dict(db.health_data.find_one({"user_id": user_id}, {"status": 1, "analysis_rev": 1},
+                                                     sort=[("date", -1)]))
+    except Exception as e:
+        _log_error("Get Latest Health Rev", e, "get_latest_health_rev")
+        return None
+
+def get_health_record(record_id, user_id=None, projection=None):
+    """Fetch one assessment by id, optionally scoped to its owner."""
+    try:
+        query = {"_id": ObjectId(record_id)}
+        if user_id is not None:
+            query["user_id"] = user_id
+        return mongo_to_dict(db.health_data.find_one(query, projection))
+    except (InvalidId, TypeError):
+        return None  # Malformed id from the URL
     except Exception as e:
-        print(f"Get Health Data Error: {e}")
+        _log_error("Get Health Record", e, "get_health_record")
+        return None
+
+def get_health_history(user_id, limit=100, projection=HEALTH_HISTORY_PROJECTION):
+    """Most recent `limit` assessments, newest first, with a field projection."""
+    try:
+        return cache.get_or_load(
+            ('health_history', user_id, limit, _projection_key(projection)),
+            lambda: [mongo_to_dict(d) for d in
+                     db.health_data.find({"user_id": user_id}, projection).sort("date", -1).limit(limit)],
+            tags=(user_id,)
+        )
+    except Exception as e:
+        _log_error("Get Health History", e, "get_health_history")
         return []
 
-def save_booking(user_id, hospital_name, ticket_no, date):
+def get_health_series(user_id, projection, since=None):
+    """Every assessment for a user, oldest first, for charting. Not cached."""
+    query = {"user_id": user_id}
+    if since:
+        query["date"] = {"$gte": since}
     try:
-        db.bookings.insert_one({
-            "user_id": user_id,
-            "hospital_name": hospital_name,
-            "ticket_no": ticket_no,
-            "date": date,
-            "created_at": datetime.utcnow()
-        })
+        return list(db.health_data.find(query, projection).sort("date", 1).batch_size(1000))
     except Exception as e:
-        print(f"Save Booking Error: {e}")
+        _log_error("Get Health Series", e, "get_health_series")
+        return []
+
+def count_health_data():
+    """Approximate health_data size from collection metadata (no scan)."""
+    try:
+        return db.health_data.estimated_document_count()
+    except Exception as e:
+        _log_error("Count Health Data", e, "count_health_data")
+        return 0
+
+def iter_collection_batches(name, query=None, projection=None, batch_size=500, after_id=None):
+    """Stream a collection in _id order as lists of at most batch_size documents.
+
+    Each batch is its own short keyset query ({_id > last}), so a slow
+    consumer (e.g. an HTTP download) never holds a server cursor open.
+    Pass the last processed _id as after_id to resume a previous run.
+    """
+    base = dict(query or {})
+    last = ObjectId(after_id) if after_id else None
+    while True:
+        page_query = dict(base, _id={"$gt": last}) if last is not None else base
+        batch = list(db[name].find(page_query, projection).sort("_id", 1).limit(batch_size))
+        if not batch:
+            return
+        yield batch
+        if len(batch) < batch_size:
+            return
+        last = batch[-1]['_id']
+
+def iter_health_data_batches(after_id=None, batch_size=500, projection=None, query=None):
+    """Stream health_data in _id order as lists of at most batch_size documents."""
+    yield from iter_collection_batches('health_data', query, projection, batch_size, after_id)
+
+def get_user_ages(user_ids):
+    """Map user id strings to ages with a single $in query."""
+    try:
+        ids = [ObjectId(u) for u in set(user_ids) if ObjectId.is_valid(u)]
+        cursor = db.users.find({"_id": {"$in": ids}}, {"age": 1})
+        return {str(u['_id']): u.get('age') for u in cursor}
+    except Exception as e:
+        _log_error("Get User Ages", e, "get_user_ages")
+        return {}
+
+def _bump_owners(record_ids):
+    owners = db.health_data.distinct("user_id", {"_id": {"$in": [ObjectId(r) for r in record_ids]}})
+    bump_records_rev(*owners)
+
+def bulk_update_health_analyses(updates):
+    """Write (record_id, analysis_result) pairs with one unordered bulk_write.
+
+    Used by offline jobs; web workers pick the new values up within CACHE_TTL.
+    Records an admin has overridden are skipped, even if that happened mid-run.
+    Pending/failed records also get analyzed_at, so analytics counts them.
+    """
+    if not updates:
+        return 0
+    now = datetime.utcnow()
+    unscored = [STATUS_PENDING, STATUS_FAILED]
+    requests = []
+    for record_id, analysis in updates:
+        # Two ops with disjoint filters: only the one matching the current status applies
+        query = {"_id": ObjectId(record_id), "analysis_override": {"$ne": True}}
+        fields = {"analysis_result": analysis, "status": STATUS_READY}
+        requests.append(pymongo.UpdateOne(dict(query, status={"$in": unscored}),
+                                          {"$set": dict(fields, analyzed_at=now), "$inc": {"analysis_rev": 1}}))
+        requests.append(pymongo.UpdateOne(dict(query, status={"$nin": unscored}),
+                                          {"$set": fields, "$inc": {"analysis_rev": 1}}))
+    try:
+        result = db.health_data.bulk_write(requests, ordered=False)
+        _bump_owners([record_id for record_id, _ in updates])
+        return result.modified_count
+    except pymongo.errors.BulkWriteError as e:
+        _log_error("Bulk Update Analysis", f"{len(e.details.get('writeErrors', []))} failed writes", "bulk_update_health_analyses")
+        return e.details.get('nModified', 0)
+
+def bulk_set_analysis_fields(updates):
+    """Set individual analysis_result fields: (record_id, {field: value}) pairs, one bulk_write."""
+    if not updates:
+        return 0
+    requests = [pymongo.UpdateOne({"_id": ObjectId(record_id), "analysis_override": {"$ne": True}},
+                                  {"$set": {f"analysis_result.{k}": v for k, v in fields.items()},
+                                   "$inc": {"analysis_rev": 1}})
+                for record_id, fields in updates]
+    try:
+        result = db.health_data.bulk_write(requests, ordered=False)
+        _bump_owners([record_id for record_id, _ in updates])
+        return result.modified_count
+    except pymongo.errors.BulkWriteError as e:
+        _log_error("Bulk Set Analysis Fields", f"{len(e.details.get('writeErrors', []))} failed writes", "bulk_set_analysis_fields")
+        return e.details.get('nModified', 0)
+
+def save_booking(user_id, hospital_name, ticket_no, date, slot_id=None):
+    doc = {
+        "user_id": user_id,
+        "hospital_name": hospital_name,
+        "ticket_no": ticket_no,
+        "date": date,
+        "created_at": datetime.utcnow()
+    }
+    if slot_id:
+        doc["slot_id"] = slot_id
+    try:
+        db.bookings.insert_one(doc)
+        return True
+    except Exception as e:
+        _log_error("Save Booking", e, "save_booking")
+        return False
+
+def get_booking(user_id, ticket_no):
+    try:
+        return mongo_to_dict(db.bookings.find_one({"user_id": user_id, "ticket_no": ticket_no}))
+    except Exception as e:
+        _log_error("Get Booking", e, "get_booking")
+        return None
+
+def reserve_ticket_block(hospital_name, day, size):
+    """Claim the next `size` ticket numbers for a hospital and day: (first, last), or None."""
+    for attempt in range(2):
+        try:
+            doc = db.ticket_counters.find_one_and_update(
+                {"_id": f"{hospital_name}|{day}"},
+                {"$inc": {"last": size}, "$setOnInsert": {"hospital_name": hospital_name, "day": day}},
+                upsert=True, return_document=pymongo.ReturnDocument.AFTER
+            )
+            return doc["last"] - size + 1, doc["last"]
+        except pymongo.errors.DuplicateKeyError:
+            continue  # Lost the race to create the counter; it exists now
+        except Exception as e:
+            _log_error("Reserve Ticket Block", e, "reserve_ticket_block")
+            return None
+    return None
+
+def get_full_slots(hospital_name, day):
+    """Ids of the hospital's slots on `day` that have no capacity left."""
+    try:
+        query = {"hospital_name": hospital_name, "day": day, "$expr": {"$gte": ["$booked", "$capacity"]}}
+        return {doc["_id"] for doc in db.consultation_slots.find(query, {"_id": 1})}
+    except Exception as e:
+        _log_error("Get Full Slots", e, "get_full_slots")
+        return set()
+
+def reserve_slot(slot_id, hospital_name, day, start, capacity):
+    """Take one place in a slot, creating it on first use. False when it is full."""
+    try:
+        try:
+            db.consultation_slots.update_one(
+                {"_id": slot_id},
+                {"$setOnInsert": {"hospital_name": hospital_name, "day": day, "start": start,
+                                  "capacity": capacity, "booked": 0}},
+                upsert=True
+            )
+        except pymongo.errors.DuplicateKeyError:
+            pass  # Created concurrently
+        # The filter and the $inc are one atomic step, so booked never passes capacity
+        doc = db.consultation_slots.find_one_and_update(
+            {"_id": slot_id, "$expr": {"$lt": ["$booked", "$capacity"]}},
+            {"$inc": {"booked": 1}},
+            projection={"_id": 1}
+        )
+        return doc is not None
+    except Exception as e:
+        _log_error("Reserve Slot", e, "reserve_slot")
+        return False
+
+def release_slot(slot_id):
+    try:
+        db.consultation_slots.update_one({"_id": slot_id, "booked": {"$gt": 0}}, {"$inc": {"booked": -1}})
+    except Exception as e:
+        _log_error("Release Slot", e, "release_slot")
 
 def add_treatment(user_id, condition, treatment_plan):
     try:
@@ -139,30 +714,107 @@ def add_treatment(user_id, condition, treatment_plan):
             "status": "Ongoing",
             "start_date": datetime.utcnow()
         })
+        bump_records_rev(user_id)
+        cache.invalidate_tag(user_id)
     except Exception as e:
-        print(f"Add Treatment Error: {e}")
+        _log_error("Add Treatment", e, "add_treatment")
 
 def get_treatments(user_id):
     try:
-        cursor = db.treatments.find({"user_id": user_id}).sort("start_date", -1)
-        return [mongo_to_dict(t) for t in cursor]
+        return cache.get_or_load(
+            ('treatments', user_id),
+            lambda: [mongo_to_dict(t) for t in db.treatments.find({"user_id": user_id}).sort("start_date", -1)],
+            tags=(user_id,)
+        )
     except Exception as e:
-        print(f"Get Treatments Error: {e}")
+        _log_error("Get Treatments", e, "get_treatments")
         return []
 
-def update_health_analysis(record_id, analysis_result):
+def update_health_analysis(record_id, analysis_result, override=False):
+    """Replace one analysis. override=True marks an admin's hand-written
+    analysis, which the offline rescore/restage jobs then leave alone."""
+    fields = {"analysis_result": load_analysis(analysis_result)}
+    if override:
+        fields["analysis_override"] = True
     try:
-        db.health_data.update_one(
+        doc = db.health_data.find_one_and_update(
             {"_id": ObjectId(record_id)},
-            {"$set": {"analysis_result": analysis_result}}
+            {"$set": fields, "$inc": {"analysis_rev": 1}},
+            projection={"user_id": 1}
         )
+        if doc:
+            bump_records_rev(doc.get('user_id'))
+            cache.invalidate_tag(doc.get('user_id'))
         return True
-    except:
+    except (InvalidId, TypeError):
+        return False
+    except Exception as e:
+        _log_error("Update Health Analysis", e, "update_health_analysis")
+        return False
+
+def set_manual_summary(record_id, text):
+    """Attach an admin note to one analysis without rewriting the whole document."""
+    try:
+        doc = db.health_data.find_one_and_update(
+            {"_id": ObjectId(record_id), "analysis_result": {"$type": "object"}},
+            {"$set": {"analysis_result.manual_summary": text}, "$inc": {"analysis_rev": 1}},
+            projection={"user_id": 1}
+        )
+        if doc:
+            bump_records_rev(doc.get('user_id'))
+            cache.invalidate_tag(doc.get('user_id'))
+            return True
+        # Legacy JSON-string record: convert it while we are here
+        record = get_health_record(record_id, projection={"analysis_result": 1})
+        if not record:
+            return False
+        analysis = load_analysis(record.get('analysis_result'))
+        analysis['manual_summary'] = text
+        return update_health_analysis(record_id, analysis)
+    except (InvalidId, TypeError):
         return False
+    except Exception as e:
+        _log_error("Set Manual Summary", e, "set_manual_summary")
+        return False
+
+def migrate_analysis_results(batch_size=500, throttle=0.0, progress=None):
+    """Convert JSON-string analysis_result fields into subdocuments in batches.
+
+    Each update is conditioned on the original string, so a record edited
+    by an admin mid-migration is left alone rather than overwritten. Safe
+    to run while the app serves traffic and to re-run until nothing is left.
+    `progress`, if given, is called with the running migrated count after
+    each batch. Returns (migrated, skipped).
+    """
+    migrated = skipped = 0
+    requests = []
+    cursor = db.health_data.find({"analysis_result": {"$type": "string"}},
+                                 {"analysis_result": 1}).batch_size(batch_size)
+    for doc in cursor:
+        raw = doc['analysis_result']
+        try:
+            parsed = json.loads(raw)
+        except ValueError:
+            parsed = None
+        if not isinstance(parsed, dict):
+            skipped += 1
+            continue
+        requests.append(pymongo.UpdateOne({"_id": doc['_id'], "analysis_result": raw},
+                                          {"$set": {"analysis_result": parsed}}))
+        if len(requests) >= batch_size:
+            migrated += db.health_data.bulk_write(requests, ordered=False).modified_count
+            requests = []
+            if progress:
+                progress(migrated)
+            if throttle:
+                time.sleep(throttle)
+    if requests:
+        migrated += db.health_data.bulk_write(requests, ordered=False).modified_count
+    return migrated, skipped
 
 def save_diary_entry(user_id, mood, steps, water, sleep, symptoms, note):
     try:
-        db.health_diary.insert_one({
+        entry = {
             "user_id": user_id,
             "mood": mood,
             "steps": int(steps),
@@ -171,18 +823,106 @@ def save_diary_entry(user_id, mood, steps, water, sleep, symptoms, note):
             "symptoms": symptoms,
             "note": note,
             "date": datetime.utcnow()
-        })
+        }
+        db.health_diary.insert_one(entry)
+        # Fold the entry into the user's rollup doc (one upserted $inc)
+        db.diary_rollups.update_one(
+            {"_id": user_id},
+            {"$inc": rollups.entry_increments(entry, entry['date']), "$set": {"updated_at": entry['date']}},
+            upsert=True
+        )
+        cache.invalidate_tag(user_id)
     except Exception as e:
-        print(f"Save Diary Error: {e}")
+        _log_error("Save Diary", e, "save_diary_entry")
 
 def get_diary_entries(user_id):
     try:
-        cursor = db.health_diary.find({"user_id": user_id}).sort("date", -1).limit(30)
-        return [mongo_to_dict(e) for e in cursor]
+        return cache.get_or_load(
+            ('diary', user_id),
+            lambda: [mongo_to_dict(e) for e in db.health_diary.find({"user_id": user_id}).sort("date", -1).limit(30)],
+            tags=(user_id,)
+        )
     except Exception as e:
-        print(f"Get Diary Error: {e}")
+        _log_error("Get Diary", e, "get_diary_entries")
         return []
 
+def get_diary_rollup(user_id):
+    try:
+        return cache.get_or_load(
+            ('diary_rollup', user_id),
+            lambda: db.diary_rollups.find_one({"_id": user_id}),
+            tags=(user_id,)
+        )
+    except Exception as e:
+        _log_error("Get Diary Rollup", e, "get_diary_rollup")
+        return None
+
+def _rollup_counts(user_id):
+    """Entry count ('all.n') per existing rollup doc, used to detect writes during a rebuild."""
+    query = {"_id": user_id} if user_id else {}
+    return {d['_id']: d.get('all', {}).get('n') for d in db.diary_rollups.find(query, {"all.n": 1})}
+
+def backfill_diary_rollups(user_id=None, retries=3):
+    """Rebuild rollup docs from the raw diary with one aggregation.
+
+    Absolute values are written with $set, so re-running gives the same
+    result. A doc is only overwritten if its entry count hasn't moved since
+    it was read; users who saved an entry mid-rebuild are recomputed. An
+    entry whose $inc lands right after its user's rebuild can still count
+    twice; another run fixes that.
+    """
+    match = {"user_id": user_id} if user_id else {}
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}}},
+            "n": {"$sum": 1},
+            "steps": {"$sum": "$steps"},
+            "water": {"$sum": "$water_intake"},
+            "sleep": {"$sum": "$sleep_hours"}
+        }},
+        {"$group": {
+            "_id": "$_id.user_id",
+            "days": {"$push": {"day": "$_id.day", "n": "$n", "steps": "$steps", "water": "$water", "sleep": "$sleep"}}
+        }}
+    ]
+    counts = _rollup_counts(user_id)
+    users = 0
+    conflicts = []
+    for group in db.health_diary.aggregate(pipeline, allowDiskUse=True):
+        uid = group['_id']
+        doc = rollups.build_rollup(group['days'])
+        doc['updated_at'] = datetime.utcnow()
+        seen = counts.get(uid)
+        query = {"_id": uid, "all.n": seen if seen is not None else {"$exists": False}}
+        try:
+            result = db.diary_rollups.update_one(query, {"$set": doc}, upsert=True)
+            written = result.matched_count or result.upserted_id is not None
+        except pymongo.errors.DuplicateKeyError:
+            # The count moved (or a save created the doc), so the upsert hit the existing _id
+            written = False
+        if written:
+            cache.invalidate_tag(uid)
+            users += 1
+        else:
+            conflicts.append(uid)
+    if retries:
+        for uid in conflicts:
+            users += backfill_diary_rollups(uid, retries - 1)
+    return users
+
+# Time every public operation above. Pure helpers and connection plumbing
+# are left alone; anything defined above this block is picked up automatically.
+UNTIMED = {'client_options', 'get_client', 'get_db', 'use_client', 'pool_state', 'mongo_to_dict',
+           'phone_digits', 'build_search_tokens', 'build_user_doc', 'search_query_terms', 'load_analysis'}
+
+if metrics.METRICS_ENABLED:
+    metrics.instrument_module(sys.modules[__name__], [
+        name for name, fn in list(globals().items())
+        if inspect.isfunction(fn) and fn.__module__ == __name__
+        and not name.startswith('_') and name not in UNTIMED
+    ])
+
 if __name__ == '__main__':
     init_db()
     print("Database switched to MongoDB successfully.")
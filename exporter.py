@@ -0,0 +1,201 @@
+import csv
+import io
+import json
+from datetime import datetime, date
+from bson.objectid import ObjectId
+import database
+import scoring
+import timeseries
+
+# Streaming exports of a patient's records (or everyone's, for the nightly
+# warehouse dump). Every format is a generator of byte chunks fed by keyset
+# batches, so memory stays at roughly one batch whatever the export size.
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),  # Werkzeug adds the charset for text/* mimetypes
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+BATCH_SIZE = 1000
+
+# Fixed column layouts for the tabular formats: (column, dotted path, type).
+# NDJSON writes the documents as they are.
+_ANALYSIS = [
+    ('health_score', 'analysis_result.health_score', 'float'),
+    ('bmi', 'analysis_result.bmi', 'float'),
+    ('bp_status', 'analysis_result.bp_status', 'str'),
+    ('sugar_status', 'analysis_result.sugar_status', 'str'),
+    ('needs_doctor', 'analysis_result.needs_doctor', 'bool'),
+    ('analysis', 'analysis_result', 'json'),
+]
+COLUMNS = {
+    'health_data': [('id', '_id', 'str'), ('user_id', 'user_id', 'str'), ('date', 'date', 'datetime'),
+                    ('status', 'status', 'str')]
+                   + [(f, f, 'str') for f in scoring.TEXT_FIELDS]
+                   + [(f, f, 'int' if t is int else 'float') for f, t in scoring.NUMERIC_FIELDS]
+                   + _ANALYSIS,
+    'treatments': [('id', '_id', 'str'), ('user_id', 'user_id', 'str'), ('condition', 'condition', 'str'),
+                   ('treatment_plan', 'treatment_plan', 'str'), ('status', 'status', 'str'),
+                   ('start_date', 'start_date', 'datetime')],
+    'health_diary': [('id', '_id', 'str'), ('user_id', 'user_id', 'str'), ('date', 'date', 'datetime'),
+                     ('mood', 'mood', 'str'), ('steps', 'steps', 'int'), ('water_intake', 'water_intake', 'float'),
+                     ('sleep_hours', 'sleep_hours', 'float'), ('symptoms', 'symptoms', 'str'), ('note', 'note', 'str')],
+    'bookings': [('id', '_id', 'str'), ('user_id', 'user_id', 'str'), ('hospital_name', 'hospital_name', 'str'),
+                 ('ticket_no', 'ticket_no', 'str'), ('date', 'date', 'str'), ('created_at', 'created_at', 'datetime')],
+}
+COLLECTIONS = list(COLUMNS)
+
+
+def import_pyarrow():
+    """Parquet support is optional (pip install pyarrow); None if absent."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        return None
+
+
+def _json_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _convert(value, kind):
+    if value is None:
+        return None
+    try:
+        if kind == 'float':
+            return float(value)
+        if kind == 'int':
+            return int(value)
+        if kind == 'bool':
+            return bool(value)
+        if kind == 'datetime':
+            return value if isinstance(value, datetime) else None
+        if kind == 'json':
+            return json.dumps(value, default=_json_default) if value else None
+    except (TypeError, ValueError):
+        return None
+    return str(value)
+
+
+def row_values(doc, columns):
+    """Typed values for one document in column order."""
+    if 'analysis_result' in doc:
+        # Legacy records hold the analysis as a JSON string
+        doc = dict(doc, analysis_result=database.load_analysis(doc['analysis_result']))
+    return [_convert(timeseries.lookup(doc, path), kind) for _, path, kind in columns]
+
+
+def batches(collection, user_id=None, since=None, batch_size=BATCH_SIZE):
+    if collection not in COLUMNS:
+        raise ValueError(f"Unknown collection: {collection}")
+    query = {}
+    if user_id:
+        query['user_id'] = user_id
+    if since:
+        query['_id'] = {'$gte': ObjectId.from_datetime(since)}   # _id carries the insert time
+    yield from database.iter_collection_batches(collection, query, batch_size=batch_size)
+
+
+def ndjson_stream(collections, user_id=None, since=None, batch_size=BATCH_SIZE):
+    """One JSON object per line; each carries its source in "collection"."""
+    for collection in collections:
+        for docs in batches(collection, user_id, since, batch_size):
+            yield ''.join(
+                json.dumps(dict(doc, collection=collection), default=_json_default) + '\n' for doc in docs
+            ).encode('utf-8')
+
+
+def csv_stream(collection, user_id=None, since=None, batch_size=BATCH_SIZE):
+    columns = COLUMNS[collection]
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([name for name, _, _ in columns])
+    for docs in batches(collection, user_id, since, batch_size):
+        for doc in docs:
+            writer.writerow([v.isoformat() if isinstance(v, datetime) else v for v in row_values(doc, columns)])
+        yield buf.getvalue().encode('utf-8')
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode('utf-8')
+
+
+class _ChunkSink:
+    """Write-only file object that hands bytes back to the generator driving it."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_stream(collection, user_id=None, since=None, batch_size=BATCH_SIZE):
+    """One Parquet row group per batch, streamed as it is encoded."""
+    pa = import_pyarrow()
+    if pa is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    types = {'str': pa.string(), 'json': pa.string(), 'float': pa.float64(), 'int': pa.int64(),
+             'bool': pa.bool_(), 'datetime': pa.timestamp('ms')}
+    columns = COLUMNS[collection]
+    schema = pa.schema([(name, types[kind]) for name, _, kind in columns])
+    sink = _ChunkSink()
+    writer = pa.parquet.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for docs in batches(collection, user_id, since, batch_size):
+            rows = [row_values(doc, columns) for doc in docs]
+            arrays = {name: [row[i] for row in rows] for i, (name, _, _) in enumerate(columns)}
+            writer.write_table(pa.Table.from_pydict(arrays, schema=schema))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_stream(fmt, collections, user_id=None, since=None, batch_size=BATCH_SIZE):
+    """Byte-chunk generator for any format. CSV and Parquet take exactly one collection."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    unknown = [c for c in collections if c not in COLUMNS]
+    if unknown or not collections:
+        raise ValueError(f"Unknown collection: {', '.join(unknown) or '(none)'}")
+    if fmt == 'ndjson':
+        return ndjson_stream(collections, user_id, since, batch_size)
+    if len(collections) != 1:
+        raise ValueError(f"{fmt} export takes a single collection")
+    if fmt == 'parquet' and import_pyarrow() is None:
+        raise ValueError("Parquet export needs pyarrow (pip install pyarrow)")
+    stream = csv_stream if fmt == 'csv' else parquet_stream
+    return stream(collections[0], user_id, since, batch_size)
+
+
+def filename(fmt, collections, user_id=None):
+    scope = f"patient-{user_id}" if user_id else "all"
+    what = collections[0] if len(collections) == 1 else 'records'
+    return f"healthcare-{scope}-{what}-{datetime.utcnow().strftime('%Y%m%d')}.{FORMATS[fmt][1]}"
@@ -0,0 +1,203 @@
+import csv
+import io
+import json
+import re
+import time
+import database
+
+# Bulk patient import from CSV (header row) or JSONL (one object per line).
+# Rows are validated one at a time and written in unordered insert_many
+# batches, so memory stays flat no matter how large the file is.
+FIELDS = ['name', 'age', 'gender', 'phone', 'address', 'blood_group', 'username', 'password']
+REQUIRED = ['name', 'age', 'gender', 'phone', 'username', 'password']
+# Header spellings seen in partner exports / our own form field names
+ALIASES = {
+    'full_name': 'name', 'patient_name': 'name',
+    'sex': 'gender',
+    'mobile': 'phone', 'phone_number': 'phone', 'contact': 'phone',
+    'bloodgroup': 'blood_group', 'blood_type': 'blood_group',
+    'uid_reg': 'username', 'user': 'username',
+    'pwd_reg': 'password',
+}
+
+GENDERS = {'m': 'Male', 'male': 'Male', 'f': 'Female', 'female': 'Female', 'o': 'Other', 'other': 'Other', 'x': 'Other'}
+BLOOD_GROUPS = ['A+', 'A-', 'B+', 'B-', 'O+', 'O-', 'AB+', 'AB-']
+USERNAME = re.compile(r'^[\w.@-]{3,64}$')
+MIN_AGE, MAX_AGE = 0, 130
+PHONE_DIGITS = (7, 15)   # E.164 allows at most 15
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+
+def _key(header):
+    key = re.sub(r'[\s-]+', '_', (header or '').strip().lower())
+    return ALIASES.get(key, key)
+
+
+def read_rows(stream, fmt):
+    """Yield (line_number, row dict or None, parse error or None) from a binary stream."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        reader.fieldnames = [_key(h) for h in (reader.fieldnames or [])]
+        for row in reader:
+            yield reader.line_num, row, None
+    elif fmt == 'jsonl':
+        for line_no, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError as e:
+                yield line_no, None, f"invalid JSON: {e}"
+                continue
+            if not isinstance(obj, dict):
+                yield line_no, None, "expected a JSON object"
+                continue
+            yield line_no, {_key(k): v for k, v in obj.items()}, None
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def detect_format(filename):
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    return None
+
+
+def normalize_age(value):
+    try:
+        age = float(str(value).strip())
+    except (TypeError, ValueError):
+        raise ValueError("age must be a number")
+    if age != int(age) or not MIN_AGE <= age <= MAX_AGE:
+        raise ValueError(f"age must be a whole number between {MIN_AGE} and {MAX_AGE}")
+    return int(age)
+
+
+def normalize_gender(value):
+    gender = GENDERS.get(str(value).strip().lower())
+    if not gender:
+        raise ValueError("gender must be Male, Female or Other")
+    return gender
+
+
+def normalize_phone(value):
+    """Keep digits (and a leading +); e.g. '(555) 010-2030' -> '5550102030'."""
+    raw = str(value).strip()
+    digits = database.phone_digits(raw)
+    international = raw.startswith('+')
+    if raw.startswith('00'):   # 0044... is +44...
+        digits, international = digits[2:], True
+    if not PHONE_DIGITS[0] <= len(digits) <= PHONE_DIGITS[1]:
+        raise ValueError(f"phone must have {PHONE_DIGITS[0]}-{PHONE_DIGITS[1]} digits")
+    return ('+' if international else '') + digits
+
+
+def normalize_blood_group(value):
+    """Accepts 'a+', 'AB pos', 'O negative', 'B -' ..."""
+    raw = re.sub(r'\s+', '', str(value or '')).upper()
+    raw = re.sub(r'(POSITIVE|POS|VE\+|\+VE)$', '+', raw)
+    raw = re.sub(r'(NEGATIVE|NEG|VE-|-VE)$', '-', raw)
+    if raw not in BLOOD_GROUPS:
+        raise ValueError(f"blood group must be one of {', '.join(BLOOD_GROUPS)}")
+    return raw
+
+
+def validate_row(row):
+    """Return (user doc, None) or (None, [error, ...])."""
+    values = {f: row.get(f) for f in FIELDS}
+    for f in FIELDS:
+        if isinstance(values[f], str):
+            values[f] = values[f].strip()
+    errors = [f"{f} is required" for f in REQUIRED if values[f] in (None, '')]
+    if errors:
+        return None, errors
+
+    for field, normalize in (('age', normalize_age), ('gender', normalize_gender), ('phone', normalize_phone)):
+        try:
+            values[field] = normalize(values[field])
+        except ValueError as e:
+            errors.append(str(e))
+    if values['blood_group'] not in (None, ''):
+        try:
+            values['blood_group'] = normalize_blood_group(values['blood_group'])
+        except ValueError as e:
+            errors.append(str(e))
+    if not USERNAME.match(str(values['username'])):
+        errors.append("username must be 3-64 letters, digits or . _ @ -")
+    if errors:
+        return None, errors
+
+    return database.build_user_doc(
+        str(values['name']), values['age'], values['gender'], values['phone'],
+        str(values['address'] or ''), values['blood_group'] or '', str(values['username']), str(values['password'])
+    ), None
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    def fail(self, line, username, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "username": username, "errors": errors})
+
+    def as_dict(self):
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": sorted(self.errors, key=lambda e: e['line']),
+            "errors_truncated": self.failed > len(self.errors),
+            "seconds": round(time.perf_counter() - self.started, 2)
+        }
+
+
+def import_patients(stream, fmt, batch_size=BATCH_SIZE, dry_run=False):
+    """Stream, validate and insert patients; returns the per-row report dict."""
+    report = ImportReport()
+    batch, lines = [], []
+    seen = set()   # usernames earlier in this file
+
+    def flush():
+        if not batch:
+            return
+        if dry_run:
+            report.inserted += len(batch)
+        else:
+            inserted, failed = database.insert_users(batch)
+            report.inserted += inserted
+            for index, message in sorted(failed.items()):
+                report.fail(lines[index], batch[index]['username'], [message])
+        batch.clear()
+        lines.clear()
+
+    for line, row, parse_error in read_rows(stream, fmt):
+        report.rows += 1
+        if parse_error:
+            report.fail(line, None, [parse_error])
+            continue
+        doc, errors = validate_row(row)
+        if errors:
+            report.fail(line, row.get('username'), errors)
+            continue
+        if doc['username'] in seen:
+            report.fail(line, doc['username'], ["username repeated earlier in this file"])
+            continue
+        seen.add(doc['username'])
+        batch.append(doc)
+        lines.append(line)
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return report.as_dict()
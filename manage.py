@@ -0,0 +1,322 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# Imports that should never appear on the web startup path
+HEAVY_MODULES = ('numpy', 'sklearn', 'scipy', 'pandas', 'pyarrow')
+
+
+def cmd_init_db(args):
+    import database
+    database.init_db()
+
+
+def cmd_rescore(args):
+    import rescore
+    after_id = args.after_id
+    if args.resume and not after_id:
+        after_id = rescore.read_checkpoint(args.checkpoint)
+    rescore.rescore_all(
+        batch_size=args.batch_size,
+        after_id=after_id,
+        checkpoint_path=args.checkpoint,
+        throttle=args.throttle,
+        report_every=args.report_every
+    )
+
+
+def cmd_backfill_search(args):
+    import database
+    updated = database.backfill_search_tokens(batch_size=args.batch_size)
+    print(f"Search tokens added to {updated} users")
+
+
+def cmd_migrate_analysis(args):
+    import database
+    migrated, skipped = database.migrate_analysis_results(
+        batch_size=args.batch_size, throttle=args.throttle,
+        progress=lambda n: print(f"  {n} analyses migrated"))
+    print(f"Migrated {migrated} analyses to subdocuments ({skipped} unparseable records left as strings)")
+
+
+def cmd_requeue_pending(args):
+    from datetime import datetime, timedelta
+    import database
+    import rescore
+    statuses = [database.STATUS_PENDING] + ([database.STATUS_FAILED] if args.include_failed else [])
+    query = {
+        "status": {"$in": statuses},
+        "date": {"$lt": datetime.utcnow() - timedelta(seconds=args.older_than)}
+    }
+    scored = 0
+    for docs in database.iter_health_data_batches(batch_size=args.batch_size, projection=rescore.RESCORE_PROJECTION, query=query):
+        rescore.rescore_chunk(docs)
+        scored += len(docs)
+    print(f"Scored {scored} stranded assessments")
+
+
+def parse_importtime(stderr):
+    """Parse `python -X importtime` output into (module, self_us, cumulative_us, depth)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        except ValueError:
+            continue
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def cmd_startup_report(args):
+    env = dict(os.environ, ML_LOAD=args.ml_load)
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {args.module}'],
+                          capture_output=True, text=True, env=env)
+    wall_ms = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:])
+        sys.exit(proc.returncode)
+
+    rows = parse_importtime(proc.stderr)
+    root = next((r for r in rows if r[0] == args.module), None)
+    import_ms = root[2] / 1000 if root else sum(r[1] for r in rows) / 1000
+    top_level = sorted((r for r in rows if r[3] <= 1), key=lambda r: r[2], reverse=True)[:args.top]
+    heavy = sorted({r[0].split('.')[0] for r in rows if r[0].split('.')[0] in HEAVY_MODULES})
+
+    report = {
+        "module": args.module,
+        "ml_load": args.ml_load,
+        "process_wall_ms": round(wall_ms, 1),
+        "import_ms": round(import_ms, 1),
+        "modules_imported": len(rows),
+        "heavy_modules": heavy,
+        "slowest": [{"module": r[0], "cumulative_ms": round(r[2] / 1000, 1), "self_ms": round(r[1] / 1000, 1)}
+                    for r in top_level]
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"import {args.module}: {report['import_ms']} ms ({report['modules_imported']} modules), "
+              f"process wall {report['process_wall_ms']} ms, ML_LOAD={args.ml_load}")
+        print(f"heavy modules on startup path: {', '.join(heavy) or 'none'}")
+        for r in report['slowest']:
+            print(f"  {r['cumulative_ms']:>9.1f} ms  {r['module']}")
+    if args.fail_over_ms and import_ms > args.fail_over_ms:
+        print(f"Startup regression: {import_ms:.1f} ms > {args.fail_over_ms} ms budget")
+        sys.exit(1)
+
+
+def cmd_backfill_rollups(args):
+    import database
+    users = database.backfill_diary_rollups(user_id=args.user_id)
+    print(f"Diary rollups rebuilt for {users} users")
+
+
+def cmd_refresh_analytics(args):
+    import analytics
+    result = analytics.refresh(full=args.full)
+    if result is None:
+        print("Another analytics refresh is running; try again later")
+    elif result['skipped']:
+        print(f"Analytics already current up to {result['until']}")
+    else:
+        print(f"Analytics {'rebuilt' if args.full else 'refreshed'} from {result['since'] or 'the beginning'} to {result['until']}")
+
+
+def cmd_import_patients(args):
+    import importer
+    fmt = args.format or importer.detect_format(args.path)
+    if fmt is None:
+        sys.exit("Can't tell the file format from its name; pass --format csv|jsonl")
+    with open(args.path, 'rb') as f:
+        report = importer.import_patients(f, fmt, batch_size=args.batch_size, dry_run=args.dry_run)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    for err in report['errors'][:args.show_errors]:
+        print(f"  line {err['line']} ({err['username']}): {'; '.join(err['errors'])}")
+    print(f"{report['rows']} rows: {report['inserted']} {'valid' if args.dry_run else 'imported'}, "
+          f"{report['failed']} failed in {report['seconds']}s")
+
+
+def cmd_export(args):
+    import exporter
+    collections = exporter.COLLECTIONS if args.collection == 'all' else [args.collection]
+    since = datetime.strptime(args.since, '%Y-%m-%d') if args.since else None
+    try:
+        chunks = exporter.export_stream(args.format, collections, user_id=args.user_id, since=since,
+                                        batch_size=args.batch_size)
+    except ValueError as e:
+        sys.exit(str(e))
+    out = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    written = 0
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+            written += len(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    if args.output != '-':
+        print(f"Wrote {written} bytes to {args.output}")
+
+
+def cmd_register_model(args):
+    import model_registry
+    try:
+        manifest = model_registry.register(args.pkl, args.compiled, version=args.version, notes=args.notes or '')
+        print(f"Registered model {manifest['version']}")
+        if args.activate or args.shadow:
+            pointer = model_registry.SHADOW if args.shadow else model_registry.CURRENT
+            model_registry.activate(manifest['version'], pointer)
+            print(f"{pointer} -> {manifest['version']}")
+    except (ValueError, OSError) as e:
+        sys.exit(str(e))
+
+
+def cmd_activate_model(args):
+    import model_registry
+    pointer = model_registry.SHADOW if args.shadow else model_registry.CURRENT
+    if args.clear:
+        model_registry.deactivate(pointer)
+        print(f"{pointer} cleared")
+        return
+    if not args.version:
+        sys.exit("Pass a version, or --clear")
+    try:
+        model_registry.activate(args.version, pointer)
+    except (ValueError, OSError) as e:
+        sys.exit(str(e))
+    print(f"{pointer} -> {args.version}; workers switch within {model_registry.RELOAD_INTERVAL:g}s of their next scoring call")
+
+
+def cmd_list_models(args):
+    import model_registry
+    current, shadow = model_registry.read_pointer(model_registry.CURRENT), model_registry.read_pointer(model_registry.SHADOW)
+    for m in model_registry.versions():
+        mark = ' (current)' if m['version'] == current else ' (shadow)' if m['version'] == shadow else ''
+        print(f"{m['version']}{mark}  {m['created_at']}  {', '.join(sorted(m['files']))}  {m.get('notes', '')}")
+
+
+def cmd_restage(args):
+    import rescore
+    rescore.restage_all(batch_size=args.batch_size, dry_run=args.dry_run)
+
+
+def cmd_build_static(args):
+    import static_build
+    brotli = static_build.import_brotli()
+    manifest, report = static_build.build(args.static_folder)
+    for source, built, sizes in report:
+        variants = ", ".join(f"{k} {v}" for k, v in sizes.items() if k not in ('source', 'built'))
+        print(f"{source} -> dist/{built}: {sizes['source']} -> {sizes['built']} bytes" + (f" ({variants})" if variants else ""))
+    if brotli is None:
+        print("brotli not installed: wrote gzip variants only")
+    print(f"Built {len(manifest['files'])} files into {args.static_folder}/{static_build.DIST}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Healthcare Hub maintenance commands")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('init-db', help="Create collections and indexes (run once per deploy)")
+    p.set_defaults(func=cmd_init_db)
+
+    p = sub.add_parser('rescore', help="Re-score every stored assessment with the current model")
+    p.add_argument('--batch-size', type=int, default=500, help="Records per cursor batch and bulk write")
+    p.add_argument('--checkpoint', default='rescore.checkpoint', help="File holding the last processed _id")
+    p.add_argument('--resume', action='store_true', help="Continue after the _id stored in --checkpoint")
+    p.add_argument('--after-id', help="Start after this _id (overrides --resume)")
+    p.add_argument('--throttle', type=float, default=0.0, help="Seconds to sleep between batches")
+    p.add_argument('--report-every', type=int, default=10, help="Print progress every N batches")
+    p.set_defaults(func=cmd_rescore)
+
+    p = sub.add_parser('backfill-search', help="Add search tokens to users created before indexed search")
+    p.add_argument('--batch-size', type=int, default=1000)
+    p.set_defaults(func=cmd_backfill_search)
+
+    p = sub.add_parser('migrate-analysis', help="Convert JSON-string analysis results into subdocuments")
+    p.add_argument('--batch-size', type=int, default=500)
+    p.add_argument('--throttle', type=float, default=0.0, help="Seconds to sleep between batches")
+    p.set_defaults(func=cmd_migrate_analysis)
+
+    p = sub.add_parser('requeue-pending', help="Score async submissions stranded by a worker restart")
+    p.add_argument('--older-than', type=int, default=300, help="Only records pending for at least N seconds")
+    p.add_argument('--include-failed', action='store_true', help="Also retry records whose analysis failed")
+    p.add_argument('--batch-size', type=int, default=500)
+    p.set_defaults(func=cmd_requeue_pending)
+
+    p = sub.add_parser('startup-report', help="Profile cold-start import time (python -X importtime)")
+    p.add_argument('--module', default='app', help="Module to import (default: app)")
+    p.add_argument('--ml-load', default='lazy', choices=['lazy', 'background', 'eager'])
+    p.add_argument('--top', type=int, default=15, help="Show the N slowest top-level imports")
+    p.add_argument('--json', action='store_true', help="Emit the report as JSON")
+    p.add_argument('--fail-over-ms', type=float, help="Exit non-zero when import time exceeds this budget")
+    p.set_defaults(func=cmd_startup_report)
+
+    p = sub.add_parser('backfill-rollups', help="Rebuild diary trend rollups from existing diary entries")
+    p.add_argument('--user-id', help="Only rebuild this user's rollup")
+    p.set_defaults(func=cmd_backfill_rollups)
+
+    p = sub.add_parser('refresh-analytics', help="Fold new assessments into the admin analytics summaries")
+    p.add_argument('--full', action='store_true', help="Rebuild the summaries from all assessments")
+    p.set_defaults(func=cmd_refresh_analytics)
+
+    p = sub.add_parser('import-patients', help="Bulk-register patients from a CSV or JSONL file")
+    p.add_argument('path')
+    p.add_argument('--format', choices=['csv', 'jsonl'], help="Default: from the file extension")
+    p.add_argument('--batch-size', type=int, default=1000)
+    p.add_argument('--dry-run', action='store_true', help="Validate only; write nothing")
+    p.add_argument('--report', help="Write the full JSON report here")
+    p.add_argument('--show-errors', type=int, default=20, help="Print the first N row errors")
+    p.set_defaults(func=cmd_import_patients)
+
+    p = sub.add_parser('export', help="Stream records to NDJSON, CSV or Parquet (e.g. nightly warehouse dumps)")
+    p.add_argument('--collection', default='all', help="health_data, treatments, health_diary, bookings or all (NDJSON only)")
+    p.add_argument('--format', choices=['ndjson', 'csv', 'parquet'], default='ndjson')
+    p.add_argument('--output', default='-', help="File to write; - for stdout")
+    p.add_argument('--user-id', help="Only this patient's records")
+    p.add_argument('--since', help="Only records created on or after YYYY-MM-DD")
+    p.add_argument('--batch-size', type=int, default=1000)
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser('register-model', help="Copy trained artifacts into the model registry as a new version")
+    p.add_argument('--pkl', default='healthcare_model.pkl', help="Pickled sklearn models (pass '' to skip)")
+    p.add_argument('--compiled', default='healthcare_model.json', help="Compiled artifact (pass '' to skip)")
+    p.add_argument('--version', help="Default: UTC timestamp plus checksum prefix")
+    p.add_argument('--notes')
+    p.add_argument('--activate', action='store_true', help="Serve it right away")
+    p.add_argument('--shadow', action='store_true', help="Score it in shadow mode instead")
+    p.set_defaults(func=cmd_register_model)
+
+    p = sub.add_parser('activate-model', help="Point CURRENT (or SHADOW) at a registered version; workers hot-swap")
+    p.add_argument('version', nargs='?')
+    p.add_argument('--shadow', action='store_true')
+    p.add_argument('--clear', action='store_true', help="Remove the pointer (stops shadow scoring)")
+    p.set_defaults(func=cmd_activate_model)
+
+    p = sub.add_parser('list-models', help="Show registered model versions")
+    p.set_defaults(func=cmd_list_models)
+
+    p = sub.add_parser('restage', help="Re-apply the clinical staging rules to stored assessments")
+    p.add_argument('--batch-size', type=int, default=5000)
+    p.add_argument('--dry-run', action='store_true', help="Count the records that would change")
+    p.set_defaults(func=cmd_restage)
+
+    p = sub.add_parser('build-static', help="Fingerprint, minify and precompress static assets into static/dist")
+    p.add_argument('--static-folder', default='static')
+    p.set_defaults(func=cmd_build_static)
+
+    return parser
+
+
+if __name__ == '__main__':
+    args = build_parser().parse_args()
+    args.func(args)
@@ -0,0 +1,267 @@
+import functools
+import inspect
+import os
+import threading
+import time
+from bisect import bisect_left
+from werkzeug.exceptions import HTTPException
+
+# Cheap enough to leave on; METRICS_ENABLED=0 skips the route and DB wrappers
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+# Optional bearer token required to scrape /metrics
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATUS_CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_string(names, values, extra=''):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount=1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class _HistogramChild:
+    """Fixed buckets allocated once; observe() is a bisect and three adds."""
+    __slots__ = ('bounds', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class Metric:
+    """A metric family. Children are created once per label tuple and reused."""
+
+    def __init__(self, name, documentation, kind, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    if self.kind == 'histogram':
+                        child = _HistogramChild(self.buckets)
+                    elif self.kind == 'gauge':
+                        child = _GaugeChild()
+                    else:
+                        child = _CounterChild()
+                    self._children[values] = child
+        return child
+
+    def total(self):
+        """Sum of a counter or gauge across all its label values."""
+        return sum(child.value for child in list(self._children.values()))
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            if self.kind == 'histogram':
+                counts, total, count = child.snapshot()
+                cumulative = 0
+                for bound, c in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += c
+                    le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+                    lines.append(f"{self.name}_bucket{_label_string(self.labelnames, values, le)} {cumulative}")
+                labels = _label_string(self.labelnames, values)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {count}")
+            else:
+                lines.append(f"{self.name}{_label_string(self.labelnames, values)} {child.value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, fn):
+        """fn() -> list of (name, kind, documentation, value) sampled at scrape time."""
+        self.collectors.append(fn)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for fn in self.collectors:
+            for name, kind, documentation, value in fn():
+                lines.extend([f"# HELP {name} {documentation}", f"# TYPE {name} {kind}", f"{name} {value}"])
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_LATENCY = REGISTRY.register(Metric(
+    'http_request_duration_seconds', "Flask view latency", 'histogram', ['endpoint']))
+HTTP_REQUESTS = REGISTRY.register(Metric(
+    'http_requests_total', "Responses by endpoint and status class", 'counter', ['endpoint', 'status']))
+HTTP_EXCEPTIONS = REGISTRY.register(Metric(
+    'http_exceptions_total', "Unhandled exceptions raised by views", 'counter', ['endpoint']))
+HTTP_IN_FLIGHT = REGISTRY.register(Metric(
+    'http_requests_in_flight', "Requests currently being handled", 'gauge', ['endpoint']))
+
+DB_LATENCY = REGISTRY.register(Metric(
+    'db_operation_duration_seconds', "database.py operation latency", 'histogram', ['operation']))
+DB_ERRORS = REGISTRY.register(Metric(
+    'db_operation_errors_total', "database.py operations that failed", 'counter', ['operation']))
+DB_IN_FLIGHT = REGISTRY.register(Metric(
+    'db_operations_in_flight', "database.py operations currently running", 'gauge', ['operation']))
+
+INFERENCE_LATENCY = REGISTRY.register(Metric(
+    'model_inference_duration_seconds', "Batch model inference latency", 'histogram', ['backend']))
+INFERENCE_ROWS = REGISTRY.register(Metric(
+    'model_inference_rows_total', "Rows scored by the model", 'counter', ['backend']))
+INFERENCE_ERRORS = REGISTRY.register(Metric(
+    'model_inference_errors_total', "Batch inference calls that fell back to rules", 'counter')).labels()
+MODEL_RELOADS = REGISTRY.register(Metric(
+    'model_reloads_total', "Hot swaps to a newly activated model version", 'counter', ['result']))
+SHADOW_ROWS = REGISTRY.register(Metric(
+    'model_shadow_rows_total', "Rows also scored by the shadow candidate", 'counter', ['candidate']))
+SHADOW_DISAGREEMENTS = REGISTRY.register(Metric(
+    'model_shadow_disagreements_total', "Shadow rows outside tolerance of the live model", 'counter', ['candidate']))
+
+# Compression ratio is bytes_out / bytes_in; CPU seconds are thread time spent compressing
+COMPRESSION_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COMPRESSED_RESPONSES = REGISTRY.register(Metric(
+    'http_compressed_responses_total', "Responses compressed by the middleware", 'counter', ['encoding']))
+COMPRESSION_BYTES_IN = REGISTRY.register(Metric(
+    'http_compression_bytes_in_total', "Response bytes before compression", 'counter', ['encoding']))
+COMPRESSION_BYTES_OUT = REGISTRY.register(Metric(
+    'http_compression_bytes_out_total', "Response bytes after compression", 'counter', ['encoding']))
+COMPRESSION_CPU = REGISTRY.register(Metric(
+    'http_compression_cpu_seconds', "CPU time spent compressing one response", 'histogram', ['encoding'],
+    buckets=COMPRESSION_BUCKETS))
+
+
+def _status_class(result):
+    if isinstance(result, int):
+        return STATUS_CLASSES[min(max(result // 100, 1), 5) - 1]
+    status = getattr(result, 'status_code', None)
+    if status is None and isinstance(result, tuple) and len(result) > 1 and isinstance(result[1], int):
+        status = result[1]
+    if status is None:
+        status = 200
+    return STATUS_CLASSES[min(max(status // 100, 1), 5) - 1]
+
+
+def instrument_view(endpoint, view):
+    latency = HTTP_LATENCY.labels(endpoint)
+    in_flight = HTTP_IN_FLIGHT.labels(endpoint)
+    exceptions = HTTP_EXCEPTIONS.labels(endpoint)
+    by_status = {cls: HTTP_REQUESTS.labels(endpoint, cls) for cls in STATUS_CLASSES}
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            result = view(*args, **kwargs)
+        except HTTPException as e:
+            # abort(404) and friends are responses, not crashes
+            by_status[_status_class(e.code or 500)].inc()
+            raise
+        except Exception:
+            exceptions.inc()
+            by_status['5xx'].inc()
+            raise
+        finally:
+            latency.observe(time.perf_counter() - started)
+            in_flight.dec()
+        by_status[_status_class(result)].inc()
+        return result
+    return wrapper
+
+
+def instrument_app(app):
+    """Wrap every registered view. Call after all routes are defined."""
+    for endpoint, view in list(app.view_functions.items()):
+        app.view_functions[endpoint] = instrument_view(endpoint, view)
+
+
+def instrument_function(name, fn):
+    latency = DB_LATENCY.labels(name)
+    in_flight = DB_IN_FLIGHT.labels(name)
+    errors = DB_ERRORS.labels(name)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            latency.observe(time.perf_counter() - started)
+            in_flight.dec()
+    return wrapper
+
+
+def instrument_module(module, names):
+    """Replace module functions with timed wrappers.
+
+    Internal calls inside the module resolve through its globals, so they
+    are timed too. Generator functions are skipped (they would only time
+    generator creation).
+    """
+    for name in names:
+        fn = getattr(module, name)
+        if inspect.isgeneratorfunction(fn):
+            continue
+        setattr(module, name, instrument_function(name, fn))
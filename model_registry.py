@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+
+# Local registry of trained models:
+#   models/versions/<version>/healthcare_model.pkl|.json + manifest.json
+#   models/CURRENT   version every worker serves
+#   models/SHADOW    optional candidate scored alongside it (never stored)
+# Pointers are replaced with os.replace, so a reader sees the old or the new
+# version, never a half-written file. Workers poll the pointer's stat and
+# swap models without a restart (see scoring.get_model).
+REGISTRY_DIR = os.environ.get('ML_REGISTRY_DIR', 'models')
+VERSIONS_DIR = os.path.join(REGISTRY_DIR, 'versions')
+CURRENT = 'CURRENT'
+SHADOW = 'SHADOW'
+POINTERS = (CURRENT, SHADOW)
+MANIFEST = 'manifest.json'
+# backend -> artifact file name inside a version directory
+ARTIFACTS = {'sklearn': 'healthcare_model.pkl', 'compiled': 'healthcare_model.json'}
+# Seconds between pointer checks on the request path
+RELOAD_INTERVAL = float(os.environ.get('ML_RELOAD_INTERVAL', 2))
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def version_dir(version):
+    if not version or os.sep in version or version.startswith('.'):
+        raise ValueError(f"Invalid model version: {version!r}")
+    return os.path.join(VERSIONS_DIR, version)
+
+
+def read_manifest(version):
+    try:
+        with open(os.path.join(version_dir(version), MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise ValueError(f"Unknown model version: {version}")
+
+
+def verify(version):
+    """Check every artifact against the manifest checksums; returns the manifest."""
+    manifest = read_manifest(version)
+    for name, meta in manifest['files'].items():
+        path = os.path.join(version_dir(version), name)
+        if not os.path.exists(path):
+            raise ValueError(f"{version}: {name} is missing")
+        if sha256_file(path) != meta['sha256']:
+            raise ValueError(f"{version}: {name} does not match its checksum")
+    return manifest
+
+
+def artifact_paths(version):
+    """backend -> path for the artifacts this version ships."""
+    manifest = read_manifest(version)
+    return {backend: os.path.join(version_dir(version), name)
+            for backend, name in ARTIFACTS.items() if name in manifest['files']}
+
+
+def register(pkl_path=None, compiled_path=None, version=None, notes=''):
+    """Copy artifacts into a new immutable version directory; returns its manifest."""
+    sources = {name: path for name, path in ((ARTIFACTS['sklearn'], pkl_path), (ARTIFACTS['compiled'], compiled_path)) if path}
+    if not sources:
+        raise ValueError("Nothing to register: pass a .pkl and/or a compiled .json artifact")
+    files = {name: {"sha256": sha256_file(path), "bytes": os.path.getsize(path)} for name, path in sources.items()}
+    if version is None:
+        first = files[sorted(files)[0]]['sha256']
+        version = f"{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}-{first[:8]}"
+    target = version_dir(version)
+    if os.path.exists(target):
+        raise ValueError(f"Model version {version} already exists")
+
+    # Build in a temp dir and rename, so a crash never leaves a partial version
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    staging = os.path.join(VERSIONS_DIR, f".tmp-{uuid.uuid4().hex}")
+    os.makedirs(staging)
+    try:
+        for name, path in sources.items():
+            shutil.copyfile(path, os.path.join(staging, name))
+        manifest = {
+            "version": version,
+            "created_at": datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            "files": files,
+            "sources": {name: os.path.abspath(path) for name, path in sources.items()},
+            "notes": notes
+        }
+        with open(os.path.join(staging, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(staging, target)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return manifest
+
+
+def versions():
+    """Manifests of every registered version, oldest first."""
+    if not os.path.isdir(VERSIONS_DIR):
+        return []
+    found = []
+    for name in os.listdir(VERSIONS_DIR):
+        if name.startswith('.'):
+            continue
+        try:
+            found.append(read_manifest(name))
+        except ValueError:
+            continue
+    return sorted(found, key=lambda m: m['created_at'])
+
+
+def read_pointer(pointer=CURRENT):
+    try:
+        with open(os.path.join(REGISTRY_DIR, pointer)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def activate(version, pointer=CURRENT):
+    """Verify a version and point CURRENT (or SHADOW) at it atomically."""
+    verify(version)
+    tmp = os.path.join(REGISTRY_DIR, f".{pointer}.{uuid.uuid4().hex}")
+    with open(tmp, 'w') as f:
+        f.write(version + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(REGISTRY_DIR, pointer))
+
+
+def deactivate(pointer=SHADOW):
+    try:
+        os.remove(os.path.join(REGISTRY_DIR, pointer))
+    except FileNotFoundError:
+        pass
+
+
+class Pointer:
+    """Cheap change detection for a pointer file, checked at most every `interval` seconds."""
+
+    def __init__(self, name, interval=RELOAD_INTERVAL):
+        self.name = name
+        self.path = os.path.join(REGISTRY_DIR, name)
+        self.interval = interval
+        self.stamp = None
+        self.next_check = 0.0
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        # os.replace gives the pointer a new inode even within one mtime tick
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def read(self):
+        """Current version (or None), remembering the file state it came from."""
+        self.stamp = self._stat()
+        self.next_check = time.monotonic() + self.interval
+        return read_pointer(self.name)
+
+    def changed(self):
+        now = time.monotonic()
+        if now < self.next_check:
+            return False
+        self.next_check = now + self.interval
+        return self._stat() != self.stamp
@@ -0,0 +1,90 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+import database
+import scoring
+
+# Async analysis: submissions are stored as 'pending' and scored off the
+# request path. The executor's work queue is a local stand-in for a broker.
+ASYNC_ANALYSIS = os.environ.get('ASYNC_ANALYSIS', '0') == '1'
+ANALYSIS_EXECUTOR = os.environ.get('ANALYSIS_EXECUTOR', 'thread')   # thread | process
+ANALYSIS_WORKERS = int(os.environ.get('ANALYSIS_WORKERS', 2))
+# Beyond this many queued jobs, submit_analysis() refuses and the caller scores inline
+ANALYSIS_QUEUE_LIMIT = int(os.environ.get('ANALYSIS_QUEUE_LIMIT', 200))
+
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+_in_flight = 0
+
+
+def _reset_after_fork():
+    # The parent's pool threads and queued jobs don't exist in the child, and
+    # a lock held by one of them at fork time would never be released
+    global _lock, _in_flight, _executor, _executor_pid
+    _lock = threading.Lock()
+    _in_flight = 0
+    _executor = None
+    _executor_pid = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_executor():
+    """Create the worker pool lazily, once per process (safe across forks)."""
+    global _executor, _executor_pid
+    with _lock:
+        if _executor is None or _executor_pid != os.getpid():
+            if ANALYSIS_EXECUTOR == 'process':
+                _executor = ProcessPoolExecutor(max_workers=ANALYSIS_WORKERS)
+            else:
+                _executor = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix='analysis')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def queue_depth():
+    return _in_flight
+
+
+def _on_done(record_id, user_id, future):
+    global _in_flight
+    with _lock:
+        _in_flight -= 1
+    try:
+        analysis = future.result()
+    except Exception as e:
+        print(f"Async Analysis Error ({record_id}): {e}")
+        database.fail_health_analysis(record_id, user_id, e)
+        return
+    # Persisting happens here, in the web process, for both executor kinds
+    database.complete_health_analysis(record_id, user_id, analysis)
+
+
+def submit_analysis(record_id, user_id, data, age):
+    """Queue scoring for a pending record. Returns False when the queue is full."""
+    global _in_flight
+    with _lock:
+        if _in_flight >= ANALYSIS_QUEUE_LIMIT:
+            return False
+        _in_flight += 1
+    try:
+        future = get_executor().submit(scoring.assess, data, age)
+    except Exception as e:
+        with _lock:
+            _in_flight -= 1
+        print(f"Async Analysis Submit Error: {e}")
+        return False
+    future.add_done_callback(partial(_on_done, record_id, user_id))
+    return True
+
+
+def shutdown(wait=True):
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
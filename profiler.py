@@ -0,0 +1,209 @@
+import heapq
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+# Slow-request profiler. PROFILER=off installs nothing at all.
+#   header - profile only requests from admin sessions that send "X-Profile: 1"
+#   always - sample every request, keep the ones slower than PROFILE_SLOW_MS
+PROFILER = os.environ.get('PROFILER', 'off')
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 500))
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 50))           # files kept on disk
+PROFILE_INDEX_SIZE = int(os.environ.get('PROFILE_INDEX_SIZE', 20))  # slowest requests listed
+PROFILE_HEADER = 'X-Profile'
+
+PROFILE_NAME = re.compile(r'^[\w.-]+\.folded$')
+
+_labels = {}
+
+
+def _frame_label(code):
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ',')
+    return label
+
+
+def collapse(frame):
+    """Root-to-leaf stack in the collapsed format flamegraph tools read."""
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return ';'.join(stack)
+
+
+class Sampler:
+    """One background thread that samples the stacks of registered request threads.
+
+    The thread only wakes up while at least one request is being profiled.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.active = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+        self.pid = None
+
+    def start(self, ident):
+        with self.lock:
+            self.active[ident] = Counter()
+            if self.thread is None or self.pid != os.getpid():
+                # Threads don't survive a fork, so each worker starts its own
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+                self.thread.start()
+        self.wake.set()
+
+    def stop(self, ident):
+        with self.lock:
+            return self.active.pop(ident, None)
+
+    def _run(self):
+        while True:
+            self.wake.wait()
+            time.sleep(self.interval)
+            with self.lock:
+                if not self.active:
+                    self.wake.clear()
+                    continue
+                frames = sys._current_frames()
+                for ident, counts in self.active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        counts[collapse(frame)] += 1
+
+
+class SlowIndex:
+    """The N slowest profiled requests in this process."""
+
+    def __init__(self, size):
+        self.size = size
+        self.heap = []
+        self.lock = threading.Lock()
+
+    def add(self, entry):
+        with self.lock:
+            item = (entry['duration_ms'], entry['file'], entry)
+            if len(self.heap) < self.size:
+                heapq.heappush(self.heap, item)
+            elif item[0] > self.heap[0][0]:
+                heapq.heapreplace(self.heap, item)
+
+    def discard(self, names):
+        with self.lock:
+            kept = [item for item in self.heap if item[1] not in names]
+            if len(kept) != len(self.heap):
+                heapq.heapify(kept)
+                self.heap = kept
+
+    def entries(self):
+        with self.lock:
+            return [item[2] for item in sorted(self.heap, key=lambda item: item[0], reverse=True)]
+
+
+sampler = Sampler(PROFILE_INTERVAL_MS / 1000.0)
+slowest = SlowIndex(PROFILE_INDEX_SIZE)
+
+
+def write_profile(counts, endpoint, duration_ms):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-{os.getpid()}-{endpoint or 'unknown'}-{int(duration_ms)}ms.folded"
+    path = os.path.join(PROFILE_DIR, name)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        for stack, count in counts.most_common():
+            f.write(f"{stack} {count}\n")
+    os.replace(tmp, path)
+    rotate()
+    return name
+
+
+def rotate(keep=None):
+    """Delete the oldest profile files beyond PROFILE_KEEP (names sort by time)."""
+    keep = PROFILE_KEEP if keep is None else keep
+    try:
+        names = sorted(n for n in os.listdir(PROFILE_DIR) if PROFILE_NAME.match(n))
+    except FileNotFoundError:
+        return
+    removed = set(names[:max(len(names) - keep, 0)])
+    for name in removed:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except OSError:
+            pass
+    # Don't list profiles that can no longer be downloaded
+    slowest.discard(removed)
+
+
+def profile_path(name):
+    """Absolute path of a profile file, or None if the name isn't one of ours."""
+    if not PROFILE_NAME.match(name or ''):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.exists(path) else None
+
+
+def status():
+    return {
+        "mode": PROFILER,
+        "slow_ms": PROFILE_SLOW_MS,
+        "interval_ms": PROFILE_INTERVAL_MS,
+        "dir": PROFILE_DIR,
+        "keep": PROFILE_KEEP
+    }
+
+
+def install(app):
+    """Hook request start/finish into the app. Does nothing when PROFILER=off."""
+    if PROFILER not in ('header', 'always'):
+        return False
+    from flask import g, request, session
+
+    def start_profile():
+        if PROFILER == 'header':
+            if request.headers.get(PROFILE_HEADER) != '1' or not session.get('admin_logged_in'):
+                return
+            g.profile_forced = True
+        g.profile_ident = threading.get_ident()
+        g.profile_started = time.perf_counter()
+        sampler.start(g.profile_ident)
+
+    def finish_profile(exc=None):
+        ident = g.pop('profile_ident', None)
+        if ident is None:
+            return
+        counts = sampler.stop(ident)
+        duration_ms = (time.perf_counter() - g.pop('profile_started')) * 1000
+        # Header-requested profiles are always kept; sampled ones only when slow
+        if not counts or (not g.pop('profile_forced', False) and duration_ms < PROFILE_SLOW_MS):
+            return
+        try:
+            name = write_profile(counts, request.endpoint, duration_ms)
+        except Exception as e:
+            print(f"Profile Write Error: {e}")
+            return
+        slowest.add({
+            "file": name,
+            "endpoint": request.endpoint,
+            "path": request.path,
+            "method": request.method,
+            "duration_ms": round(duration_ms, 1),
+            "samples": sum(counts.values()),
+            "error": str(exc) if exc else None,
+            "timestamp": datetime.utcnow()
+        })
+
+    # Run first so the measured time covers the other hooks too
+    app.before_request_funcs.setdefault(None, []).insert(0, start_profile)
+    app.teardown_request(finish_profile)
+    return True
@@ -0,0 +1,111 @@
+import os
+import time
+import database
+import rules
+import scoring
+
+# Only the fields needed to rebuild the feature matrix
+RESCORE_PROJECTION = dict.fromkeys(
+    ['user_id', 'analysis_result', 'analysis_override'] + scoring.TEXT_FIELDS + [f for f, _ in scoring.NUMERIC_FIELDS], 1
+)
+
+# Raw vitals plus the stored analysis, for restage_all
+RESTAGE_PROJECTION = dict.fromkeys(rules.STAGE_FIELDS + ['analysis_result', 'analysis_override'], 1)
+
+# Keys an admin may have added by hand; carried over to the new analysis.
+# An analysis the admin replaced outright (analysis_override) isn't rewritten at all.
+PRESERVED_KEYS = ['manual_summary']
+
+
+def read_checkpoint(path):
+    try:
+        with open(path) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_checkpoint(path, last_id):
+    # Write-then-rename so an interrupted run never leaves a torn checkpoint
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(str(last_id))
+    os.replace(tmp_path, path)
+
+
+def rescore_chunk(docs):
+    """Re-score one chunk of health_data documents with the batch engine."""
+    docs = [d for d in docs if not d.get('analysis_override')]
+    if not docs:
+        return 0
+    ages = database.get_user_ages(d.get('user_id') for d in docs)
+    records = [scoring.parse_health_data(d) for d in docs]
+    analyses = scoring.assess_batch(records, [ages.get(d.get('user_id')) for d in docs])
+
+    updates = []
+    for doc, analysis in zip(docs, analyses):
+        old = database.load_analysis(doc.get('analysis_result'))
+        for key in PRESERVED_KEYS:
+            if key in old:
+                analysis[key] = old[key]
+        updates.append((doc['_id'], analysis))
+    return database.bulk_update_health_analyses(updates)
+
+
+def rescore_all(batch_size=500, after_id=None, checkpoint_path=None, throttle=0.0, report_every=10):
+    """Stream every stored assessment, re-score it and write it back in bulk.
+
+    Progress is checkpointed after each chunk so an interrupted run can
+    resume from the last written _id. `throttle` sleeps between chunks to
+    limit load on a live cluster.
+    """
+    total = database.count_health_data()
+    processed = 0
+    modified = 0
+    started = time.time()
+    print(f"Re-scoring ~{total} assessments (batch size {batch_size}, resume after {after_id or 'start'})")
+
+    for chunk_no, docs in enumerate(database.iter_health_data_batches(after_id, batch_size, RESCORE_PROJECTION), 1):
+        modified += rescore_chunk(docs)
+        processed += len(docs)
+        last_id = docs[-1]['_id']
+        if checkpoint_path:
+            write_checkpoint(checkpoint_path, last_id)
+
+        if chunk_no % report_every == 0:
+            rate = processed / max(time.time() - started, 1e-9)
+            pct = f" ({processed / total * 100:.1f}%)" if total else ""
+            print(f"  {processed}/{total}{pct} processed, {modified} updated, {rate:.0f} records/s, last _id {last_id}")
+        if throttle:
+            time.sleep(throttle)
+
+    elapsed = time.time() - started
+    print(f"Re-score complete: {processed} processed, {modified} updated in {elapsed:.1f}s")
+    return processed, modified
+
+
+def restage_all(batch_size=5000, report_every=20, dry_run=False):
+    """Re-apply the rules.py staging tables to every stored assessment.
+
+    Only bmi, bp_status, sugar_status and needs_doctor are rewritten, and
+    only where they changed; the model outputs and narrative stay as they
+    are (run rescore_all to regenerate those). Returns (processed, changed).
+    """
+    total = database.count_health_data()
+    processed = changed = 0
+    started = time.time()
+    for chunk_no, docs in enumerate(database.iter_health_data_batches(None, batch_size, RESTAGE_PROJECTION), 1):
+        analyses = [database.load_analysis(d.get('analysis_result')) for d in docs]
+        # Legacy string analyses can't take a field-level $set; migrate-analysis converts them first
+        updates = [(docs[i]['_id'], fields) for i, fields in rules.restage(docs, analyses)
+                   if isinstance(docs[i].get('analysis_result'), dict) and not docs[i].get('analysis_override')]
+        changed += len(updates)
+        if not dry_run:
+            database.bulk_set_analysis_fields(updates)
+        processed += len(docs)
+        if chunk_no % report_every == 0:
+            rate = processed / max(time.time() - started, 1e-9)
+            print(f"  {processed}/{total} processed, {changed} restaged, {rate:.0f} records/s")
+    print(f"Restage complete: {processed} processed, {changed} {'would change' if dry_run else 'restaged'} "
+          f"in {time.time() - started:.1f}s")
+    return processed, changed
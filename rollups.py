@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+
+# Diary rollups: one document per user in `diary_rollups` holding running
+# sums per day, ISO week and month. Writes $inc into it, reads summarize it.
+#   {"_id": user_id,
+#    "daily":   {"2026-03-14": {"n": 2, "steps": 9100, "water": 4.5, "sleep": 14.0}, ...},
+#    "weekly":  {"2026-W11": {...}}, "monthly": {"2026-03": {...}}, "all": {...}}
+# Sums are kept rather than means so that increments commute.
+METRICS = [('steps', 'steps'), ('water', 'water_intake'), ('sleep', 'sleep_hours')]
+PERIODS = ['daily', 'weekly', 'monthly']
+ROLLING_WINDOWS = [7, 30]
+
+
+def day_key(dt):
+    return dt.strftime('%Y-%m-%d')
+
+
+def week_key(dt):
+    year, week, _ = dt.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def month_key(dt):
+    return dt.strftime('%Y-%m')
+
+
+def period_keys(dt):
+    return {'daily': day_key(dt), 'weekly': week_key(dt), 'monthly': month_key(dt)}
+
+
+def entry_increments(entry, dt):
+    """$inc document that folds one diary entry into the rollup."""
+    inc = {}
+    for period, key in list(period_keys(dt).items()) + [('all', None)]:
+        prefix = f"{period}.{key}" if key else period
+        inc[f"{prefix}.n"] = 1
+        for name, field in METRICS:
+            inc[f"{prefix}.{name}"] = entry.get(field) or 0
+    return inc
+
+
+def build_rollup(days):
+    """Rollup maps from per-day sums [{day, n, steps, water, sleep}] (used by the backfill)."""
+    rollup = {period: {} for period in PERIODS}
+    rollup['all'] = {'n': 0, 'steps': 0, 'water': 0.0, 'sleep': 0.0}
+    for d in days:
+        dt = datetime.strptime(d['day'], '%Y-%m-%d')
+        targets = [rollup[period].setdefault(key, {'n': 0, 'steps': 0, 'water': 0.0, 'sleep': 0.0})
+                   for period, key in period_keys(dt).items()]
+        for target in targets + [rollup['all']]:
+            target['n'] += d['n']
+            for name, _ in METRICS:
+                target[name] += d.get(name) or 0
+    return rollup
+
+
+def _means(bucket):
+    n = bucket.get('n', 0)
+    out = {'entries': n}
+    for name, _ in METRICS:
+        total = bucket.get(name, 0)
+        out[f"{name}_total"] = round(total, 1)
+        out[f"{name}_avg"] = round(total / n, 1) if n else None
+    return out
+
+
+def _streaks(days, today):
+    """(current, longest) runs of consecutive logged days.
+
+    The current streak still counts if the last entry was yesterday.
+    """
+    if not days:
+        return 0, 0
+    dates = sorted(datetime.strptime(d, '%Y-%m-%d').date() for d in days)
+    longest = run = 1
+    for prev, cur in zip(dates, dates[1:]):
+        run = run + 1 if (cur - prev).days == 1 else 1
+        longest = max(longest, run)
+    current = 0
+    if (today - dates[-1]).days <= 1:
+        current = 1
+        for prev, cur in zip(reversed(dates[:-1]), reversed(dates)):
+            if (cur - prev).days != 1:
+                break
+            current += 1
+    return current, longest
+
+
+def summarize(rollup, today=None, recent_days=14, recent_weeks=8, recent_months=6):
+    """Trend figures for the diary page, computed from the rollup doc only."""
+    if not rollup or not rollup.get('daily'):
+        return None
+    today = today or datetime.utcnow().date()
+    daily = rollup.get('daily', {})
+
+    rolling = {}
+    for window in ROLLING_WINDOWS:
+        bucket = {'n': 0}
+        for offset in range(window):
+            day = daily.get(day_key(today - timedelta(days=offset)))
+            if day:
+                bucket['n'] += day.get('n', 0)
+                for name, _ in METRICS:
+                    bucket[name] = bucket.get(name, 0) + day.get(name, 0)
+        stats = _means(bucket)
+        stats['days_logged'] = sum(1 for offset in range(window) if day_key(today - timedelta(days=offset)) in daily)
+        rolling[window] = stats
+
+    current, longest = _streaks(daily.keys(), today)
+
+    def recent(period, count):
+        keys = sorted(rollup.get(period, {}))[-count:]
+        return [dict(_means(rollup[period][k]), period=k) for k in reversed(keys)]
+
+    return {
+        "streak": {"current": current, "longest": longest},
+        "rolling": rolling,
+        "all_time": _means(rollup.get('all', {})),
+        "daily": recent('daily', recent_days),
+        "weekly": recent('weekly', recent_weeks),
+        "monthly": recent('monthly', recent_months)
+    }
@@ -0,0 +1,380 @@
+import operator
+
+# Clinical guideline rules as data. Each table is a list of rows
+# (value, mode, clauses); clauses are (field, op, threshold) joined by AND
+# (ALL) or OR (ANY), and a row with no clauses always matches. A table is
+# evaluated either per record (scalar path, plain comparisons) or for a
+# whole batch at once as NumPy boolean masks (batch path).
+ALL = 'all'
+ANY = 'any'
+OPS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+       '==': operator.eq, '!=': operator.ne}
+
+# Below this many records the scalar path is faster than building arrays
+BATCH_MIN_RECORDS = 64
+
+
+def import_numpy():
+    """Import NumPy on demand so it stays off the startup path; None if absent."""
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+
+class RuleTable:
+    """Ordered rows; `first` picks the first match, `matches` returns all of them."""
+
+    def __init__(self, name, rows):
+        self.name = name
+        self.rows = rows
+        self.values = [value for value, _, _ in rows]
+        # Compiled once: operator functions instead of symbols
+        self._compiled = [(value, mode == ALL, [(f, OPS[op], x) for f, op, x in clauses])
+                          for value, mode, clauses in rows]
+        self.fields = sorted({f for _, _, clauses in rows for f, _, _ in clauses})
+
+    def _hit(self, conjunctive, clauses, record):
+        if not clauses:
+            return True
+        if conjunctive:
+            for f, op, x in clauses:
+                if not op(record[f], x):
+                    return False
+            return True
+        for f, op, x in clauses:
+            if op(record[f], x):
+                return True
+        return False
+
+    def first(self, record):
+        for value, conjunctive, clauses in self._compiled:
+            if self._hit(conjunctive, clauses, record):
+                return value
+        return None
+
+    def matches(self, record):
+        return [value for value, conjunctive, clauses in self._compiled if self._hit(conjunctive, clauses, record)]
+
+    def masks(self, columns, np):
+        """One boolean array per row."""
+        n = len(columns[self.fields[0]]) if self.fields else 0
+        out = []
+        for _, conjunctive, clauses in self._compiled:
+            if not clauses:
+                out.append(np.ones(n, dtype=bool))
+                continue
+            parts = [op(columns[f], x) for f, op, x in clauses]
+            out.append(np.logical_and.reduce(parts) if conjunctive else np.logical_or.reduce(parts))
+        return out
+
+    def first_batch(self, columns, np):
+        """Row index of the first match for every record (-1 if none)."""
+        masks = self.masks(columns, np)
+        return np.select(masks, np.arange(len(masks)), default=-1)
+
+    def values_batch(self, columns, np):
+        """First-match values for every record, as a Python list."""
+        values = self.values
+        return [values[i] if i >= 0 else None for i in self.first_batch(columns, np).tolist()]
+
+
+class PointsTable:
+    """base + the points of every matching clause, capped at `cap`."""
+
+    def __init__(self, name, base, rows, cap):
+        self.name = name
+        self.base = base
+        self.cap = cap
+        self.rows = rows
+        self._compiled = [(f, OPS[op], x, points) for f, op, x, points in rows]
+        self.fields = sorted({f for f, _, _, _ in rows})
+
+    def score(self, record):
+        total = self.base
+        for f, op, x, points in self._compiled:
+            if op(record[f], x):
+                total += points
+        return min(total, self.cap)
+
+    def score_batch(self, columns, np):
+        total = np.full(len(columns[self.fields[0]]), self.base, dtype=float)
+        for f, op, x, points in self._compiled:
+            total += np.where(op(columns[f], x), points, 0)
+        return np.minimum(total, self.cap)
+
+
+# --- Staging (WHO/AHA/ADA thresholds) ---
+BP_STAGES = RuleTable('bp_status', [
+    ("Normal", ALL, [('bp_systolic', '<', 120), ('bp_diastolic', '<', 80)]),
+    ("Elevated", ALL, [('bp_systolic', '<', 130), ('bp_diastolic', '<', 80)]),
+    # OR, not AND: kept from the original if/elif chain so stored stages stay
+    # comparable (a 150/85 reading is Stage 1 here)
+    ("Hypertension Stage 1", ANY, [('bp_systolic', '<', 140), ('bp_diastolic', '<', 90)]),
+    ("Hypertension Stage 2", ALL, []),
+])
+
+GLUCOSE_STAGES = RuleTable('sugar_status', [
+    ("Normal", ALL, [('fasting_glucose', '<', 100)]),
+    ("Prediabetes", ALL, [('fasting_glucose', '<', 126)]),
+    ("Diabetes", ALL, []),
+])
+
+BMI_CATEGORIES = RuleTable('bmi_category', [
+    ("Healthy", ALL, [('bmi', '>=', 18.5), ('bmi', '<=', 25)]),
+    ("Above range", ALL, [('bmi', '>', 25)]),
+    ("Below range", ALL, []),
+])
+
+# --- Risk tiers ---
+DIABETES_PROBABILITY = RuleTable('diabetes_prob', [
+    (15.0, ALL, [('sugar_status', '==', "Normal")]),
+    (45.0, ALL, [('sugar_status', '==', "Prediabetes")]),
+    (85.0, ALL, []),
+])
+DIABETES_LEVEL = RuleTable('diabetes_level', [
+    ("Low", ALL, [('diabetes_prob', '<', 30)]),
+    ("Moderate", ALL, [('diabetes_prob', '<', 60)]),
+    ("High", ALL, []),
+])
+# (level, probability)
+HYPERTENSION_RISK = RuleTable('hypertension_risk', [
+    (("Low", 20), ALL, [('bp_systolic', '<', 130)]),
+    (("Moderate", 50), ALL, []),
+])
+CARDIO_LEVEL = RuleTable('cardio_level', [
+    ("Low", ALL, [('heart_prob', '<', 20)]),
+    ("Moderate", ALL, [('heart_prob', '<', 50)]),
+    ("High", ALL, []),
+])
+METABOLIC_RISK = RuleTable('metabolic_risk', [
+    (("Moderate", 40), ALL, [('bmi', '>', 27), ('bp_systolic', '>', 130)]),
+    (("Low", 10), ALL, []),
+])
+
+# Heart risk used when the ML path is unavailable
+RULE_HEART_RISK = PointsTable('rule_heart_risk', 10.0, [
+    ('bp_systolic', '>', 140, 20),
+    ('smoking', '==', 'Yes', 15),
+    ('bmi', '>', 30, 10),
+], cap=95)
+
+# --- Care plan: every matching row applies, in order ---
+CARE_PLAN = RuleTable('plan', [
+    ("Aim for 150 minutes of moderate aerobic activity weekly to manage weight.", ALL, [('bmi', '>', 25)]),
+    ("Reduce sodium intake and consider the DASH diet.", ALL, [('bp_systolic', '>', 130)]),
+    ("Prioritize complex carbohydrates and lean proteins; limit refined sugars.", ALL, [('fasting_glucose', '>', 100)]),
+    ("Incorporate 10-15 minutes of mindfulness or breathing exercises daily.", ALL, [('stress_level', '==', 'High')]),
+    ("Try to establish a consistent sleep schedule to reach 7-8 hours of restful sleep.", ALL, [('sleep', '<', 7)]),
+    ("Consult a licensed doctor if you experience persistent symptoms or to discuss these findings further.", ALL, []),
+])
+
+
+def bmi(height, weight):
+    h_m = height / 100
+    return round(weight / (h_m * h_m), 1) if h_m > 0 else 0
+
+
+def needs_doctor(levels, bp_status, sugar_status):
+    return any(level == 'High' for level in levels) or bp_status.startswith("Hypertension") or sugar_status == "Diabetes"
+
+
+def tiers(facts):
+    """BMI category, risk tiers and care plan for one record.
+
+    `facts` is the parsed record plus bmi, sugar_status and heart_prob.
+    """
+    facts = dict(facts, diabetes_prob=DIABETES_PROBABILITY.first(facts))
+    return {
+        'bmi_category': BMI_CATEGORIES.first(facts),
+        'diabetes_prob': facts['diabetes_prob'],
+        'diabetes_level': DIABETES_LEVEL.first(facts),
+        'hypertension': HYPERTENSION_RISK.first(facts),
+        'cardio_level': CARDIO_LEVEL.first(facts),
+        'metabolic': METABOLIC_RISK.first(facts),
+        'plan': CARE_PLAN.matches(facts),
+    }
+
+
+# --- Batch path ---
+
+def columns(records, numeric, text=()):
+    """Column arrays for the given fields of a list of dicts."""
+    np = import_numpy()
+    cols = {f: np.fromiter((r[f] for r in records), dtype=float, count=len(records)) for f in numeric}
+    for f in text:
+        cols[f] = np.array([r.get(f) for r in records], dtype=object)
+    return cols
+
+
+def bmi_batch(height, weight, np):
+    """Same arithmetic as bmi(); rounded with round() so half-way cases match exactly."""
+    h_m = height / 100
+    with np.errstate(divide='ignore', invalid='ignore'):
+        raw = np.where(h_m > 0, weight / (h_m * h_m), 0.0)
+    return np.array([round(v, 1) for v in raw.tolist()], dtype=float)
+
+
+def stage_batch(cols):
+    """bmi / bp_status / sugar_status for whole columns, as Python lists.
+
+    `cols` needs height, weight, bp_systolic, bp_diastolic and fasting_glucose.
+    """
+    np = import_numpy()
+    cols = dict(cols, bmi=bmi_batch(cols['height'], cols['weight'], np))
+    bp_values = np.array(BP_STAGES.values, dtype=object)
+    sugar_values = np.array(GLUCOSE_STAGES.values, dtype=object)
+    # bmi() returns an int 0 for a missing height; keep that for identical narratives
+    bmis = [b if h > 0 else 0 for b, h in zip(cols['bmi'].tolist(), cols['height'].tolist())]
+    return (bmis, bp_values[BP_STAGES.first_batch(cols, np)].tolist(),
+            sugar_values[GLUCOSE_STAGES.first_batch(cols, np)].tolist())
+
+
+def stage_records(records):
+    """(bmis, bp_statuses, sugar_statuses) for parsed health data dicts.
+
+    Large batches go through the NumPy masks; small ones (and installs
+    without NumPy) take the scalar path.
+    """
+    if not _use_batch(records):
+        bmis, bps, sugars = [], [], []
+        for data in records:
+            bmis.append(bmi(data['height'], data['weight']))
+            bps.append(BP_STAGES.first(data))
+            sugars.append(GLUCOSE_STAGES.first(data))
+        return bmis, bps, sugars
+    return stage_batch(columns(records, STAGE_FIELDS))
+
+
+def _use_batch(records):
+    return len(records) >= BATCH_MIN_RECORDS and import_numpy() is not None
+
+
+def rule_heart_risk_batch(records, bmis):
+    """RULE_HEART_RISK for parsed health data dicts and their BMIs."""
+    if not _use_batch(records):
+        return [RULE_HEART_RISK.score(dict(data, bmi=b)) for data, b in zip(records, bmis)]
+    np = import_numpy()
+    cols = columns(records, ['bp_systolic'], ['smoking'])
+    cols['bmi'] = np.array(bmis, dtype=float)
+    return RULE_HEART_RISK.score_batch(cols, np).tolist()
+
+
+def tiers_batch(records, bmis, sugar_statuses, heart_probs):
+    """tiers() for every record; parallel lists in, one dict per record out."""
+    if not _use_batch(records):
+        return [tiers(dict(data, bmi=b, sugar_status=s, heart_prob=h))
+                for data, b, s, h in zip(records, bmis, sugar_statuses, heart_probs)]
+    np = import_numpy()
+    cols = columns(records, ['bp_systolic', 'fasting_glucose', 'sleep'], ['stress_level'])
+    cols['bmi'] = np.array(bmis, dtype=float)
+    cols['sugar_status'] = np.array(sugar_statuses, dtype=object)
+    cols['heart_prob'] = np.array(heart_probs, dtype=float)
+    diabetes_probs = DIABETES_PROBABILITY.values_batch(cols, np)
+    cols['diabetes_prob'] = np.array(diabetes_probs, dtype=float)
+    per_table = [BMI_CATEGORIES.values_batch(cols, np), diabetes_probs, DIABETES_LEVEL.values_batch(cols, np),
+                 HYPERTENSION_RISK.values_batch(cols, np), CARDIO_LEVEL.values_batch(cols, np),
+                 METABOLIC_RISK.values_batch(cols, np)]
+    # One row per record: which care plan lines apply
+    plan_hits = np.array(CARE_PLAN.masks(cols, np)).T.tolist()
+    keys = ['bmi_category', 'diabetes_prob', 'diabetes_level', 'hypertension', 'cardio_level', 'metabolic']
+    out = []
+    for i, hits in enumerate(plan_hits):
+        t = {key: values[i] for key, values in zip(keys, per_table)}
+        t['plan'] = [line for line, hit in zip(CARE_PLAN.values, hits) if hit]
+        out.append(t)
+    return out
+
+
+# --- Re-staging stored assessments ---
+STAGE_FIELDS = ['height', 'weight', 'bp_systolic', 'bp_diastolic', 'fasting_glucose']
+
+
+def _number(value):
+    # Same default as scoring.parse_num: missing or unparsable -> 0
+    try:
+        return float(value) if value not in (None, '') else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _column(values, np):
+    try:
+        arr = np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        arr = np.array([_number(v) for v in values], dtype=float)
+    arr[np.isnan(arr)] = 0.0
+    return arr
+
+
+def _heart_prob(analysis):
+    for risk in analysis.get('risks') or []:
+        if isinstance(risk, dict) and risk.get('condition') == "Cardiovascular Risk":
+            return _number(risk.get('probability'))
+    return 0.0
+
+
+def needs_doctor_batch(cols, bp_status, sugar_status, np):
+    """Vectorized needs_doctor; cols needs bmi, bp_systolic and heart_prob."""
+    cols = dict(cols, sugar_status=sugar_status)
+    cols['diabetes_prob'] = np.array(DIABETES_PROBABILITY.values, dtype=float)[DIABETES_PROBABILITY.first_batch(cols, np)]
+    flag = (np.char.startswith(bp_status.astype(str), "Hypertension")) | (sugar_status == "Diabetes")
+    for table, level_of in ((DIABETES_LEVEL, None), (HYPERTENSION_RISK, 0), (CARDIO_LEVEL, None), (METABOLIC_RISK, 0)):
+        high = np.array([(v if level_of is None else v[level_of]) == 'High' for v in table.values])
+        flag |= high[table.first_batch(cols, np)]
+    return flag
+
+
+def restage(docs, analyses):
+    """Recompute bmi, stages and needs_doctor for stored records.
+
+    `analyses` are the loaded analysis dicts, parallel to `docs`. Returns
+    (index, {field: new value}) for the records whose stored values differ.
+    The heart risk tier comes from the stored analysis, so no model runs.
+    """
+    np = import_numpy()
+    if np is None:
+        return _restage_scalar(docs, analyses)
+    cols = {f: _column([d.get(f) for d in docs], np) for f in STAGE_FIELDS}
+    bmis, bps, sugars = stage_batch(cols)
+    cols['bmi'] = np.array(bmis, dtype=float)
+    cols['heart_prob'] = np.array([_heart_prob(a) if a else 0.0 for a in analyses], dtype=float)
+    doctor = needs_doctor_batch(cols, np.array(bps, dtype=object), np.array(sugars, dtype=object), np).tolist()
+
+    changes = []
+    for i, analysis in enumerate(analyses):
+        if not analysis or 'bp_status' not in analysis:
+            continue
+        diff = {}
+        if analysis.get('bmi') != bmis[i]:
+            diff['bmi'] = bmis[i]
+        if analysis.get('bp_status') != bps[i]:
+            diff['bp_status'] = bps[i]
+        if analysis.get('sugar_status') != sugars[i]:
+            diff['sugar_status'] = sugars[i]
+        if analysis.get('needs_doctor') != doctor[i]:
+            diff['needs_doctor'] = doctor[i]
+        if diff:
+            changes.append((i, diff))
+    return changes
+
+
+def _restage_scalar(docs, analyses):
+    changes = []
+    for i, (doc, analysis) in enumerate(zip(docs, analyses)):
+        if not analysis or 'bp_status' not in analysis:
+            continue
+        data = {f: _number(doc.get(f)) for f in STAGE_FIELDS}
+        bmi_value = bmi(data['height'], data['weight'])
+        bp_status, sugar_status = BP_STAGES.first(data), GLUCOSE_STAGES.first(data)
+        facts = dict(data, bmi=bmi_value, sugar_status=sugar_status, heart_prob=_heart_prob(analysis))
+        facts['diabetes_prob'] = DIABETES_PROBABILITY.first(facts)
+        levels = [DIABETES_LEVEL.first(facts), HYPERTENSION_RISK.first(facts)[0],
+                  CARDIO_LEVEL.first(facts), METABOLIC_RISK.first(facts)[0]]
+        new = {'bmi': bmi_value, 'bp_status': bp_status, 'sugar_status': sugar_status,
+               'needs_doctor': needs_doctor(levels, bp_status, sugar_status)}
+        diff = {k: v for k, v in new.items() if analysis.get(k) != v}
+        if diff:
+            changes.append((i, diff))
+    return changes
@@ -0,0 +1,557 @@
+import json
+import math
+import os
+import pickle
+import queue
+import random
+import threading
+import time
+import metrics
+import model_registry
+import rules
+
+# Feature order used by train_model.py (12 columns)
+FEATURE_COLUMNS = [
+    'age', 'gender', 'bmi', 'bp_systolic', 'fasting_glucose', 'smoking',
+    'cholesterol', 'activity_level', 'stress_level', 'mood', 'sleep_quality', 'lifestyle_balance'
+]
+
+# (encoder key, form field, feature column, fallback code)
+# A fallback of None means the value is mandatory for the ML path; rows with an
+# unknown gender or smoking value are scored by the rule fallback instead.
+CATEGORICAL_FEATURES = [
+    ('gender', 'sex', 1, None),
+    ('smoking', 'smoking', 5, None),
+    ('activity', 'activity', 7, 1),
+    ('stress', 'stress_level', 8, 1),
+    ('mood', 'mood', 9, 1),
+    ('sleep_q', 'sleep_quality', 10, 1),
+    ('balance', 'lifestyle_balance', 11, 1),
+]
+
+TEXT_FIELDS = [
+    'sex', 'family_history', 'smoking', 'alcohol', 'activity', 'diet', 'environmental',
+    'stress_level', 'mood', 'sleep_quality', 'lifestyle_balance'
+]
+
+NUMERIC_FIELDS = [
+    ('sleep', float), ('height', float), ('weight', float),
+    ('bp_systolic', int), ('bp_diastolic', int), ('fasting_glucose', int),
+    ('hba1c', float), ('cholesterol', int), ('ldl', int), ('hdl', int), ('triglycerides', int)
+]
+
+DEFAULT_AGE = 30
+
+MODEL_PATH = os.environ.get('ML_MODEL_PATH', 'healthcare_model.pkl')
+COMPILED_MODEL_PATH = os.environ.get('ML_COMPILED_MODEL_PATH', 'healthcare_model.json')
+# auto: compiled artifact when present, else the pickled sklearn models
+ML_BACKEND = os.environ.get('ML_BACKEND', 'auto')
+# lazy: load on the first scoring call; background: warm up on a thread at
+# startup; eager: load at import (blocks startup)
+ML_LOAD = os.environ.get('ML_LOAD', 'lazy')
+# Fraction of scoring calls also run through the SHADOW candidate (on a
+# background thread), and the gap (heart risk % or health score points)
+# that counts as a disagreement
+SHADOW_RATE = float(os.environ.get('ML_SHADOW_RATE', 0.05))
+SHADOW_TOLERANCE = float(os.environ.get('ML_SHADOW_TOLERANCE', 5.0))
+SHADOW_LOG_LIMIT = 5
+# Shadow batches waiting for the background thread; more are dropped
+SHADOW_QUEUE_LIMIT = int(os.environ.get('ML_SHADOW_QUEUE_LIMIT', 16))
+# Stored as model_version on analyses scored by the rule fallback
+RULES_VERSION = 'rules'
+
+
+def _sigmoid(z):
+    if z >= 0:
+        return 1.0 / (1.0 + math.exp(-z))
+    ez = math.exp(z)
+    return ez / (1.0 + ez)
+
+
+def compile_assets(assets):
+    """Fold the pickled encoders, scaler and linear models into plain data.
+
+    StandardScaler followed by a linear model is itself linear:
+    w . ((x - mean) / scale) + b == (w / scale) . x + (b - sum(w * mean / scale))
+    so each model collapses to one coefficient vector and one intercept.
+    """
+    scaler = assets['scaler']
+    n = len(FEATURE_COLUMNS)
+    mean = [float(m) for m in scaler.mean_] if scaler.mean_ is not None else [0.0] * n
+    scale = [float(v) for v in scaler.scale_] if scaler.scale_ is not None else [1.0] * n
+
+    def fold(coef, intercept):
+        coef = [float(c) for c in coef]
+        return {
+            "coef": [c / sc for c, sc in zip(coef, scale)],
+            "intercept": float(intercept) - sum(c * m / sc for c, m, sc in zip(coef, mean, scale))
+        }
+
+    return {
+        "format": 1,
+        "features": FEATURE_COLUMNS,
+        "lookups": {key: {str(label): code for code, label in enumerate(enc.classes_)}
+                    for key, enc in assets['encoders'].items()},
+        "risk": fold(assets['model_risk'].coef_[0], assets['model_risk'].intercept_[0]),
+        "score": fold(assets['model_score'].coef_, assets['model_score'].intercept_)
+    }
+
+
+class SklearnModel:
+    """Scores with the pickled scikit-learn scaler and models."""
+    backend = 'sklearn'
+    version = None
+
+    def __init__(self, assets):
+        self.scaler = assets['scaler']
+        self.model_risk = assets['model_risk']
+        self.model_score = assets['model_score']
+        # Label -> code lookup tables, equivalent to LabelEncoder.transform
+        self.lookups = {key: {label: code for code, label in enumerate(enc.classes_)}
+                        for key, enc in assets['encoders'].items()}
+
+    def predict(self, rows):
+        np = rules.import_numpy()
+        features_scaled = self.scaler.transform(np.array(rows, dtype=float))
+        probs = self.model_risk.predict_proba(features_scaled)[:, 1].tolist()
+        scores = self.model_score.predict(features_scaled).tolist()
+        return probs, scores
+
+
+class CompiledModel:
+    """Scores with the compiled artifact using NumPy, or pure Python without it."""
+    version = None
+
+    def __init__(self, artifact, use_numpy=None):
+        if artifact.get('features') != FEATURE_COLUMNS:
+            raise ValueError("Compiled model feature order does not match FEATURE_COLUMNS")
+        self.lookups = artifact['lookups']
+        self.risk_coef = artifact['risk']['coef']
+        self.risk_intercept = artifact['risk']['intercept']
+        self.score_coef = artifact['score']['coef']
+        self.score_intercept = artifact['score']['intercept']
+        self.np = rules.import_numpy() if use_numpy is not False else None
+        self.backend = 'compiled-numpy' if self.np is not None else 'compiled-python'
+        if self.np is not None:
+            np = self.np
+            # One (12 x 2) weight matrix gives both linear outputs in a single matmul
+            self.weights = np.array([self.risk_coef, self.score_coef], dtype=float).T
+            self.intercepts = np.array([self.risk_intercept, self.score_intercept], dtype=float)
+
+    def predict(self, rows):
+        if self.np is not None:
+            np = self.np
+            out = np.array(rows, dtype=float) @ self.weights + self.intercepts
+            probs = (1.0 / (1.0 + np.exp(-np.clip(out[:, 0], -500, 500)))).tolist()
+            return probs, out[:, 1].tolist()
+        probs, scores = [], []
+        for row in rows:
+            probs.append(_sigmoid(sum(c * x for c, x in zip(self.risk_coef, row)) + self.risk_intercept))
+            scores.append(sum(c * x for c, x in zip(self.score_coef, row)) + self.score_intercept)
+        return probs, scores
+
+
+def load_files(pkl_path, compiled_path, backend=ML_BACKEND):
+    """Load the scoring model for the configured backend from artifact files, or None."""
+    if backend in ('auto', 'compiled') and compiled_path and os.path.exists(compiled_path):
+        try:
+            with open(compiled_path) as f:
+                return CompiledModel(json.load(f))
+        except Exception as e:
+            print(f"Compiled model loading failed: {e}")
+    if backend in ('auto', 'sklearn') and pkl_path:
+        try:
+            with open(pkl_path, 'rb') as f:
+                return SklearnModel(pickle.load(f))
+        except Exception as e:
+            print(f"ML Model loading failed: {e}")
+    return None
+
+
+def load_version(version, backend=ML_BACKEND):
+    """Load a registered version after checking its checksums, or None."""
+    try:
+        model_registry.verify(version)
+        paths = model_registry.artifact_paths(version)
+    except (ValueError, OSError) as e:
+        print(f"Model Registry Error: {e}")
+        return None
+    model = load_files(paths.get('sklearn'), paths.get('compiled'), backend)
+    if model is not None:
+        model.version = version
+    return model
+
+
+def load_model(backend=ML_BACKEND):
+    """The CURRENT registry version, else the unversioned files at MODEL_PATH/COMPILED_MODEL_PATH."""
+    version = _current.read()
+    if version:
+        model = load_version(version, backend)
+        if model is not None:
+            return model
+        print(f"Model version {version} failed to load; using the unversioned model files")
+    model = load_files(MODEL_PATH, COMPILED_MODEL_PATH, backend)
+    if model is not None:
+        # Name unregistered artifacts by content so analyses can still be traced
+        path = COMPILED_MODEL_PATH if model.backend.startswith('compiled') else MODEL_PATH
+        model.version = f"sha256-{model_registry.sha256_file(path)[:12]}"
+    return model
+
+
+def _load_shadow():
+    global SHADOW_MODEL
+    version = _shadow.read()
+    if version is None:
+        SHADOW_MODEL = None
+    elif SHADOW_MODEL is None or SHADOW_MODEL.version != version:
+        SHADOW_MODEL = load_version(version)
+
+
+# Loaded model state. ML_READY stays False until a load succeeds.
+ML_MODEL = None
+ML_READY = False
+SHADOW_MODEL = None
+_load_attempted = False
+_load_lock = threading.Lock()
+_reload_lock = threading.Lock()
+_current = model_registry.Pointer(model_registry.CURRENT)
+_shadow = model_registry.Pointer(model_registry.SHADOW)
+
+
+def _reload():
+    """Swap to newly activated versions; runs on its own thread holding _reload_lock.
+
+    Scoring calls hold on to the model object they started with, and the
+    global is replaced in one assignment, so nothing waits for the load.
+    """
+    global ML_MODEL, ML_READY
+    try:
+        version = _current.read()
+        if version and (ML_MODEL is None or ML_MODEL.version != version):
+            model = load_version(version)
+            if model is None:
+                metrics.MODEL_RELOADS.labels('failed').inc()
+            else:
+                ML_MODEL, ML_READY = model, True
+                metrics.MODEL_RELOADS.labels('ok').inc()
+                print(f"Model reloaded: serving {version}")
+        _load_shadow()
+    except Exception as e:
+        print(f"Model Reload Error: {e}")
+    finally:
+        _reload_lock.release()
+
+
+def get_model():
+    """Return the scoring model, loading it on first use (thread-safe).
+
+    Afterwards the registry pointers are polled every ML_RELOAD_INTERVAL
+    seconds; a change triggers a background reload.
+    """
+    global ML_MODEL, ML_READY, _load_attempted
+    if _load_attempted:
+        if (_current.changed() or _shadow.changed()) and _reload_lock.acquire(blocking=False):
+            threading.Thread(target=_reload, name='model-reload', daemon=True).start()
+        return ML_MODEL
+    with _load_lock:
+        if not _load_attempted:
+            ML_MODEL = load_model()
+            ML_READY = ML_MODEL is not None
+            _load_shadow()
+            _load_attempted = True
+    return ML_MODEL
+
+
+def start_warmup():
+    """Load the model on a daemon thread so the first request doesn't pay for it."""
+    if _load_attempted:
+        return None
+    thread = threading.Thread(target=get_model, name='model-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+def model_status():
+    return {
+        "ready": ML_READY,
+        "loaded": _load_attempted,
+        "load_mode": ML_LOAD,
+        "backend": ML_MODEL.backend if ML_MODEL is not None else None,
+        "version": ML_MODEL.version if ML_MODEL is not None else None,
+        "shadow_version": SHADOW_MODEL.version if SHADOW_MODEL is not None else None
+    }
+
+
+def _reset_after_fork():
+    # A lock held by a warm-up thread at fork time would never be released
+    # in the child; the thread itself does not survive the fork.
+    global _load_lock, _reload_lock, _shadow_lock
+    _load_lock = threading.Lock()
+    _reload_lock = threading.Lock()
+    _shadow_lock = threading.Lock()
+    if ML_LOAD == 'background' and not _load_attempted:
+        start_warmup()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+if ML_LOAD == 'eager':
+    get_model()
+
+
+def parse_num(val, default=0, type_func=float):
+    """Safely parse a form/JSON value into a number."""
+    try:
+        if val is None or (isinstance(val, str) and val.strip() == ''):
+            return default
+        return type_func(val)
+    except:
+        return default
+
+
+def parse_health_data(source):
+    """Build the stored health data dict from a form or JSON record."""
+    # JSON callers can send anything; text fields are strings or None from here on
+    data = {field: None if source.get(field) is None else str(source.get(field)) for field in TEXT_FIELDS}
+    for field, type_func in NUMERIC_FIELDS:
+        data[field] = parse_num(source.get(field), type_func=type_func)
+    return data
+
+
+def clinical_metrics(data):
+    """BMI plus BP and glucose staging (WHO/AHA/ADA thresholds, see rules.py)."""
+    return rules.bmi(data['height'], data['weight']), rules.BP_STAGES.first(data), rules.GLUCOSE_STAGES.first(data)
+
+
+def build_feature_rows(records, ages, bmis, lookups):
+    """Encode N records into N rows of the 12 model features.
+
+    Returns the rows and a parallel list flagging rows that can use the ML path.
+    """
+    rows = []
+    ml_ok = []
+    for data, age, bmi in zip(records, ages, bmis):
+        row = [float(age), 0, bmi, float(data['bp_systolic']), float(data['fasting_glucose']), 0,
+               float(data['cholesterol']), 0, 0, 0, 0, 0]
+        ok = True
+        for key, field, col, fallback in CATEGORICAL_FEATURES:
+            try:
+                code = lookups[key].get(data[field], fallback)
+            except TypeError:
+                code = None  # Unhashable value: this row alone falls back to the rules
+            if code is None:
+                ok = False
+                code = 0
+            row[col] = code
+        rows.append(row)
+        ml_ok.append(ok)
+    return rows, ml_ok
+
+
+# Metric children bound once per backend, so scoring doesn't build label tuples
+INFERENCE_METRICS = {
+    backend: (metrics.INFERENCE_LATENCY.labels(backend), metrics.INFERENCE_ROWS.labels(backend))
+    for backend in ('sklearn', 'compiled-numpy', 'compiled-python')
+}
+
+
+def _round_outputs(probs, scores):
+    heart_probs = [float(round(p * 100, 1)) for p in probs]
+    health_scores = [max(min(float(round(s, 1)), 100.0), 0.0) for s in scores]
+    return heart_probs, health_scores
+
+
+def predict_batch(records, ages, bmis, model=None):
+    """Score N records with a single vectorized model call.
+
+    Returns (heart_probs, health_scores, ml_ok) where ml_ok marks the rows
+    that were scored by the models. Other rows need the rule fallback.
+    """
+    n = len(records)
+    model = model or get_model()
+    if model is None or n == 0:
+        return [0.0] * n, [75.0] * n, [False] * n
+    try:
+        rows, ml_ok = build_feature_rows(records, ages, bmis, model.lookups)
+        started = time.perf_counter()
+        probs, scores = model.predict(rows)
+        latency, scored = INFERENCE_METRICS[model.backend]
+        latency.observe(time.perf_counter() - started)
+        scored.inc(n)
+        heart_probs, health_scores = _round_outputs(probs, scores)
+        return heart_probs, health_scores, ml_ok
+    except Exception as e:
+        print(f"Batch Inference Error: {e}")
+        metrics.INFERENCE_ERRORS.inc()
+        return [0.0] * n, [75.0] * n, [False] * n
+
+
+def shadow_compare(shadow, live, records, ages, bmis, heart_probs, health_scores, ml_ok):
+    """Score with the SHADOW candidate and log rows that disagree with the live model.
+
+    The candidate's results are never stored or shown. Returns the number
+    of disagreeing rows.
+    """
+    try:
+        rows, shadow_ok = build_feature_rows(records, ages, bmis, shadow.lookups)
+        shadow_probs, shadow_scores = _round_outputs(*shadow.predict(rows))
+    except Exception as e:
+        print(f"Shadow Scoring Error: {e}")
+        return 0
+    compared = 0
+    disagreements = []
+    for i in range(len(records)):
+        if not (ml_ok[i] and shadow_ok[i]):
+            continue
+        compared += 1
+        gap = max(abs(shadow_probs[i] - heart_probs[i]), abs(shadow_scores[i] - health_scores[i]))
+        if gap > SHADOW_TOLERANCE:
+            disagreements.append((i, gap))
+    metrics.SHADOW_ROWS.labels(shadow.version).inc(compared)
+    if disagreements:
+        metrics.SHADOW_DISAGREEMENTS.labels(shadow.version).inc(len(disagreements))
+        for i, gap in disagreements[:SHADOW_LOG_LIMIT]:
+            print(f"Shadow Disagreement: {shadow.version} vs {live.version} row {i}: "
+                  f"heart risk {heart_probs[i]} -> {shadow_probs[i]}, score {health_scores[i]} -> {shadow_scores[i]}")
+        if len(disagreements) > SHADOW_LOG_LIMIT:
+            print(f"Shadow Disagreement: {len(disagreements) - SHADOW_LOG_LIMIT} more rows in this batch")
+    return len(disagreements)
+
+
+_shadow_jobs = None
+_shadow_pid = None
+_shadow_lock = threading.Lock()
+
+
+def _shadow_worker(jobs):
+    while True:
+        args = jobs.get()
+        try:
+            shadow_compare(*args)
+        except Exception as e:
+            print(f"Shadow Scoring Error: {e}")
+
+
+def queue_shadow_compare(*args):
+    """Run shadow_compare(*args) off the request thread. False when the queue is full."""
+    global _shadow_jobs, _shadow_pid
+    with _shadow_lock:
+        # The worker thread doesn't survive a fork, so each process starts its own
+        if _shadow_jobs is None or _shadow_pid != os.getpid():
+            _shadow_jobs = queue.Queue(maxsize=SHADOW_QUEUE_LIMIT)
+            _shadow_pid = os.getpid()
+            threading.Thread(target=_shadow_worker, args=(_shadow_jobs,), daemon=True, name='shadow-compare').start()
+        jobs = _shadow_jobs
+    try:
+        jobs.put_nowait(args)
+        return True
+    except queue.Full:
+        return False
+
+
+def rule_heart_risk(data, bmi):
+    """Evidence-based rule fallback used when the ML path is unavailable."""
+    return rules.RULE_HEART_RISK.score(dict(data, bmi=bmi))
+
+
+def build_analysis(data, bmi, bp_status, sugar_status, heart_prob, health_score, tiers=None):
+    """Assemble the doctor-like narrative stored as analysis_result.
+
+    `tiers` is this record's rules.tiers() result when the caller already
+    computed it for a whole batch.
+    """
+    sys = data['bp_systolic']
+    dia = data['bp_diastolic']
+    glu = data['fasting_glucose']
+
+    # 1. Gentle Opening
+    opening = "Thank you for sharing your health details. I will carefully review them to give you a safe and helpful health overview."
+
+    # 2. Current Health Summary
+    t = tiers or rules.tiers(dict(data, bmi=bmi, sugar_status=sugar_status, heart_prob=heart_prob))
+    condition_summary = f"Your physical health shows a BMI of {bmi} ({t['bmi_category']}). "
+    condition_summary += f"Blood pressure is currently {bp_status} at {sys}/{dia} mmHg. "
+    condition_summary += f"Blood glucose is {sugar_status.lower()}. "
+    condition_summary += f"Mentally, you've reported a {(data['mood'] or '').lower()} mood with {(data['stress_level'] or '').lower()} stress."
+
+    # 3. Disease Risk Assessment
+    hypertension_level, hypertension_prob = t['hypertension']
+    metabolic_level, metabolic_prob = t['metabolic']
+    risks = [
+        {"condition": "Diabetes Risk", "level": t['diabetes_level'], "probability": t['diabetes_prob'], "reasoning": f"Based on fasting glucose of {glu} mg/dL and HbA1c of {data['hba1c']}%."},
+        {"condition": "Hypertension Risk", "level": hypertension_level, "probability": hypertension_prob, "reasoning": f"Current BP is {sys}/{dia} mmHg."},
+        {"condition": "Cardiovascular Risk", "level": t['cardio_level'], "probability": heart_prob, "reasoning": "Determined by age, smoking status, systolic BP, and cholesterol levels."},
+        {"condition": "Metabolic Syndrome", "level": metabolic_level, "probability": metabolic_prob, "reasoning": "Correlation between BMI, BP, and glucose levels."}
+    ]
+
+    # 4. Personalized Health Improvement Plan
+    plan = t['plan']
+
+    # 5. Emotional Support Tone
+    support = "Many of these risks can be improved with small daily changes. You are taking a positive step by checking your health."
+
+    # 6. Mandatory Medical Disclaimer
+    disclaimer = "This assessment is for preventive health awareness only and does not replace a qualified medical professional. Please consult a licensed doctor for diagnosis or treatment decisions."
+
+    return {
+        "bmi": bmi,
+        "bp_status": bp_status,
+        "sugar_status": sugar_status,
+        "health_score": health_score,
+        "opening": opening,
+        "summary": condition_summary,
+        "risks": risks,
+        "plan": plan,
+        "support": support,
+        "disclaimer": disclaimer,
+        "needs_doctor": rules.needs_doctor([r['level'] for r in risks], bp_status, sugar_status),
+        "conditions": [{"condition": r['condition'], "probability": r['probability']} for r in risks] # For backward compatibility with template if needed
+    }
+
+
+def assess_batch(records, ages=None):
+    """Score a list of parsed health data dicts in one vectorized pass.
+
+    `ages` is a parallel list of patient ages (None entries use DEFAULT_AGE).
+    Returns one analysis dict per record, in input order.
+    """
+    if ages is None:
+        ages = [None] * len(records)
+    ages = [DEFAULT_AGE if a is None else a for a in ages]
+
+    bmis, bp_statuses, sugar_statuses = rules.stage_records(records)
+    # One model for the whole batch, even if a reload swaps it mid-call
+    model = get_model()
+    heart_probs, health_scores, ml_ok = predict_batch(records, ages, bmis, model)
+    shadow = SHADOW_MODEL
+    if shadow is not None and model is not None and random.random() < SHADOW_RATE:
+        # Copies: the fallback below overwrites entries of these lists
+        queue_shadow_compare(shadow, model, records, ages, list(bmis), list(heart_probs), list(health_scores), ml_ok)
+
+    # Rule fallback for the rows the model couldn't score
+    fallback = [i for i in range(len(records)) if not ml_ok[i]]
+    for i, prob in zip(fallback, rules.rule_heart_risk_batch([records[i] for i in fallback], [bmis[i] for i in fallback])):
+        heart_probs[i], health_scores[i] = prob, 75
+    tiers = rules.tiers_batch(records, bmis, sugar_statuses, heart_probs)
+
+    analyses = []
+    for i, data in enumerate(records):
+        analysis = build_analysis(data, bmis[i], bp_statuses[i], sugar_statuses[i], heart_probs[i], health_scores[i], tiers[i])
+        analysis['model_version'] = model.version if ml_ok[i] else RULES_VERSION
+        analyses.append(analysis)
+    return analyses
+
+
+def assess(data, age=None):
+    """Score a single health data dict."""
+    return assess_batch([data], [age])[0]
+
+
+if __name__ == '__main__':
+    # Rebuild the compiled artifact from the current pickle
+    with open(MODEL_PATH, 'rb') as f:
+        compiled = compile_assets(pickle.load(f))
+    with open(COMPILED_MODEL_PATH, 'w') as f:
+        json.dump(compiled, f, indent=2)
+    print(f"Compiled model written to '{COMPILED_MODEL_PATH}'")
@@ -0,0 +1,179 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import struct
+import zlib
+
+# Static asset build (`python manage.py build-static`):
+#   static/style.css -> static/dist/style.<hash>.css (+ .gz, + .br)
+# Names carry a content hash, so the files can be cached for a year and a
+# changed file simply gets a new URL. dist/manifest.json maps source paths
+# to built ones; app.py rewrites url_for('static', ...) through it.
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+HASH_LENGTH = 10
+# Variants are kept only when they save at least this fraction
+MIN_SAVING = 0.05
+COMPRESSIBLE = {'application/javascript', 'text/javascript', 'application/json', 'image/svg+xml'}
+
+
+def import_brotli():
+    """Brotli variants need the optional brotli package; None if absent."""
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+# --- CSS ---
+# Quoted strings pass through untouched; comments are dropped unless they
+# start with /*! (licences); everything else has its whitespace squeezed.
+_CSS_TOKENS = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|(/\*.*?\*/)|([^"'/]+|/)''', re.S)
+_CSS_SPACE_AROUND = re.compile(r'\s*([{};,>])\s*')
+_CSS_SPACE_AFTER_COLON = re.compile(r':\s+')
+
+
+def _squeeze(code):
+    code = re.sub(r'\s+', ' ', code)
+    code = _CSS_SPACE_AROUND.sub(r'\1', code)
+    return _CSS_SPACE_AFTER_COLON.sub(':', code)
+
+
+def minify_css(text):
+    out = []
+    code = ''
+    for string, comment, other in _CSS_TOKENS.findall(text):
+        if string or comment.startswith('/*!'):
+            out.append(_squeeze(code))
+            out.append(string or comment)
+            code = ''
+        else:
+            # Dropped comments still separate tokens, hence the space
+            code += other or ' '
+    out.append(_squeeze(code))
+    return ''.join(out).replace(';}', '}').strip()
+
+
+# --- PNG ---
+# Lossless: IDAT is re-deflated at the highest level in one chunk, and
+# text/time metadata is removed. Pixels and colour chunks are untouched.
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_DROP = {b'tEXt', b'zTXt', b'iTXt', b'tIME'}
+
+
+def _png_chunks(data):
+    pos = len(PNG_SIGNATURE)
+    while pos + 8 <= len(data):
+        length, kind = struct.unpack('>I4s', data[pos:pos + 8])
+        yield kind, data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+
+
+def _png_chunk(kind, body):
+    return struct.pack('>I', len(body)) + kind + body + struct.pack('>I', zlib.crc32(kind + body) & 0xffffffff)
+
+
+def optimize_png(data):
+    if not data.startswith(PNG_SIGNATURE):
+        return data
+    try:
+        chunks = list(_png_chunks(data))
+        idat = zlib.decompress(b''.join(body for kind, body in chunks if kind == b'IDAT'))
+    except (struct.error, zlib.error):
+        return data
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9)
+    packed = compressor.compress(idat) + compressor.flush()
+    out = [PNG_SIGNATURE]
+    wrote_idat = False
+    for kind, body in chunks:
+        if kind in PNG_DROP:
+            continue
+        if kind == b'IDAT':
+            if not wrote_idat:
+                out.append(_png_chunk(b'IDAT', packed))
+                wrote_idat = True
+            continue
+        out.append(_png_chunk(kind, body))
+    optimized = b''.join(out)
+    return optimized if len(optimized) < len(data) else data
+
+
+# --- Build ---
+
+def _compressible(path):
+    kind = mimetypes.guess_type(path)[0] or ''
+    return kind.startswith('text/') or kind in COMPRESSIBLE
+
+
+def fingerprint(path, data):
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build(static_folder='static'):
+    """Build every file under static_folder into static_folder/dist; returns the manifest.
+
+    Files from earlier builds are left in place so pages rendered by a
+    worker still on the old manifest keep loading during a rolling deploy.
+    """
+    dist = os.path.join(static_folder, DIST)
+    brotli = import_brotli()
+    manifest = {"files": {}, "encodings": {}}
+    report = []
+    for root, dirs, files in os.walk(static_folder):
+        if os.path.abspath(root) == os.path.abspath(static_folder):
+            dirs[:] = [d for d in dirs if d != DIST]
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            rel = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                original = f.read()
+            data = original
+            if rel.endswith('.css'):
+                data = minify_css(original.decode('utf-8')).encode('utf-8')
+            elif rel.endswith('.png'):
+                data = optimize_png(original)
+
+            built = fingerprint(rel, data)
+            target = os.path.join(dist, built)
+            _write(target, data)
+            manifest['files'][rel] = built
+            sizes = {"source": len(original), "built": len(data)}
+
+            if _compressible(rel):
+                encodings = []
+                variants = [('br', '.br', lambda d: brotli.compress(d, quality=11))] if brotli else []
+                variants.append(('gzip', '.gz', lambda d: gzip.compress(d, 9, mtime=0)))
+                for encoding, ext, compress in variants:
+                    packed = compress(data)
+                    if len(packed) <= len(data) * (1 - MIN_SAVING):
+                        _write(target + ext, packed)
+                        encodings.append(encoding)
+                        sizes[encoding] = len(packed)
+                if encodings:
+                    manifest['encodings'][built] = encodings
+            report.append((rel, built, sizes))
+
+    _write(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest, report
+
+
+def load_manifest(static_folder='static'):
+    """The last build's manifest, or None when static/dist hasn't been built."""
+    try:
+        with open(os.path.join(static_folder, DIST, MANIFEST)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
@@ -0,0 +1,108 @@
+import os
+import threading
+from datetime import datetime, timedelta
+import database
+
+# OP tickets: numbered OP-<yymmdd>-<n> per hospital and visit day, with a
+# consultation slot reserved for each.
+#
+# Ticket numbers come from one counter document per (hospital, day) in
+# `ticket_counters`. A worker claims TICKET_BLOCK_SIZE numbers at a time with
+# a single $inc and hands them out from memory, so the counter is written once
+# per block instead of once per booking. Numbers are unique but not strictly
+# in booking order across workers, and a restarted worker leaves a gap.
+TICKET_BLOCK_SIZE = int(os.environ.get('TICKET_BLOCK_SIZE', 20))
+
+# Hospitals that take bookings (comma-separated). The name is part of the
+# counter and slot ids, so nothing else may reach them.
+HOSPITALS = [h.strip() for h in os.environ.get('HOSPITALS', 'City General Hospital').split(',') if h.strip()]
+DEFAULT_HOSPITAL = HOSPITALS[0]
+
+# Slots live in `consultation_slots`, one document per hospital and start time,
+# created on first booking. A place is taken with a conditional $inc that only
+# matches while booked < capacity, so concurrent bookings can't overfill one.
+SLOT_MINUTES = int(os.environ.get('SLOT_MINUTES', 15))
+SLOT_CAPACITY = int(os.environ.get('SLOT_CAPACITY', 4))
+CLINIC_HOURS = os.environ.get('CLINIC_HOURS', '09:00-17:00')
+BOOKING_DAYS_AHEAD = int(os.environ.get('BOOKING_DAYS_AHEAD', 7))
+# Don't hand out a slot that starts sooner than this
+BOOKING_LEAD_MINUTES = int(os.environ.get('BOOKING_LEAD_MINUTES', 15))
+
+
+def ticket_number(day, n):
+    return f"OP-{day.replace('-', '')[2:]}-{n:04d}"
+
+
+class TicketAllocator:
+    """Hands out ticket numbers from blocks reserved in MongoDB."""
+
+    def __init__(self, block_size=TICKET_BLOCK_SIZE):
+        self.block_size = block_size
+        self._ranges = {}   # (hospital, day) -> [next, last]
+        self._lock = threading.Lock()
+
+    def next(self, hospital, day):
+        """The next ticket number for a hospital and day ('YYYY-MM-DD'), or None if the DB is unreachable."""
+        with self._lock:
+            block = self._ranges.get((hospital, day))
+            if block is None or block[0] > block[1]:
+                reserved = database.reserve_ticket_block(hospital, day, self.block_size)
+                if reserved is None:
+                    return None
+                # Past days are never booked again
+                self._ranges = {k: v for k, v in self._ranges.items() if k[1] >= day}
+                block = self._ranges[(hospital, day)] = list(reserved)
+            n = block[0]
+            block[0] += 1
+        return ticket_number(day, n)
+
+
+allocator = TicketAllocator()
+
+
+def slot_starts(day):
+    """Start times of the bookable slots on a date."""
+    opens, closes = [datetime.combine(day, datetime.strptime(t.strip(), '%H:%M').time()) for t in CLINIC_HOURS.split('-')]
+    starts = []
+    while opens + timedelta(minutes=SLOT_MINUTES) <= closes:
+        starts.append(opens)
+        opens += timedelta(minutes=SLOT_MINUTES)
+    return starts
+
+
+def slot_id(hospital, start):
+    return f"{hospital}|{start:%Y-%m-%d %H:%M}"
+
+
+def reserve_slot(hospital, now=None):
+    """Take a place in the earliest slot with room left; returns its start, or None if all are full."""
+    now = now or datetime.now()
+    earliest = now + timedelta(minutes=BOOKING_LEAD_MINUTES)
+    for offset in range(BOOKING_DAYS_AHEAD):
+        day = (now + timedelta(days=offset)).date()
+        # One query for the day's full slots, so we only try ones likely to have room
+        full = database.get_full_slots(hospital, day.isoformat())
+        for start in slot_starts(day):
+            sid = slot_id(hospital, start)
+            if start < earliest or sid in full:
+                continue
+            if database.reserve_slot(sid, hospital, day.isoformat(), start.strftime('%Y-%m-%d %H:%M'), SLOT_CAPACITY):
+                return start
+    return None
+
+
+def book(user_id, hospital, now=None):
+    """Reserve a slot and a ticket number and store the booking.
+
+    Returns (ticket_no, start), or None when nothing is free or a write
+    failed (the slot place is given back in that case).
+    """
+    start = reserve_slot(hospital, now)
+    if start is None:
+        return None
+    sid = slot_id(hospital, start)
+    ticket_no = allocator.next(hospital, start.strftime('%Y-%m-%d'))
+    if ticket_no is None or not database.save_booking(user_id, hospital, ticket_no, start.strftime('%Y-%m-%d %H:%M'), sid):
+        database.release_slot(sid)
+        return None
+    return ticket_no, start
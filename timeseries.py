@@ -0,0 +1,161 @@
+import math
+from datetime import timezone
+
+# Vitals charted by /api/vitals: name -> field path in health_data.
+# bmi and health_score live in the stored analysis; bmi falls back to
+# height/weight for records whose analysis is missing or a legacy string.
+VITALS = {
+    'bp_systolic': 'bp_systolic',
+    'bp_diastolic': 'bp_diastolic',
+    'fasting_glucose': 'fasting_glucose',
+    'hba1c': 'hba1c',
+    'cholesterol': 'cholesterol',
+    'bmi': 'analysis_result.bmi',
+    'health_score': 'analysis_result.health_score',
+}
+VITALS_PROJECTION = {'_id': 0, 'date': 1, 'height': 1, 'weight': 1, **dict.fromkeys(VITALS.values(), 1)}
+
+METHODS = ['lttb', 'minmax', 'avg']
+DEFAULT_POINTS = 500
+MAX_POINTS = 2000
+
+
+def lookup(doc, path):
+    """Value at a dotted path ('analysis_result.bmi'), or None if any part is missing."""
+    for part in path.split('.'):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+def _number(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def epoch_ms(dt):
+    # Mongo hands back naive datetimes that are already UTC
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def to_columns(docs, metrics):
+    """Rows (oldest first) -> (epoch-ms timestamps, {metric: [float|None]})."""
+    t = []
+    cols = {m: [] for m in metrics}
+    for doc in docs:
+        date = doc.get('date')
+        if date is None:
+            continue
+        t.append(epoch_ms(date))
+        for m in metrics:
+            value = _number(lookup(doc, VITALS[m]))
+            if value is None and m == 'bmi':
+                h = (_number(doc.get('height')) or 0) / 100
+                w = _number(doc.get('weight'))
+                value = w / (h * h) if h > 0 and w else None
+            cols[m].append(value)
+    return t, cols
+
+
+def lttb(xs, ys, threshold):
+    """Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the shape of ys."""
+    n = len(xs)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:max(threshold, 0)]
+    selected = [0]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        start = int((i + 1) * every) + 1
+        end = min(int((i + 2) * every) + 1, n)
+        span = end - start
+        avg_x = sum(xs[start:end]) / span
+        avg_y = sum(ys[start:end]) / span
+
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+def _buckets(n, count):
+    size = n / count
+    return [(int(i * size), int((i + 1) * size)) for i in range(count) if int((i + 1) * size) > int(i * size)]
+
+
+def minmax(ys, points):
+    """Indices of the min and max of ys in each of points/2 buckets (keeps spikes)."""
+    picked = []
+    for lo, hi in _buckets(len(ys), max(points // 2, 1)):
+        idx = range(lo, hi)
+        i_min = min(idx, key=ys.__getitem__)
+        i_max = max(idx, key=ys.__getitem__)
+        picked.extend(sorted({i_min, i_max}))
+    return picked
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if values else None
+
+
+def downsample(t, cols, points, method='lttb', focus=None):
+    """Reduce to at most `points` rows that share one timestamp array.
+
+    lttb and minmax pick whole rows by the shape of the `focus` metric, so
+    the other metrics are reported at the same instants. avg replaces each
+    bucket with its mean time and per-metric means.
+    """
+    n = len(t)
+    if n <= points:
+        return t, cols
+    if method == 'avg':
+        out_t, out_cols = [], {m: [] for m in cols}
+        for lo, hi in _buckets(n, points):
+            out_t.append(int(sum(t[lo:hi]) / (hi - lo)))
+            for m, values in cols.items():
+                out_cols[m].append(_mean(values[lo:hi]))
+        return out_t, out_cols
+
+    focus = focus if focus in cols else next(iter(cols))
+    # Rows without a focus value can't be ranked; they are dropped when reducing
+    rows = [i for i, v in enumerate(cols[focus]) if v is not None]
+    if len(rows) <= points:
+        picked = rows
+    else:
+        xs = [t[i] for i in rows]
+        ys = [cols[focus][i] for i in rows]
+        local = minmax(ys, points) if method == 'minmax' else lttb(xs, ys, points)
+        picked = [rows[i] for i in local]
+    return [t[i] for i in picked], {m: [values[i] for i in picked] for m, values in cols.items()}
+
+
+def series(docs, metrics, points=DEFAULT_POINTS, method='lttb', focus=None):
+    """Column-oriented, downsampled payload for the vitals chart."""
+    t, cols = to_columns(docs, metrics)
+    raw = len(t)
+    t, cols = downsample(t, cols, points, method, focus)
+    return {
+        "t": t,
+        "series": {m: [None if v is None else round(v, 1) for v in values] for m, values in cols.items()},
+        "points": len(t),
+        "raw_points": raw,
+        "method": method if len(t) < raw else None
+    }
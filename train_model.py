@@ -5,6 +5,7 @@ from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.linear_model import LogisticRegression, LinearRegression
 from sklearn.metrics import accuracy_score, mean_squared_error
 import pickle
+import json
 import os
 
 # 1. LOAD HEALTHCARE DATASET (Sourcing synthetic data for demo)
@@ -118,4 +119,17 @@ models = {
 with open('healthcare_model.pkl', 'wb') as f:
     pickle.dump(models, f)
 
-print("Workflow Complete. Model saved as 'healthcare_model.pkl'")
+# 6. EMIT COMPILED ARTIFACT (sklearn-free inference)
+print("Step 6: Compiling Models for Fast Inference...")
+from scoring import compile_assets
+with open('healthcare_model.json', 'w') as f:
+    json.dump(compile_assets(models), f, indent=2)
+
+# 7. REGISTER A NEW VERSION (served only once activated)
+print("Step 7: Registering Model Version...")
+import model_registry
+manifest = model_registry.register('healthcare_model.pkl', 'healthcare_model.json', notes=f"risk acc {risk_acc:.3f}, score mse {score_mse:.1f}")
+
+print("Workflow Complete. Model saved as 'healthcare_model.pkl' and 'healthcare_model.json'")
+print(f"Registered as {manifest['version']}. Try it with 'python manage.py activate-model {manifest['version']} --shadow', "
+      f"then roll it out with 'python manage.py activate-model {manifest['version']}'")
@@ -0,0 +1,115 @@
+import sys
+import time
+import cache
+import database
+
+def test_lru_eviction():
+    print("Testing LRU Eviction...")
+    c = cache.TTLCache(maxsize=2, ttl=60)
+    c.set('a', 1)
+    c.set('b', 2)
+    c.get('a')          # 'b' is now the least recently used
+    c.set('c', 3)
+    kept = c.get('a') == 1 and c.get('c') == 3
+    evicted = c.get('b', None) is None
+    print(f" - recently used kept: {kept}, oldest evicted: {evicted}, evictions: {c.evictions}")
+    if kept and evicted and c.evictions == 1:
+        print("LRU Eviction: PASSED")
+        return True
+    print("LRU Eviction: FAILED")
+    return False
+
+def test_ttl_expiry():
+    print("Testing TTL Expiry...")
+    c = cache.TTLCache(maxsize=10, ttl=0.05)
+    c.set('a', 1)
+    fresh = c.get('a') == 1
+    time.sleep(0.1)
+    expired = c.get('a', None) is None
+    # Expired entries are dropped, not just hidden
+    dropped = c.stats()['size'] == 0
+    disabled = cache.TTLCache(maxsize=10, ttl=0)
+    disabled.set('a', 1)
+    print(f" - fresh hit: {fresh}, expired miss: {expired}, dropped: {dropped}")
+    if fresh and expired and dropped and disabled.get('a', None) is None:
+        print("TTL Expiry: PASSED")
+        return True
+    print("TTL Expiry: FAILED")
+    return False
+
+def test_tag_invalidation():
+    print("Testing Tag Invalidation...")
+    c = cache.TTLCache(maxsize=10, ttl=60)
+    c.set(('user', 'u1'), 1, tags=('u1',))
+    c.set(('history', 'u1'), 2, tags=('u1',))
+    c.set(('user', 'u2'), 3, tags=('u2',))
+    c.invalidate_tag('u1')
+    gone = c.get(('user', 'u1'), None) is None and c.get(('history', 'u1'), None) is None
+    kept = c.get(('user', 'u2')) == 3
+    # None results are never cached, so a missing record is looked up again
+    calls = []
+    c.get_or_load('missing', lambda: calls.append(1))
+    c.get_or_load('missing', lambda: calls.append(1))
+    print(f" - tagged entries gone: {gone}, other tag kept: {kept}, None loads: {len(calls)}")
+    if gone and kept and len(calls) == 2:
+        print("Tag Invalidation: PASSED")
+        return True
+    print("Tag Invalidation: FAILED")
+    return False
+
+def test_read_floor():
+    print("Testing Read Floor...")
+    c = cache.TTLCache(maxsize=10, ttl=60)
+    c.set('a', 1)
+    token = cache.read_floor.set(time.time() + 1)
+    try:
+        hidden = c.get('a', None) is None
+    finally:
+        cache.read_floor.reset(token)
+    print(f" - entry older than the floor missed: {hidden}")
+    if hidden:
+        print("Read Floor: PASSED")
+        return True
+    print("Read Floor: FAILED")
+    return False
+
+def test_write_invalidation():
+    print("Testing Write Invalidation...")
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit("verify_cache.py needs the in-memory MongoDB stand-in: pip install mongomock")
+    database.use_client(mongomock.MongoClient())
+    database.register_user("Cache Test", 40, "Female", "+1 555-0101", "addr", "O+", "cachetest", "pw")
+    user_id = database.check_user("cachetest", "pw")['id']
+
+    empty = database.get_health_data(user_id)
+    database.save_health_data(user_id, {"bp_systolic": 120}, {"health_score": 80})
+    history = database.get_health_data(user_id)
+    record_id = history[0]['id']
+    database.set_manual_summary(record_id, "Seen in clinic")
+    noted = database.get_health_data(user_id)[0]['analysis_result'].get('manual_summary')
+
+    treatments = database.get_treatments(user_id)
+    database.add_treatment(user_id, "Type 2 diabetes", "Metformin 500mg daily")
+    treatments_after = database.get_treatments(user_id)
+
+    results = {
+        "history sees new record": not empty and len(history) == 1,
+        "history sees admin note": noted == "Seen in clinic",
+        "treatments see new plan": not treatments and len(treatments_after) == 1,
+    }
+    for name, ok in results.items():
+        print(f" - {name}: {ok}")
+    if all(results.values()):
+        print("Write Invalidation: PASSED")
+        return True
+    print("Write Invalidation: FAILED")
+    return False
+
+if __name__ == "__main__":
+    test_lru_eviction()
+    test_ttl_expiry()
+    test_tag_invalidation()
+    test_read_floor()
+    test_write_invalidation()
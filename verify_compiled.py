@@ -0,0 +1,63 @@
+import json
+import pickle
+import random
+import time
+import scoring
+
+TOLERANCE = 1e-6
+
+def synthetic_rows(n=1000):
+    rng = random.Random(42)
+    rows = []
+    for _ in range(n):
+        rows.append([
+            float(rng.randint(18, 90)), rng.randint(0, 1), round(rng.uniform(15, 45), 1),
+            float(rng.randint(90, 180)), float(rng.randint(70, 250)), rng.randint(0, 1),
+            float(rng.randint(120, 300)), rng.randint(0, 2), rng.randint(0, 2),
+            rng.randint(0, 3), rng.randint(0, 2), rng.randint(0, 2)
+        ])
+    return rows
+
+def max_diff(a, b):
+    return max(abs(x - y) for x, y in zip(a, b))
+
+def test_compiled_parity():
+    print("Testing Compiled Model Parity...")
+    with open(scoring.MODEL_PATH, 'rb') as f:
+        sk_model = scoring.SklearnModel(pickle.load(f))
+    with open(scoring.COMPILED_MODEL_PATH) as f:
+        artifact = json.load(f)
+    compiled = scoring.CompiledModel(artifact)
+    # Same artifact through the pure Python path
+    compiled_py = scoring.CompiledModel(artifact, use_numpy=False)
+
+    rows = synthetic_rows()
+    sk_probs, sk_scores = sk_model.predict(rows)
+    probs, scores = compiled.predict(rows)
+    py_probs, py_scores = compiled_py.predict(rows)
+
+    diffs = {
+        "numpy risk": max_diff(sk_probs, probs),
+        "numpy score": max_diff(sk_scores, scores),
+        "python risk": max_diff(sk_probs, py_probs),
+        "python score": max_diff(sk_scores, py_scores),
+    }
+    for name, diff in diffs.items():
+        print(f" - {name}: max abs diff {diff:.2e}")
+    if all(d < TOLERANCE for d in diffs.values()):
+        print("Compiled Parity: PASSED")
+    else:
+        print("Compiled Parity: FAILED")
+        return False
+
+    # Per-request latency (single row)
+    for name, model in [("sklearn", sk_model), ("compiled", compiled)]:
+        start = time.perf_counter()
+        for row in rows[:200]:
+            model.predict([row])
+        per_call = (time.perf_counter() - start) / 200 * 1e6
+        print(f" - {name} single-row latency: {per_call:.1f} us")
+    return True
+
+if __name__ == "__main__":
+    test_compiled_parity()
@@ -0,0 +1,202 @@
+import sys
+import database
+import metrics
+
+# Runs against mongomock (pip install mongomock), like benchmark.py.
+
+def setup():
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit("verify_database.py needs the in-memory MongoDB stand-in: pip install mongomock")
+    database.use_client(mongomock.MongoClient())
+
+def test_malformed_ids():
+    print("Testing Malformed Ids...")
+    before = metrics.DB_ERRORS.total()
+    results = {
+        "get_user_by_id": database.get_user_by_id("garbage") is None,
+        "get_users_page after": database.get_users_page(after_id="zzz") == ([], False),
+        "get_users_page before": database.get_users_page(before_id="zzz") == ([], False),
+        "get_health_record": database.get_health_record("garbage", user_id="x") is None,
+        "get_health_status": database.get_health_status("garbage", "x") is None,
+        "get_records_rev": database.get_records_rev("garbage") is None,
+        "update_health_analysis": database.update_health_analysis("garbage", {}) is False,
+        "set_manual_summary": database.set_manual_summary("garbage", "note") is False,
+    }
+    for name, ok in results.items():
+        print(f" - {name}: {'ok' if ok else 'wrong result'}")
+    errors = metrics.DB_ERRORS.total() - before
+    print(f" - DB errors counted: {errors}")
+    if all(results.values()) and errors == 0:
+        print("Malformed Ids: PASSED")
+        return True
+    print("Malformed Ids: FAILED")
+    return False
+
+def test_malformed_id_routes():
+    print("Testing Malformed Id Routes...")
+    import app as appmod
+    database.register_user("Id Test", 30, "Female", "+1 555-0100", "addr", "O+", "idtest", "pw")
+    user = appmod.app.test_client()
+    user.post('/login', data={'u_login': 'idtest', 'p_login': 'pw'})
+    admin = appmod.app.test_client()
+    admin.post('/admin/login', data={'admin_u': 'admin', 'admin_p': 'admin123'})
+
+    before = metrics.DB_ERRORS.total()
+    status = user.get('/health/report/status/garbage').status_code
+    page = admin.get('/admin/dashboard?after=zzz').status_code
+    errors = metrics.DB_ERRORS.total() - before
+    print(f" - /health/report/status/garbage: {status}")
+    print(f" - /admin/dashboard?after=zzz: {page}")
+    print(f" - DB errors counted: {errors}")
+    if status == 404 and page == 200 and errors == 0:
+        print("Malformed Id Routes: PASSED")
+        return True
+    print("Malformed Id Routes: FAILED")
+    return False
+
+def test_rescore_keeps_admin_edits():
+    print("Testing Rescore Keeps Admin Edits...")
+    import rescore
+    vitals = {"sex": "Female", "smoking": "No", "activity": "Active", "stress_level": "High", "mood": "Happy",
+              "sleep_quality": "Restful", "lifestyle_balance": "Good", "height": 165.0, "weight": 80.0,
+              "bp_systolic": 145.0, "bp_diastolic": 95.0, "fasting_glucose": 130.0, "cholesterol": 220.0}
+    database.save_health_data("rescore-user", vitals, {"health_score": 1, "summary": "stale"})
+    database.save_health_data("rescore-user", vitals, {"health_score": 1, "summary": "stale"})
+    noted, overridden = [d['_id'] for d in database.db.health_data.find({"user_id": "rescore-user"})]
+    database.set_manual_summary(noted, "Seen in clinic")
+    database.update_health_analysis(overridden, {"health_score": 42, "summary": "Reviewed by Dr. Rao"}, override=True)
+
+    docs = list(database.db.health_data.find({"user_id": "rescore-user"}, rescore.RESCORE_PROJECTION))
+    rescore.rescore_chunk(docs)
+    noted_doc = database.get_health_record(noted)['analysis_result']
+    overridden_doc = database.get_health_record(overridden)['analysis_result']
+    rescored = noted_doc.get('health_score') != 1
+    kept_note = noted_doc.get('manual_summary') == "Seen in clinic"
+    kept_override = overridden_doc == {"health_score": 42, "summary": "Reviewed by Dr. Rao"}
+    print(f" - plain record rescored: {rescored}")
+    print(f" - manual_summary kept: {kept_note}")
+    print(f" - overridden analysis untouched: {kept_override}")
+
+    # An override that lands between the read and the bulk write still wins
+    database.update_health_analysis(noted, {"health_score": 7}, override=True)
+    database.bulk_update_health_analyses([(str(noted), {"health_score": 99})])
+    kept_late_override = database.get_health_record(noted)['analysis_result'] == {"health_score": 7}
+    print(f" - late override untouched: {kept_late_override}")
+    if rescored and kept_note and kept_override and kept_late_override:
+        print("Rescore Keeps Admin Edits: PASSED")
+        return True
+    print("Rescore Keeps Admin Edits: FAILED")
+    return False
+
+def test_analytics_window_late_analyses():
+    print("Testing Analytics Window For Late Analyses...")
+    import analytics
+    from datetime import datetime, timedelta
+
+    def window(since, until):
+        # Only the $match stage: mongomock has no $merge/$convert
+        match = analytics._source_stages(since, until, with_user=False)[:1]
+        return {str(d['_id']) for d in database.db.health_data.aggregate(match + [{"$match": {"user_id": "window-user"}}])}
+
+    pending = database.create_pending_health_data("window-user", {})
+    failed = database.create_pending_health_data("window-user", {})
+    database.fail_health_analysis(failed, "window-user", "boom")
+    first = datetime.utcnow() + timedelta(seconds=1)
+    before = window(None, first)
+
+    # Both are scored after the first refresh's watermark
+    database.complete_health_analysis(pending, "window-user", {"health_score": 60})
+    database.db.health_data.update_one({"_id": database.ObjectId(pending)}, {"$set": {"analyzed_at": first + timedelta(seconds=1)}})
+    database.bulk_update_health_analyses([(failed, {"health_score": 50})])
+    database.db.health_data.update_one({"_id": database.ObjectId(failed)}, {"$set": {"analyzed_at": first + timedelta(seconds=1)}})
+    second = first + timedelta(seconds=2)
+    after = window(first, second)
+
+    # A later rescore doesn't move them into another window
+    database.bulk_update_health_analyses([(failed, {"health_score": 51})])
+    again = window(second, datetime.utcnow() + timedelta(days=1))
+
+    print(f" - first window: {len(before)} records, second: {len(after)}, after rescore: {len(again)}")
+    if not before and after == {pending, failed} and not again:
+        print("Analytics Window: PASSED")
+        return True
+    print("Analytics Window: FAILED")
+    return False
+
+def test_backfill_rollups_idempotent():
+    print("Testing Rollup Backfill...")
+    for _ in range(3):
+        database.save_diary_entry("diary-user", "Happy", 1000, 2, 7, "", "")
+    expected = database.db.diary_rollups.find_one({"_id": "diary-user"})['all']
+    # Drifted doc: the backfill should put absolute values back, twice over
+    database.db.diary_rollups.update_one({"_id": "diary-user"}, {"$inc": {"all.n": 5, "all.steps": 99}})
+    database.backfill_diary_rollups("diary-user")
+    database.backfill_diary_rollups("diary-user")
+    repeated = database.db.diary_rollups.find_one({"_id": "diary-user"})['all']
+
+    # An entry saved after the counts were read forces that user to be recomputed
+    read_counts = database._rollup_counts
+    def counts_then_save(user_id):
+        counts = read_counts(user_id)
+        if user_id is None:
+            database.save_diary_entry("diary-user", "Happy", 1, 1, 1, "", "")
+        return counts
+    database._rollup_counts = counts_then_save
+    try:
+        database.backfill_diary_rollups()
+    finally:
+        database._rollup_counts = read_counts
+    raced = database.db.diary_rollups.find_one({"_id": "diary-user"})['all']
+
+    print(f" - after re-runs: {repeated}")
+    print(f" - after a mid-run save: {raced}")
+    if repeated == expected and raced['n'] == 4 and raced['steps'] == 3001:
+        print("Rollup Backfill: PASSED")
+        return True
+    print("Rollup Backfill: FAILED")
+    return False
+
+def test_prefix_search():
+    print("Testing Prefix Search...")
+    database.register_user("Maria Lopez", 52, "Female", "+1 (555) 010-2233", "addr", "A+", "mlopez", "pw")
+    database.register_user("Mario Rossi", 47, "Male", "555-777-1000", "addr", "B+", "mario", "pw")
+    database.register_user("Lopez Maria", 61, "Female", "555-888-0000", "addr", "O-", "lm61", "pw")
+
+    def names(query):
+        return [u['name'] for u in database.search_users(query)]
+
+    cases = {
+        "name prefix": set(names("mari")) == {"Maria Lopez", "Mario Rossi", "Lopez Maria"},
+        "case-insensitive, all terms": set(names("MARIA lop")) == {"Maria Lopez", "Lopez Maria"},
+        "exact username ranked first": names("mario")[:1] == ["Mario Rossi"],
+        "phone without country code": names("555 010 2233") == ["Maria Lopez"],
+        "phone with country code": names("+1-555-010-2233") == ["Maria Lopez"],
+        "no mid-word match": names("opez") == [],
+        "regex syntax is not a pattern": names(".*") == [] and names("^(a+)+$") == [],
+        "metacharacters split terms": names("mari|zzz") == [],
+        "over-long input is cut": isinstance(database.search_users("a" * 10000), list),
+    }
+    # Users from before indexed search get tokens from the backfill
+    database.db.users.update_one({"username": "mario"}, {"$unset": {"search_tokens": ""}})
+    cases["legacy user hidden before backfill"] = "Mario Rossi" not in names("rossi")
+    database.backfill_search_tokens()
+    cases["found after backfill"] = names("rossi") == ["Mario Rossi"]
+
+    for name, ok in cases.items():
+        print(f" - {name}: {ok}")
+    if all(cases.values()):
+        print("Prefix Search: PASSED")
+        return True
+    print("Prefix Search: FAILED")
+    return False
+
+if __name__ == "__main__":
+    setup()
+    test_malformed_ids()
+    test_malformed_id_routes()
+    test_rescore_keeps_admin_edits()
+    test_analytics_window_late_analyses()
+    test_backfill_rollups_idempotent()
+    test_prefix_search()
@@ -1,10 +1,9 @@
 import database
-import json
 
 def test_health_feature():
     print("Testing Health Data & AI Analysis...")
     # Register a new user
-    database.register_user("Alice Green", 28, "+1 999 0000", "789 Pine St", "O+", "alice", "alice123")
+    database.register_user("Alice Green", 28, "Female", "+1 999 0000", "789 Pine St", "O+", "alice", "alice123")
     user = database.check_user("alice", "alice123")
     user_id = user['id']
     
@@ -15,7 +14,15 @@ def test_health_feature():
         "bmi": 24.5,
         "needs_doctor": True
     }
-    database.save_health_data(user_id, 150, 95, 200, 110, 75, 175, json.dumps(analysis_sim))
+    health_data_sim = {
+        "bp_systolic": 150,
+        "bp_diastolic": 95,
+        "fasting_glucose": 110,
+        "cholesterol": 200,
+        "weight": 75,
+        "height": 175
+    }
+    database.save_health_data(user_id, health_data_sim, analysis_sim)
     
     # Retrieve health data
     data = database.get_health_data(user_id)
@@ -30,7 +37,7 @@ def test_health_feature():
     print("Booking Storage: PASSED")
     
     # Test Admin Fetch
-    all_users = database.get_all_users()
+    all_users, _ = database.get_users_page(limit=50)
     if any(u['username'] == 'alice' for u in all_users):
         print("Admin Fetch All Users: PASSED")
     else:
@@ -0,0 +1,104 @@
+import io
+import sys
+import database
+import importer
+
+def setup():
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit("verify_importer.py needs the in-memory MongoDB stand-in: pip install mongomock")
+    database.use_client(mongomock.MongoClient())
+    database.init_db()
+    database.register_user("Existing User", 50, "Male", "+1 555-0100", "addr", "A+", "taken", "pw")
+
+def run(text, fmt, **kwargs):
+    return importer.import_patients(io.BytesIO(text.encode('utf-8')), fmt, **kwargs)
+
+def errors_by_line(report):
+    return {e['line']: e['errors'] for e in report['errors']}
+
+def test_csv_error_rows():
+    print("Testing CSV Error Rows...")
+    csv_text = (
+        "Full Name,Age,Sex,Mobile,Address,Blood Type,User,pwd_reg\n"
+        "Ana Silva,34,F,(555) 010-2030,1 Main St,o pos,asilva,pw\n"       # line 2: ok
+        "Bad Age,abc,M,5550102031,,A+,badage,pw\n"                        # 3: age
+        "Two Faults,200,Q,5550102032,,A+,twofaults,pw\n"                  # 4: age + gender
+        "No Phone,40,M,,,A+,nophone,pw\n"                                 # 5: required
+        "Short Phone,40,M,123,,A+,shortphone,pw\n"                        # 6: phone
+        "Bad Blood,40,M,5550102033,,Z+,badblood,pw\n"                     # 7: blood group
+        "Bad User,40,M,5550102034,,A+,x y,pw\n"                           # 8: username
+        "Ana Again,35,F,5550102035,,A+,asilva,pw\n"                       # 9: repeated in file
+        "Taken,40,M,5550102036,,A+,taken,pw\n"                            # 10: exists in DB
+        "Bo Chen,29,m,0044 20 7946 0000,,,bchen,pw\n"                     # 11: ok
+    )
+    report = run(csv_text, 'csv', batch_size=3)
+    errors = errors_by_line(report)
+    expected_lines = {3, 4, 5, 6, 7, 8, 9, 10}
+    checks = {
+        "counts": (report['rows'], report['inserted'], report['failed']) == (10, 2, 8),
+        "failing lines": set(errors) == expected_lines,
+        "both faults reported": len(errors.get(4, [])) == 2,
+        "duplicate in file": errors.get(9) == ["username repeated earlier in this file"],
+        "duplicate in DB": errors.get(10) == ["username already exists"],
+        "rows normalized": database.check_user("asilva", "pw")['blood_group'] == "O+"
+                           and database.check_user("bchen", "pw")['phone'] == "+442079460000",
+        "errors sorted by line": [e['line'] for e in report['errors']] == sorted(expected_lines),
+    }
+    for name, ok in checks.items():
+        print(f" - {name}: {ok}")
+    if all(checks.values()):
+        print("CSV Error Rows: PASSED")
+        return True
+    print("CSV Error Rows: FAILED")
+    return False
+
+def test_jsonl_error_rows():
+    print("Testing JSONL Error Rows...")
+    jsonl_text = (
+        '{"name": "Dee Park", "age": 41, "gender": "female", "phone": "555-010-2040", "username": "dpark", "password": "pw"}\n'
+        '{"name": "Broken",\n'
+        '\n'
+        '["not", "an", "object"]\n'
+        '{"name": "Half Age", "age": 41.5, "gender": "f", "phone": "5550102041", "username": "halfage", "password": "pw"}\n'
+    )
+    report = run(jsonl_text, 'jsonl')
+    errors = errors_by_line(report)
+    checks = {
+        "counts (blank line skipped)": (report['rows'], report['inserted'], report['failed']) == (4, 1, 3),
+        "invalid JSON": errors.get(2, [''])[0].startswith("invalid JSON"),
+        "not an object": errors.get(4) == ["expected a JSON object"],
+        "fractional age": errors.get(5) == [f"age must be a whole number between {importer.MIN_AGE} and {importer.MAX_AGE}"],
+    }
+    # A dry run validates without writing
+    dry = run(jsonl_text.replace("dpark", "dpark2"), 'jsonl', dry_run=True)
+    checks["dry run writes nothing"] = dry['inserted'] == 1 and database.check_user("dpark2", "pw") is None
+    for name, ok in checks.items():
+        print(f" - {name}: {ok}")
+    if all(checks.values()):
+        print("JSONL Error Rows: PASSED")
+        return True
+    print("JSONL Error Rows: FAILED")
+    return False
+
+def test_error_report_truncated():
+    print("Testing Error Report Truncation...")
+    limit = importer.MAX_REPORTED_ERRORS
+    importer.MAX_REPORTED_ERRORS = 5
+    try:
+        report = run("name,age\n" + "x,1\n" * 20, 'csv')
+    finally:
+        importer.MAX_REPORTED_ERRORS = limit
+    print(f" - failed: {report['failed']}, reported: {len(report['errors'])}, truncated: {report['errors_truncated']}")
+    if report['failed'] == 20 and len(report['errors']) == 5 and report['errors_truncated']:
+        print("Error Report Truncation: PASSED")
+        return True
+    print("Error Report Truncation: FAILED")
+    return False
+
+if __name__ == "__main__":
+    setup()
+    test_csv_error_rows()
+    test_jsonl_error_rows()
+    test_error_report_truncated()
@@ -9,6 +9,7 @@ def test_registration():
     success = database.register_user(
         name="Test User",
         age=25,
+        gender="Male",
         phone="+1 555-0199",
         address="123 Test St",
         blood_group="A+",
@@ -33,7 +34,7 @@ def test_registration():
 
 def test_admin_view():
     print("Testing Admin View...")
-    users = database.get_all_users()
+    users, _ = database.get_users_page(limit=50)
     if len(users) > 0:
         print(f"Admin View Verification: PASSED ({len(users)} users found)")
         for u in users:
@@ -0,0 +1,163 @@
+import random
+import time
+import rules
+import scoring
+
+# The if/elif chains rules.py replaced, kept verbatim as the parity reference
+
+def legacy_clinical_metrics(data):
+    h_m = data['height'] / 100
+    bmi = round(data['weight'] / (h_m * h_m), 1) if h_m > 0 else 0
+
+    sys = data['bp_systolic']
+    dia = data['bp_diastolic']
+    if sys < 120 and dia < 80: bp_status = "Normal"
+    elif sys < 130 and dia < 80: bp_status = "Elevated"
+    elif sys < 140 or dia < 90: bp_status = "Hypertension Stage 1"
+    else: bp_status = "Hypertension Stage 2"
+
+    glu = data['fasting_glucose']
+    if glu < 100: sugar_status = "Normal"
+    elif glu < 126: sugar_status = "Prediabetes"
+    else: sugar_status = "Diabetes"
+
+    return bmi, bp_status, sugar_status
+
+def legacy_rule_heart_risk(data, bmi):
+    heart_prob = 10.0
+    if data['bp_systolic'] > 140: heart_prob += 20
+    is_smoker = data['smoking'] == 'Yes'
+    if is_smoker: heart_prob += 15
+    if bmi > 30: heart_prob += 10
+    return min(heart_prob, 95)
+
+def legacy_risks_and_plan(data, bmi, bp_status, sugar_status, heart_prob):
+    sys = data['bp_systolic']
+    glu = data['fasting_glucose']
+    category = 'Healthy' if 18.5 <= bmi <= 25 else 'Above range' if bmi > 25 else 'Below range'
+    diabetes_prob = 15.0 if sugar_status == "Normal" else (45.0 if sugar_status == "Prediabetes" else 85.0)
+    risks = [
+        ("Low" if diabetes_prob < 30 else ("Moderate" if diabetes_prob < 60 else "High"), diabetes_prob),
+        ("Low" if sys < 130 else "Moderate", 20 if sys < 130 else 50),
+        ("Low" if heart_prob < 20 else ("Moderate" if heart_prob < 50 else "High"), heart_prob),
+        ("Moderate" if bmi > 27 and sys > 130 else "Low", 40 if bmi > 27 and sys > 130 else 10),
+    ]
+    plan = []
+    if bmi > 25: plan.append("Aim for 150 minutes of moderate aerobic activity weekly to manage weight.")
+    if sys > 130: plan.append("Reduce sodium intake and consider the DASH diet.")
+    if glu > 100: plan.append("Prioritize complex carbohydrates and lean proteins; limit refined sugars.")
+    if data['stress_level'] == 'High': plan.append("Incorporate 10-15 minutes of mindfulness or breathing exercises daily.")
+    if data['sleep'] < 7: plan.append("Try to establish a consistent sleep schedule to reach 7-8 hours of restful sleep.")
+    plan.append("Consult a licensed doctor if you experience persistent symptoms or to discuss these findings further.")
+    needs_doctor = any(level == 'High' for level, _ in risks) or bp_status.startswith("Hypertension") or sugar_status == "Diabetes"
+    return category, risks, plan, needs_doctor
+
+# Every threshold in the tables, plus its neighbours
+EDGES = {
+    'bp_systolic': [0, 119, 120, 121, 129, 130, 131, 139, 140, 141, 250],
+    'bp_diastolic': [0, 79, 80, 81, 89, 90, 91, 150],
+    'fasting_glucose': [0, 99, 100, 101, 125, 126, 127, 400],
+    'sleep': [0.0, 6.9, 7.0, 7.1, 12.0],
+}
+
+def synthetic_records(n=20000, seed=7):
+    rng = random.Random(seed)
+    records = []
+    for _ in range(n):
+        edge = rng.random() < 0.5
+        records.append(scoring.parse_health_data({
+            'sex': rng.choice(['Male', 'Female']),
+            'smoking': rng.choice(['Yes', 'No', None]),
+            'stress_level': rng.choice(['Low', 'Moderate', 'High', None]),
+            'mood': rng.choice(['Happy', 'Sad']),
+            # Zero/blank heights exercise the int-0 BMI; some weights land on 18.5/25/27/30 exactly
+            'height': rng.choice([0, '', 150, 160, 170, 175.5, 180, 200]) if edge else round(rng.uniform(140, 210), 1),
+            'weight': rng.choice([0, 47.4, 64, 72.25, 86.7, 96]) if edge else round(rng.uniform(35, 160), 1),
+            **{f: (rng.choice(v) if edge else rng.uniform(v[0], v[-1])) for f, v in EDGES.items()},
+            'hba1c': 5.5,
+        }))
+    return records
+
+def test_scalar_parity(records):
+    print("Testing Rule Tables Against the Legacy Chains...")
+    mismatches = 0
+    for data in records:
+        bmi, bp, sugar = legacy_clinical_metrics(data)
+        if (bmi, bp, sugar) != scoring.clinical_metrics(data) or type(bmi) is not type(scoring.clinical_metrics(data)[0]):
+            mismatches += 1
+            continue
+        heart = legacy_rule_heart_risk(data, bmi)
+        if heart != scoring.rule_heart_risk(data, bmi):
+            mismatches += 1
+            continue
+        for heart_prob in (heart, 19.9, 20.0, 49.9, 50.0):
+            category, risks, plan, needs_doctor = legacy_risks_and_plan(data, bmi, bp, sugar, heart_prob)
+            analysis = scoring.build_analysis(data, bmi, bp, sugar, heart_prob, 75)
+            new_risks = [(r['level'], r['probability']) for r in analysis['risks']]
+            if (risks != new_risks or plan != analysis['plan'] or needs_doctor != analysis['needs_doctor']
+                    or f"({category})" not in analysis['summary']):
+                mismatches += 1
+                break
+    print(f" - {len(records)} records, {mismatches} mismatches")
+    print(f"Scalar Parity: {'PASSED' if mismatches == 0 else 'FAILED'}")
+    return mismatches == 0
+
+def test_batch_parity(records):
+    print("Testing Vectorized Staging...")
+    np = rules.import_numpy()
+    if np is None:
+        print("NumPy not installed: batch path unavailable, SKIPPED")
+        return True
+    expected = [legacy_clinical_metrics(d) for d in records]
+    bmis, bps, sugars = rules.stage_batch(rules.columns(records, rules.STAGE_FIELDS))
+    got = list(zip(bmis, bps, sugars))
+    staged_ok = got == expected and all(type(a[0]) is type(b[0]) for a, b in zip(got, expected))
+
+    cols = rules.columns(records, ['bp_systolic'], ['smoking'])
+    cols['bmi'] = np.array([b for b, _, _ in expected], dtype=float)
+    heart = rules.RULE_HEART_RISK.score_batch(cols, np).tolist()
+    heart_ok = heart == [legacy_rule_heart_risk(d, b) for d, (b, _, _) in zip(records, expected)]
+
+    # Whole analyses: a large batch (NumPy staging) vs one record at a time (scalar)
+    sample = records[:500]
+    assess_ok = scoring.assess_batch(sample) == [scoring.assess(d) for d in sample]
+
+    stale = [{'bmi': 0, 'bp_status': 'Normal', 'sugar_status': 'Normal', 'needs_doctor': False,
+              'risks': [{'condition': 'Cardiovascular Risk', 'probability': p}]}
+             for p in [10.0, 20.0, 49.9, 50.0, 80.0] * (len(records) // 5)]
+    restage_ok = rules.restage(records, stale) == rules._restage_scalar(records, stale)
+
+    ok = staged_ok and heart_ok and assess_ok and restage_ok
+    print(f" - stages: {'match' if staged_ok else 'MISMATCH'}, rule heart risk: {'match' if heart_ok else 'MISMATCH'}, "
+          f"assess_batch: {'match' if assess_ok else 'MISMATCH'}, restage: {'match' if restage_ok else 'MISMATCH'}")
+    print(f"Batch Parity: {'PASSED' if ok else 'FAILED'}")
+    return ok
+
+def test_restage_speed(n=1_000_000):
+    print(f"Timing Restage of {n} Stored Records...")
+    np = rules.import_numpy()
+    rng = np.random.default_rng(1)
+    docs = [{'height': h, 'weight': w, 'bp_systolic': s, 'bp_diastolic': d, 'fasting_glucose': g}
+            for h, w, s, d, g in zip(rng.uniform(140, 210, n).round(1).tolist(), rng.uniform(35, 160, n).round(1).tolist(),
+                                     rng.integers(90, 200, n).tolist(), rng.integers(50, 120, n).tolist(),
+                                     rng.integers(60, 300, n).tolist())]
+    # Stale stored stages, as after a threshold change
+    analyses = [{'bmi': 0, 'bp_status': 'Normal', 'sugar_status': 'Normal', 'needs_doctor': False,
+                 'risks': [{'condition': 'Cardiovascular Risk', 'probability': 30.0}]}] * n
+    started = time.perf_counter()
+    changes = rules.restage(docs, analyses)
+    elapsed = time.perf_counter() - started
+    changed = dict(changes)
+    restaged = [dict(analyses[i], **changed.get(i, {})) for i in range(2000)]
+    spot = all((a['bmi'], a['bp_status'], a['sugar_status']) == legacy_clinical_metrics(d)
+               for a, d in zip(restaged, docs))
+    print(f" - {len(changes)} records changed in {elapsed:.2f}s ({n / elapsed:,.0f} records/s), spot check {'ok' if spot else 'FAILED'}")
+    return spot
+
+if __name__ == "__main__":
+    records = synthetic_records()
+    ok = test_scalar_parity(records)
+    ok = test_batch_parity(records) and ok
+    if rules.import_numpy() is not None:
+        ok = test_restage_speed() and ok
+    print("Rules Verification: PASSED" if ok else "Rules Verification: FAILED")
@@ -0,0 +1,90 @@
+import sys
+import threading
+from datetime import datetime
+import benchmark
+import database
+import tickets
+
+# Concurrent bookings against mongomock, with every collection call
+# serialized the way benchmark.py does it.
+HOSPITAL = "City General Hospital"
+NOW = datetime(2026, 3, 2, 8, 0)
+
+def setup():
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit("verify_tickets.py needs the in-memory MongoDB stand-in: pip install mongomock")
+    benchmark.serialize_mongomock(mongomock)
+    database.use_client(mongomock.MongoClient())
+    # Two 15-minute slots of 3 places on one day: 6 bookings in total
+    tickets.CLINIC_HOURS = '09:00-09:30'
+    tickets.SLOT_MINUTES = 15
+    tickets.SLOT_CAPACITY = 3
+    tickets.BOOKING_DAYS_AHEAD = 1
+
+def run_concurrently(n, fn):
+    results = [None] * n
+    def worker(i):
+        results[i] = fn(i)
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+def test_ticket_numbers_unique():
+    print("Testing Ticket Numbers Across Workers...")
+    # Two allocators stand in for two worker processes sharing the counter
+    workers = [tickets.TicketAllocator(block_size=5), tickets.TicketAllocator(block_size=5)]
+    numbers = run_concurrently(40, lambda i: workers[i % 2].next(HOSPITAL, '2026-03-02'))
+    other_day = workers[0].next(HOSPITAL, '2026-03-03')
+    unique = len(set(numbers)) == len(numbers) and None not in numbers
+    print(f" - {len(numbers)} numbers, {len(set(numbers))} unique, next day starts at {other_day}")
+    if unique and other_day == 'OP-260303-0001':
+        print("Ticket Numbers: PASSED")
+        return True
+    print("Ticket Numbers: FAILED")
+    return False
+
+def test_slots_never_overbooked():
+    print("Testing Slot Capacity Under Contention...")
+    results = run_concurrently(20, lambda i: tickets.book(f"user-{i}", HOSPITAL, now=NOW))
+    booked = [r for r in results if r]
+    slots = list(database.db.consultation_slots.find({"hospital_name": HOSPITAL}))
+    per_slot = {s['start']: s['booked'] for s in slots}
+    stored = database.db.bookings.count_documents({"hospital_name": HOSPITAL, "slot_id": {"$exists": True}})
+    unique_tickets = len({ticket for ticket, _ in booked}) == len(booked)
+    print(f" - {len(booked)} of {len(results)} booked, per slot: {per_slot}, bookings stored: {stored}")
+    capacity = tickets.SLOT_CAPACITY * len(tickets.slot_starts(NOW.date()))
+    if (len(booked) == capacity == stored and unique_tickets
+            and all(n == tickets.SLOT_CAPACITY for n in per_slot.values())):
+        print("Slot Capacity: PASSED")
+        return True
+    print("Slot Capacity: FAILED")
+    return False
+
+def test_failed_booking_releases_slot():
+    print("Testing Slot Release On Failed Booking...")
+    day = '2026-03-04'
+    now = datetime(2026, 3, 4, 8, 0)
+    save_booking = database.save_booking
+    database.save_booking = lambda *args: False
+    try:
+        result = tickets.book("user-x", HOSPITAL, now=now)
+    finally:
+        database.save_booking = save_booking
+    slot = database.db.consultation_slots.find_one({"hospital_name": HOSPITAL, "day": day})
+    print(f" - booking result: {result}, places taken: {slot and slot['booked']}")
+    if result is None and slot and slot['booked'] == 0:
+        print("Slot Release: PASSED")
+        return True
+    print("Slot Release: FAILED")
+    return False
+
+if __name__ == "__main__":
+    setup()
+    test_ticket_numbers_unique()
+    test_slots_never_overbooked()
+    test_failed_booking_releases_slot()
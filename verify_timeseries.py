@@ -0,0 +1,71 @@
+import math
+import timeseries
+
+def test_lttb_edge_cases():
+    print("Testing LTTB Edge Cases...")
+    xs = list(range(10))
+    ys = [float(x % 3) for x in xs]
+    cases = {
+        "empty input": timeseries.lttb([], [], 5) == [],
+        "n below threshold keeps all": timeseries.lttb(xs, ys, 20) == xs,
+        "n equal to threshold keeps all": timeseries.lttb(xs, ys, 10) == xs,
+        "threshold 0": timeseries.lttb(xs, ys, 0) == [],
+        "threshold 1": timeseries.lttb(xs, ys, 1) == [0],
+        "threshold 2 keeps the ends": timeseries.lttb(xs, ys, 2) == [0, 9],
+        "negative threshold": timeseries.lttb(xs, ys, -1) == [],
+        "single point": timeseries.lttb([5], [1.0], 1) == [0],
+    }
+    three = timeseries.lttb(xs, ys, 3)
+    cases["threshold 3: ends plus one"] = len(three) == 3 and three[0] == 0 and three[-1] == 9 and 0 < three[1] < 9
+    for name, ok in cases.items():
+        print(f" - {name}: {ok}")
+    if all(cases.values()):
+        print("LTTB Edge Cases: PASSED")
+        return True
+    print("LTTB Edge Cases: FAILED")
+    return False
+
+def test_lttb_shape():
+    print("Testing LTTB Shape...")
+    n = 1000
+    xs = list(range(n))
+    ys = [math.sin(i / 50) for i in xs]
+    ys[437] = 25.0   # one spike
+    picked = timeseries.lttb(xs, ys, 50)
+    ordered = all(a < b for a, b in zip(picked, picked[1:]))
+    print(f" - {len(picked)} points, increasing: {ordered}, spike kept: {437 in picked}")
+    if len(picked) == 50 and ordered and picked[0] == 0 and picked[-1] == n - 1 and 437 in picked:
+        print("LTTB Shape: PASSED")
+        return True
+    print("LTTB Shape: FAILED")
+    return False
+
+def test_downsample():
+    print("Testing Downsample...")
+    t = list(range(0, 100000, 1000))
+    cols = {"bp_systolic": [120.0 + (i % 7) for i in range(100)], "hba1c": [None] * 100}
+    cols["bp_systolic"][10] = None
+    cases = {}
+    same_t, same_cols = timeseries.downsample(t, cols, 100)
+    cases["n <= points unchanged"] = same_t is t and same_cols is cols
+    for method in timeseries.METHODS:
+        out_t, out_cols = timeseries.downsample(t, cols, 20, method, focus="bp_systolic")
+        aligned = all(len(v) == len(out_t) for v in out_cols.values())
+        cases[f"{method}: at most 20 aligned rows"] = 0 < len(out_t) <= 20 and aligned
+    lttb_t, _ = timeseries.downsample(t, cols, 20, 'lttb', focus="bp_systolic")
+    cases["row without focus value dropped"] = t[10] not in lttb_t
+    # Nothing to rank by: every focus value is missing
+    empty_t, _ = timeseries.downsample(t, cols, 20, 'lttb', focus="hba1c")
+    cases["all-None focus gives no rows"] = empty_t == []
+    for name, ok in cases.items():
+        print(f" - {name}: {ok}")
+    if all(cases.values()):
+        print("Downsample: PASSED")
+        return True
+    print("Downsample: FAILED")
+    return False
+
+if __name__ == "__main__":
+    test_lttb_edge_cases()
+    test_lttb_shape()
+    test_downsample()